@@ -1,51 +1,189 @@
+import hmac
 import os
 import logging
-from flask import Flask
+from flask import Flask, current_app, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Setup logging
-logging.basicConfig(level=logging.DEBUG)
+from logging_config import configure_logging
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure upload folders
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['REPORTS_FOLDER'] = 'reports'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Create directories if they don't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['REPORTS_FOLDER'], exist_ok=True)
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///assessment.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# Initialize the app with the extension
-db.init_app(app)
-
-with app.app_context():
-    # Import models and routes
-    import models
-    from routes.main_routes import main_bp
-    from routes.api_routes import api_bp
-
-    # Register blueprints
-    app.register_blueprint(main_bp)
-    app.register_blueprint(api_bp, url_prefix='/api')
-
-    # Create all tables
-    db.create_all()
+# Database profiles: SQLite is tuned for concurrent writers on one box
+# (WAL, busy timeout, mmap), server databases get their own pool settings.
+SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+def database_engine_options(database_uri: str) -> dict:
+    """
+    Return SQLAlchemy engine options for the given database URI
+    """
+    if database_uri.startswith("sqlite"):
+        if not SQLITE_TUNING:
+            return {"pool_recycle": 300, "pool_pre_ping": True}
+        # The driver-level timeout is the busy timeout pysqlite waits on a
+        # locked database before raising "database is locked"
+        return {
+            "connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Per-connection SQLite settings for the production profile
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers proceed while one writer commits
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints and stays crash-safe
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def admin_authorized() -> bool:
+    """
+    Whether the current request carries EXPORT_API_TOKEN as Bearer token
+    """
+    token = current_app.config.get('EXPORT_API_TOKEN')
+    provided = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    return bool(token) and hmac.compare_digest(provided.encode(),
+                                               token.encode())
+
+
+def create_app() -> Flask:
+    """
+    Build and configure the application
+
+    Only light modules are imported here; the service modules defer their
+    heavy dependencies (google-genai, ReportLab, PyPDF2, python-docx, HTTP
+    clients) to first use, and each worker loads them during its warmup
+    (services/warmup.py). Tables are created and upgraded by
+    `flask db-upgrade`, not on every boot.
+    """
+    # Setup logging
+    configure_logging()
+
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    # Proxies in front of the app whose X-Forwarded-For is trusted; the
+    # client address it yields keys the admission rate limits
+    app.config['PROXY_FIX_X_FOR'] = int(os.environ.get('PROXY_FIX_X_FOR', '1'))
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                            x_proto=1, x_host=1)
+
+    # Configure upload folders
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['REPORTS_FOLDER'] = 'reports'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Bearer token for the admin endpoints (GET /api/export/sessions,
+    # /metrics); unset disables them
+    app.config['EXPORT_API_TOKEN'] = os.environ.get('EXPORT_API_TOKEN')
+    # Columnar metrics written by `flask analytics-build`
+    app.config['ANALYTICS_DIR'] = os.environ.get(
+        'ANALYTICS_DIR', os.path.join('instance', 'analytics'))
+
+    # Create directories if they don't exist
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['REPORTS_FOLDER'], exist_ok=True)
+
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///assessment.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = database_engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"])
+
+    # Initialize the app with the extension
+    db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite" and SQLITE_TUNING:
+            event.listen(db.engine, "connect", apply_sqlite_pragmas)
+
+        # Before the models are used: CompressedText columns read it
+        from services.text_compression import text_compression
+        text_compression.init_app(app)
+
+        # Import models and routes
+        import models
+        from routes.main_routes import main_bp
+        from routes.api_routes import api_bp
+
+        # Before admission, so requests it sheds are captured too
+        from services.traffic_capture import traffic
+        traffic.init_app(app)
+
+        from services.admission import admission
+        admission.init_app(app)
+
+        from services.session_cache import session_cache
+        session_cache.init_app(app)
+
+        from services import blob_store
+        blob_store.init_app(app)
+
+        from services.storage_service import storage
+        storage.init_app(app)
+
+        from services.stt_service import stt
+        stt.init_app(app)
+
+        from services.heygen_service import avatar_pool
+        avatar_pool.init_app(app)
+
+        from services.warmup import warmup
+        warmup.init_app(app)
+
+        from assets import assets
+        assets.init_app(app)
+
+        import commands
+        commands.init_app(app)
+
+        # Register blueprints
+        app.register_blueprint(main_bp)
+        app.register_blueprint(api_bp, url_prefix='/api')
+
+    return app
+
+
+# Third-party modules the services import on first use. Workers import them
+# during warmup so the first request doesn't pay.
+LAZY_MODULES = (
+    "google.genai",
+    "reportlab.platypus",
+    "PyPDF2",
+    "docx",
+    "httpx",
+    "requests",
+)
+
+
+def preload_lazy_modules():
+    """
+    Import the modules services load lazily (run after forking a worker)
+    """
+    import importlib
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logging.error(f"Error preloading {name}: {str(e)}")
@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from main import app
+from services.admission import ARRIVAL_ENVIRON_KEY
+
+# An ASGI server in front of the Flask (WSGI) app. Stock WSGI-to-ASGI
+# adapters run every request on one shared thread; interviews spend most of
+# their time waiting on Gemini/ElevenLabs, so each request gets its own
+# thread from a large pool instead. Upstream calls themselves are
+# multiplexed on the upstream event loop (services.async_runtime).
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", "256"))
+
+# Requests with more copies of one header are refused (400)
+DUPLICATE_HEADER_LIMIT = 100
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS,
+                               thread_name_prefix="asgi-request")
+
+
+def build_environ(scope: dict, body, arrived_at: float) -> dict:
+    """
+    WSGI environ of an ASGI HTTP scope; ValueError on too many duplicate
+    headers
+    """
+    script_name = scope.get("root_path", "").encode("utf8").decode("latin1")
+    path_info = scope["path"].encode("utf8").decode("latin1")
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name,
+        "PATH_INFO": path_info,
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        # Time spent waiting for a thread counts as admission queueing
+        ARRIVAL_ENVIRON_KEY: arrived_at,
+    }
+    if scope.get("client") is not None:
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    headers = {}
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        values = headers.setdefault(key, [])
+        if len(values) >= DUPLICATE_HEADER_LIMIT:
+            raise ValueError(f"Too many {name} headers")
+        values.append(value.decode("latin1"))
+    for key, values in headers.items():
+        # RFC 6265 separates cookies with "; ", not the list comma
+        environ[key] = ("; " if key == "HTTP_COOKIE" else ",").join(values)
+    return environ
+
+
+class _WsgiCall:
+    """
+    One HTTP request, run through the WSGI app on a pool thread
+    """
+
+    def __init__(self, scope: dict, send, loop):
+        self.scope = scope
+        self.send = send
+        self.loop = loop
+        self.response_start = None
+        self.response_started = False
+        self.content_length = None
+
+    def sync_send(self, message: dict):
+        asyncio.run_coroutine_threadsafe(self.send(message),
+                                         self.loop).result()
+
+    def start_response(self, status: str, response_headers: list,
+                       exc_info=None):
+        if exc_info is not None and self.response_started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        if self.response_start is not None and exc_info is None:
+            raise ValueError("start_response called a second time without "
+                             "exc_info")
+        self.content_length = None
+        for name, value in response_headers:
+            if name.lower() == "content-length":
+                self.content_length = int(value)
+        self.response_start = {
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("ascii"),
+                         value.encode("ascii"))
+                        for name, value in response_headers],
+        }
+
+    def run(self, body, arrived_at: float):
+        try:
+            environ = build_environ(self.scope, body, arrived_at)
+        except ValueError:
+            self.sync_send({"type": "http.response.start", "status": 400,
+                            "headers": [(b"content-type", b"text/plain")]})
+            self.sync_send({"type": "http.response.body",
+                            "body": b"Bad Request: too many duplicate "
+                                    b"headers"})
+            return
+        output = app(environ, self.start_response)
+        sent = 0
+        try:
+            for chunk in output:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                if self.content_length is not None:
+                    chunk = chunk[:self.content_length - sent]
+                self.sync_send({"type": "http.response.body", "body": chunk,
+                                "more_body": True})
+                sent += len(chunk)
+                if sent == self.content_length:
+                    break
+        finally:
+            # Runs Flask's teardown and closes streamed files
+            if hasattr(output, "close"):
+                output.close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({"type": "http.response.body"})
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point serving requests concurrently from a thread pool"""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        raise ValueError(f"Unsupported ASGI scope {scope['type']!r}")
+    loop = asyncio.get_running_loop()
+    with SpooledTemporaryFile(max_size=65536) as body:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+        arrived_at = time.time()
+        call = _WsgiCall(scope, send, loop)
+        context = contextvars.copy_context()
+        await loop.run_in_executor(_executor, context.run, call.run, body,
+                                   arrived_at)
@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+# Optional build dependencies: without them assets are copied unminified
+# and only gzip copies are written
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+# Build output, inside the static folder so it is served from /static/dist
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.txt')
+# Preferred first when the client accepts both
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Fingerprinted names change whenever their content does
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def _minify(rel_path: str, data: bytes) -> bytes:
+    ext = os.path.splitext(rel_path)[1]
+    if ext == '.js' and rjsmin is not None:
+        return rjsmin.jsmin(data.decode('utf-8')).encode('utf-8')
+    if ext == '.css' and rcssmin is not None:
+        return rcssmin.cssmin(data.decode('utf-8')).encode('utf-8')
+    return data
+
+
+def _emit(dist: str, rel_path: str, data: bytes, manifest: dict):
+    """
+    Write a fingerprinted copy (plus precompressed ones) and record it
+    """
+    stem, ext = os.path.splitext(rel_path)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    out_rel = f"{stem}.{digest}{ext}"
+    out_path = os.path.join(dist, out_rel)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(data)
+
+    if ext in COMPRESSIBLE:
+        compressed = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['.br'] = brotli.compress(data, quality=11)
+        for suffix, payload in compressed.items():
+            # Tiny files can grow when compressed
+            if len(payload) < len(data):
+                with open(out_path + suffix, 'wb') as f:
+                    f.write(payload)
+
+    manifest['files'][rel_path] = f"{DIST_DIR}/{out_rel}"
+    return len(data)
+
+
+def build_assets(static_folder: str) -> dict:
+    """
+    Minify, fingerprint and precompress everything under static_folder into
+    static_folder/dist
+    """
+    missing = [name for name, module in (('rjsmin', rjsmin),
+                                         ('rcssmin', rcssmin),
+                                         ('brotli', brotli))
+               if module is None]
+    if missing:
+        logging.warning(f"{', '.join(missing)} not installed: assets are "
+                        f"built without minification or brotli copies")
+    dist = os.path.join(static_folder, DIST_DIR)
+    staging = dist + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest = {'files': {}}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if os.path.abspath(dirpath) == os.path.abspath(static_folder):
+            dirnames[:] = [d for d in dirnames
+                           if d not in (DIST_DIR, DIST_DIR + '.tmp')]
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, static_folder).replace(
+                os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            size = _emit(staging, rel_path, _minify(rel_path, data), manifest)
+            logging.info(f"Asset {rel_path}: {len(data)} -> {size} bytes")
+
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    # Swap the whole build in at once
+    shutil.rmtree(dist, ignore_errors=True)
+    os.replace(staging, dist)
+    return manifest
+
+
+class StaticAssets:
+    """
+    Serves the output of build_assets
+
+    url_for('static', filename=...) is rewritten to the fingerprinted copy
+    when one exists; those are sent with immutable caching and the best
+    precompressed encoding the client accepts. Anything not in the manifest
+    (or changed since the build) is served by Flask as before.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.files = {}
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_FINGERPRINT',
+                              os.environ.get('ASSETS_FINGERPRINT', '1') == '1')
+        self.app = app
+        if app.config['ASSETS_FINGERPRINT']:
+            self.load_manifest()
+
+        app.url_defaults(self._fingerprint)
+        app.view_functions['static'] = self.send_static
+        app.extensions['assets'] = self
+
+    def load_manifest(self):
+        path = os.path.join(self.app.static_folder, DIST_DIR, MANIFEST_NAME)
+        try:
+            built_at = os.path.getmtime(path)
+            with open(path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            logging.info("No asset manifest; run `flask assets-build`")
+            return
+
+        self.files = {}
+        for rel_path, built in manifest['files'].items():
+            source = os.path.join(self.app.static_folder, rel_path)
+            if os.path.exists(source) and os.path.getmtime(source) > built_at:
+                # Edited since the build: keep serving the live file
+                logging.warning(f"Asset {rel_path} changed since the build")
+                continue
+            self.files[rel_path] = built
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == 'static':
+            built = self.files.get(values.get('filename'))
+            if built:
+                values['filename'] = built
+
+    def send_static(self, filename):
+        if not filename.startswith(DIST_DIR + '/'):
+            return self.app.send_static_file(filename)
+
+        path = safe_join(self.app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if request.accept_encodings[name] and os.path.isfile(path +
+                                                                 suffix):
+                path += suffix
+                encoding = name
+                break
+
+        response = send_file(path,
+                             mimetype=mimetype,
+                             conditional=True,
+                             max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+
+assets = StaticAssets()
@@ -0,0 +1,128 @@
+"""
+Overload simulation for the admission controller
+
+A synthetic app with the real AdmissionController serves an open-loop
+arrival stream through a fixed pool of request threads (a stand-in for a
+worker's ASGI thread pool). submit_answer sleeps like a slow Gemini call;
+session_status answers immediately. Arrivals exceed what the slow route
+can sustain, and the run is repeated with admission control off and on.
+A request is "good" if it succeeds within the client timeout.
+
+Usage:
+    python benchmarks/admission_overload.py --rate 60 --seconds 10
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, Flask, jsonify, session
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app(admission_enabled: bool, upstream_seconds: float) -> Flask:
+    from services.admission import AdmissionController
+
+    app = Flask("admission_bench")
+    app.secret_key = "benchmark"
+    app.config.update(ADMISSION_ENABLED=admission_enabled,
+                      ADMISSION_LIMITS="llm=24,default=64",
+                      ADMISSION_QUEUE_SIZE=16,
+                      ADMISSION_QUEUE_TIMEOUT=2,
+                      ADMISSION_RATE=0)
+    api = Blueprint("api", __name__)
+
+    @api.post("/submit_answer")
+    def submit_answer():
+        time.sleep(upstream_seconds * random.uniform(0.5, 1.5))
+        return jsonify({"success": True})
+
+    @api.get("/session_status")
+    def session_status():
+        return jsonify({"status": "in_progress"})
+
+    @app.post("/login")
+    def login():
+        session["assessment_session_id"] = "bench"
+        return ""
+
+    app.register_blueprint(api, url_prefix="/api")
+    AdmissionController().init_app(app)
+    return app
+
+
+def run(app: Flask, rate: float, seconds: float, threads: int,
+        client_timeout: float, slow_share: float) -> dict:
+    from services.admission import ARRIVAL_ENVIRON_KEY
+
+    pool = ThreadPoolExecutor(max_workers=threads)
+    results = {"submit_answer": [], "session_status": []}
+    lock = threading.Lock()
+
+    def request(path: str, arrived: float):
+        client = app.test_client()
+        client.post("/login")
+        # As asgi.py does: time waiting for a thread counts as queueing
+        environ = {ARRIVAL_ENVIRON_KEY: arrived}
+        if path == "submit_answer":
+            response = client.post(f"/api/{path}", environ_base=environ)
+        else:
+            response = client.get(f"/api/{path}", environ_base=environ)
+        elapsed = time.time() - arrived
+        with lock:
+            results[path].append((response.status_code, elapsed))
+
+    started = time.monotonic()
+    count = 0
+    while time.monotonic() - started < seconds:
+        path = ("submit_answer"
+                if random.random() < slow_share else "session_status")
+        pool.submit(request, path, time.time())
+        count += 1
+        time.sleep(random.expovariate(rate))
+    pool.shutdown(wait=True)
+
+    summary = {}
+    for path, outcomes in results.items():
+        good = sum(1 for status, elapsed in outcomes
+                   if status == 200 and elapsed <= client_timeout)
+        shed = sum(1 for status, _ in outcomes if status == 503)
+        latencies = sorted(elapsed for status, elapsed in outcomes
+                           if status == 200)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0
+        summary[path] = (len(outcomes), good, shed, p95)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rate", type=float, default=60,
+                        help="arrivals per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--threads", type=int, default=32,
+                        help="request threads in the simulated worker")
+    parser.add_argument("--upstream", type=float, default=1.0,
+                        help="mean seconds submit_answer spends upstream")
+    parser.add_argument("--client-timeout", type=float, default=5.0)
+    parser.add_argument("--slow-share", type=float, default=0.7,
+                        help="fraction of arrivals that are submit_answer")
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+
+    for enabled in (False, True):
+        app = create_app(enabled, args.upstream)
+        summary = run(app, args.rate, args.seconds, args.threads,
+                      args.client_timeout, args.slow_share)
+        print(f"\nadmission control {'on' if enabled else 'off'}:")
+        for path, (total, good, shed, p95) in summary.items():
+            print(f"  {path:<15} {total:5d} requests  "
+                  f"{good / max(total, 1):6.1%} good  {shed:5d} shed  "
+                  f"p95 {p95:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
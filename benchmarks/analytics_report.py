@@ -0,0 +1,136 @@
+"""
+Analytics report time: columnar segments vs scanning the session rows
+
+Generates synthetic completed sessions, materializes them as the analytics
+store does (services.analytics, .npz or Parquet segments) and times
+`flask analytics-report` (load + summarize) against computing the same
+latency and answer length percentiles by parsing every session's
+questions_answers JSON, as a query over the sessions table would. No
+database is involved: the rows are held in memory, which favours the scan.
+
+Usage:
+    python benchmarks/analytics_report.py --sessions 100000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ["Junior", "Mid-level Professional", "Senior", "Executive"]
+
+
+def synthetic_rows(count: int) -> list:
+    rows = []
+    for session in range(count):
+        created = 1_760_000_000.0 + session * 60
+        answered = created
+        qa_list = []
+        for turn in range(random.randint(3, 10)):
+            answered += random.uniform(20, 400)
+            qa_list.append({"question": f"Question {turn} ?",
+                            "answer": "mot " * random.randint(5, 200),
+                            "timestamp": answered})
+        rows.append((session + 1, created, random.choice(STAGES),
+                     random.randint(0, 25), json.dumps(qa_list)))
+    return rows
+
+
+def columns(rows: list) -> tuple:
+    sessions = {name: [] for name in ("id", "segment", "created_at",
+                                      "completed_at", "duration_s", "turns",
+                                      "fallback_turns", "answer_words",
+                                      "experience_years", "career_stage")}
+    turns = {name: [] for name in ("session_id", "segment", "turn",
+                                   "answer_chars", "answer_words",
+                                   "latency_s", "fallback")}
+    for session_id, created, stage, experience, qa_json in rows:
+        previous = created
+        words_total = 0
+        for index, qa in enumerate(json.loads(qa_json)):
+            words = len(qa["answer"].split())
+            for name, value in (("session_id", session_id), ("segment", 0),
+                                ("turn", index),
+                                ("answer_chars", len(qa["answer"])),
+                                ("answer_words", words),
+                                ("latency_s", qa["timestamp"] - previous
+                                 if index else float("nan")),
+                                ("fallback", random.random() < 0.1)):
+                turns[name].append(value)
+            previous = qa["timestamp"]
+            words_total += words
+        for name, value in (("id", session_id), ("segment", 0),
+                            ("created_at", created),
+                            ("completed_at", previous),
+                            ("duration_s", previous - created),
+                            ("turns", index + 1), ("fallback_turns", 0),
+                            ("answer_words", words_total),
+                            ("experience_years", experience),
+                            ("career_stage", STAGES.index(stage))):
+            sessions[name].append(value)
+    return sessions, turns
+
+
+def scan_report(rows: list) -> dict:
+    latencies, words = [], []
+    for *_, qa_json in rows:
+        previous = None
+        for qa in json.loads(qa_json):
+            if previous is not None:
+                latencies.append(qa["timestamp"] - previous)
+            previous = qa["timestamp"]
+            words.append(len(qa["answer"].split()))
+    return {"latency_p90": statistics.quantiles(latencies, n=10)[-1],
+            "words_p90": statistics.quantiles(words, n=10)[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=100000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from services.analytics import (SESSION_COLUMNS, TURN_COLUMNS,
+                                    AnalyticsStore, numpy, summarize)
+
+    random.seed(1)
+    rows = synthetic_rows(args.sessions)
+    sessions, turns = columns(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        store = AnalyticsStore(directory)
+        segment = "segment-00000.npz"
+        store._write(segment, "sessions", {
+            name: numpy.asarray(values, dtype=SESSION_COLUMNS[name])
+            for name, values in sessions.items()})
+        store._write(segment, "turns", {
+            name: numpy.asarray(values, dtype=TURN_COLUMNS[name])
+            for name, values in turns.items()})
+        store.manifest["segments"].append(segment)
+        store.manifest["career_stages"] = STAGES
+        size = sum(os.path.getsize(os.path.join(directory, name))
+                   for name in os.listdir(directory))
+
+        started = time.perf_counter()
+        report = summarize(*store.load(), STAGES)
+        columnar = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scanned = scan_report(rows)
+    scan = time.perf_counter() - started
+
+    print(f"{args.sessions} sessions, {report['turns']} turns, "
+          f"segments {size / 1024 / 1024:.1f} MiB")
+    print(f"columnar report  {columnar * 1000:8.1f} ms  "
+          f"(latency p90 {report['turn_latency_s']['p90']})")
+    print(f"row scan         {scan * 1000:8.1f} ms  "
+          f"(latency p90 {scanned['latency_p90']:.2f}, "
+          f"percentiles only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Local mock of the HeyGen streaming API, and an avatar start-up benchmark
+
+The mock implements the endpoints the app uses (streaming.create_token,
+.new, .start, .task, .stop) with a configurable delay per call, so the avatar
+pool can be exercised without a HeyGen account. The benchmark points the
+app at the mock and compares the time for /api/avatar/session to return
+with an empty pool (token + new + start on demand) and with a pre-warmed one.
+
+Usage:
+    python benchmarks/heygen_pool.py --latency 0.8            # benchmark
+    python benchmarks/heygen_pool.py --serve --port 8787      # mock only
+    HEYGEN_API_URL=http://127.0.0.1:8787 HEYGEN_API_KEY=test python main.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_mock(latency: float) -> Flask:
+    mock = Flask("heygen_mock")
+    sessions = {}
+    tokens = set()
+
+    def authorized():
+        if request.headers.get("X-Api-Key"):
+            return True
+        auth = request.headers.get("Authorization", "")
+        return auth.startswith("Bearer ") and auth[7:] in tokens
+
+    @mock.before_request
+    def delay():
+        time.sleep(latency)
+        if not authorized():
+            return jsonify({"code": 401, "message": "Unauthorized"}), 401
+
+    @mock.post("/v1/streaming.create_token")
+    def create_token():
+        token = uuid.uuid4().hex
+        tokens.add(token)
+        return jsonify({"data": {"token": token}})
+
+    @mock.post("/v1/streaming.new")
+    def new_session():
+        session_id = uuid.uuid4().hex
+        sessions[session_id] = "new"
+        return jsonify({
+            "data": {
+                "session_id": session_id,
+                "url": "wss://livekit.invalid",
+                "access_token": f"livekit-{session_id}",
+            }
+        })
+
+    @mock.post("/v1/streaming.start")
+    @mock.post("/v1/streaming.task")
+    @mock.post("/v1/streaming.stop")
+    def session_call():
+        session_id = request.get_json().get("session_id")
+        if session_id not in sessions:
+            return jsonify({"code": 404, "message": "Session not found"}), 404
+        action = request.path.rsplit(".", 1)[-1]
+        if action in ("start", "stop"):
+            sessions[session_id] = action
+        return jsonify({"data": {}})
+
+    mock.sessions = sessions
+    return mock
+
+
+def serve_in_background(mock: Flask, port: int):
+    server = make_server("127.0.0.1", port, mock, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed_attach(client) -> float:
+    client.post("/upload")
+    started = time.perf_counter()
+    response = client.post("/api/avatar/session")
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(response.get_json())
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--latency", type=float, default=0.8,
+                        help="seconds the mock waits per call")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--serve", action="store_true",
+                        help="only run the mock server")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    mock = create_mock(args.latency)
+    if args.serve:
+        mock.run(port=args.port, threaded=True)
+        return
+
+    serve_in_background(mock, args.port)
+    workdir = tempfile.mkdtemp(prefix="heygen-pool-")
+    os.chdir(workdir)
+    os.environ.update({
+        "HEYGEN_API_URL": f"http://127.0.0.1:{args.port}",
+        "HEYGEN_API_KEY": "benchmark",
+        "HEYGEN_POOL_ENABLED": "0",  # cycles are run explicitly below
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+    })
+    os.environ.setdefault("GEMINI_API_KEY", "unused")
+    sys.path.insert(0, ROOT)
+    from app import create_app, db
+    from migrations import init_db
+    from services.heygen_service import avatar_pool
+    app = create_app()
+    with app.app_context():
+        init_db(db)
+
+    cold, warm = [], []
+    for _ in range(args.rounds):
+        cold.append(timed_attach(app.test_client()))
+    with app.app_context():
+        created = avatar_pool.run_pool_cycle()
+    print(f"pool target after {args.rounds} arrivals: {created} sessions")
+    for _ in range(args.rounds):
+        with app.app_context():
+            avatar_pool.run_pool_cycle()
+        warm.append(timed_attach(app.test_client()))
+
+    print(f"mock latency per call: {args.latency * 1000:.0f} ms")
+    print(f"empty pool:  avg {sum(cold) / len(cold) * 1000:7.1f} ms")
+    print(f"warm pool:   avg {sum(warm) / len(warm) * 1000:7.1f} ms")
+    started = sum(1 for state in mock.sessions.values() if state == "start")
+    print(f"sessions still running upstream: {started}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Cold-start import benchmark for the app factory
+
+Boots the app in fresh interpreters under `python -X importtime` and breaks
+the cost down per module: the project's own modules (with everything they
+pull in) and third-party packages by self time. The "boot" scenario is what
+a gunicorn worker pays before serving (import main, create_app); "preload"
+adds app.preload_lazy_modules(), which workers run in a background thread
+after forking, so its extra cost is off the request path.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --rounds 5 --top 15
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "boot": "import main",
+    "preload": "import main, app; app.preload_lazy_modules()",
+}
+
+# Top-level names of the project's own modules
+PROJECT_MODULES = ("app", "main", "models", "migrations", "commands", "assets",
+                   "routes", "services")
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+TIMER = ("import time as _t; _s = _t.perf_counter(); {code}; "
+         "print(_t.perf_counter() - _s)")
+
+
+def run_once(code: str, env: dict) -> tuple:
+    """
+    Run code in a fresh interpreter; returns (wall seconds, importtime rows)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", TIMER.format(code=code)],
+        cwd=env["BENCH_DIR"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, len(indent), int(self_us), int(cumulative_us)))
+    return float(result.stdout.strip().splitlines()[-1]), rows
+
+
+def breakdown(rows: list) -> tuple:
+    """
+    Cumulative ms per project module and self ms per third-party package
+    """
+    project = {}
+    packages = defaultdict(float)
+    for name, _, self_us, cumulative_us in rows:
+        top = name.split(".")[0]
+        if top in PROJECT_MODULES:
+            project[name] = cumulative_us / 1000
+        else:
+            packages[top] += self_us / 1000
+    return project, packages
+
+
+def _median_by_key(samples: list) -> dict:
+    keys = set().union(*samples)
+    return {key: statistics.median(sample.get(key, 0.0) for sample in samples)
+            for key in keys}
+
+
+def report(name: str, code: str, env: dict, rounds: int, top: int) -> float:
+    walls, projects, packages = [], [], []
+    for _ in range(rounds):
+        wall, rows = run_once(code, env)
+        project, package = breakdown(rows)
+        walls.append(wall)
+        projects.append(project)
+        packages.append(package)
+
+    wall = statistics.median(walls) * 1000
+    print(f"\n== {name}: {code}")
+    print(f"wall time (median of {rounds}): {wall:8.1f} ms")
+
+    print("project modules (cumulative, includes their imports):")
+    project = _median_by_key(projects)
+    for module, ms in sorted(project.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {module:<40} {ms:8.1f} ms")
+
+    print("third-party packages (self time):")
+    package = _median_by_key(packages)
+    for module, ms in sorted(package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {module:<40} {ms:8.1f} ms")
+    return wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="fresh interpreters per scenario")
+    parser.add_argument("--top", type=int, default=12,
+                        help="rows per table")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="import-time-")
+    env = dict(os.environ)
+    env.update({
+        "BENCH_DIR": workdir,
+        "PYTHONPATH": os.pathsep.join(
+            p for p in (ROOT, env.get("PYTHONPATH")) if p),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+    })
+    env.setdefault("GEMINI_API_KEY", "unused")
+
+    walls = {name: report(name, code, env, args.rounds, args.top)
+             for name, code in SCENARIOS.items()}
+    print(f"\nworker boot: {walls['boot']:.1f} ms; deferred to first use or "
+          f"post-fork preload: {walls['preload'] - walls['boot']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
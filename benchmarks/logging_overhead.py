@@ -0,0 +1,63 @@
+"""
+Request-path cost of a log call: synchronous handler vs logging_config
+
+Logs an interview-sized payload (a 10-turn Q&A list) N times and reports
+the time spent in the calling thread per call. "sync" is the previous setup
+(basicConfig, f-string message, formatted and written by the caller);
+"queue" is logging_config with lazy %-style arguments; "queue, filtered"
+is the same call below the logger's level. Output goes to /dev/null.
+
+Usage:
+    python benchmarks/logging_overhead.py --calls 20000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QA_LIST = [{"question": f"Question {i} " + "q" * 120,
+            "answer": f"Réponse {i} " + "r" * 600} for i in range(10)]
+
+
+def per_call_us(log, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        log()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    sys.stderr = open(os.devnull, "w")
+    logger = logging.getLogger("bench")
+
+    logging.basicConfig(level=logging.DEBUG, force=True)
+    sync = per_call_us(lambda: logging.info(f"Current Q&A list: {QA_LIST}"),
+                       args.calls)
+
+    import logging_config
+    logging_config.configure_logging()
+    logger.setLevel(logging.DEBUG)
+    queued = per_call_us(lambda: logger.debug("Current Q&A list: %s", QA_LIST),
+                         args.calls)
+    logger.setLevel(logging.INFO)
+    filtered = per_call_us(
+        lambda: logger.debug("Current Q&A list: %s", QA_LIST), args.calls)
+    logging_config.stop_logging()
+
+    print(f"sync handler:     {sync:8.2f} us/call", file=sys.__stdout__)
+    print(f"queue:            {queued:8.2f} us/call", file=sys.__stdout__)
+    print(f"queue, filtered:  {filtered:8.2f} us/call", file=sys.__stdout__)
+    print(f"dropped (queue full): {logging_config.dropped_events()}",
+          file=sys.__stdout__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Prompt size of the follow-up question and final summary vs interview length
+
+Builds the real Gemini requests (no API calls) for synthetic interviews of
+increasing length, with long spoken answers, and reports their estimated
+token counts. "transcript" is what the final summary prompt carried before
+the interview digest: every Q&A pair verbatim. The digest is built locally
+(services.interview_digest.build_digest), as when Gemini is unavailable.
+
+Usage:
+    python benchmarks/prompt_size.py --answer-words 300
+"""
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOPICS = [
+    "Nos prix sont plus élevés que la concurrence mais le panier moyen reste à 25 euros.",
+    "Le loyer et les fournisseurs représentent l'essentiel de nos coûts fixes.",
+    "La plupart des nouveaux clients viennent d'Instagram et du bouche-à-oreille.",
+    "Nous avons trois employés et le recrutement de serveurs est difficile.",
+    "Les habitués reviennent chaque semaine grâce à la carte de fidélité.",
+    "Nous n'avons pas de site en ligne et la caisse est un vieux logiciel.",
+]
+FILLER = ("alors en fait je dirais que c'est un peu compliqué parce que "
+          "ça dépend des périodes et de la saison").split()
+
+
+def answer(words: int) -> str:
+    text = random.choice(TOPICS).split()
+    while len(text) < words:
+        text += random.sample(FILLER, 6) + random.choice(TOPICS).split()
+    return " ".join(text[:words])
+
+
+def prompt_text(request: dict) -> str:
+    contents = request["contents"]
+    if isinstance(contents, str):
+        return contents
+    return "".join(part.text for part in contents[0].parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--answer-words", type=int, default=300)
+    parser.add_argument("--turns", default="5,10,20,40")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from services.gemini_service import (_final_summary_request,
+                                         _followup_question_request)
+    from services.interview_digest import (build_digest, estimate_tokens,
+                                           render_digest)
+
+    random.seed(1)
+    print(f"{'turns':>5}  {'transcript':>10}  {'follow-up':>9}  "
+          f"{'summary':>7}  {'digest':>6}")
+    for turns in (int(n) for n in args.turns.split(",")):
+        qa_list = [{"question": f"Question {i} ?",
+                    "answer": answer(args.answer_words)}
+                   for i in range(turns)]
+        transcript = "\n".join(f"Q : {qa['question']}\nR : {qa['answer']}"
+                               for qa in qa_list)
+        digest = build_digest(qa_list[:-1])
+        followup = _followup_question_request({}, qa_list, digest)
+        summary = _final_summary_request({}, qa_list, build_digest(qa_list))
+        print(f"{turns:5d}  {estimate_tokens(transcript):10d}  "
+              f"{estimate_tokens(prompt_text(followup)):9d}  "
+              f"{estimate_tokens(prompt_text(summary)):7d}  "
+              f"{estimate_tokens(render_digest(digest)):6d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Multi-process write-contention stress test for the database profile
+
+Every worker process replays the write pattern of an interview against one
+shared database: create a session, then for each turn load it, append a Q&A
+(as submit_answer does), bump the question index and commit. Commit latency
+percentiles and "database is locked" failures are reported at the end.
+
+Usage:
+    python benchmarks/sqlite_write_contention.py --workers 8 --turns 400
+    SQLITE_TUNING=0 python benchmarks/sqlite_write_contention.py   # baseline
+    DATABASE_URL=postgresql://... python benchmarks/sqlite_write_contention.py
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TURNS_PER_INTERVIEW = 10
+
+
+def _load_app():
+    sys.path.insert(0, ROOT)
+    from app import create_app, db
+    app = create_app()
+    from models import AssessmentSession
+    return app, db, AssessmentSession
+
+
+def _worker(args):
+    turns, answer_bytes = args
+    from sqlalchemy.exc import OperationalError
+    app, db, AssessmentSession = _load_app()
+
+    answer = ("réponse " * (answer_bytes // 9 + 1))[:answer_bytes]
+    latencies = []
+    errors = 0
+    session_id = None
+
+    with app.app_context():
+        started = time.perf_counter()
+        for turn in range(turns):
+            start = time.perf_counter()
+            try:
+                if turn % TURNS_PER_INTERVIEW == 0:
+                    session_id = str(uuid.uuid4())
+                    db.session.add(
+                        AssessmentSession(session_id=session_id,
+                                          cv_filename='cv.pdf',
+                                          cv_content=answer,
+                                          status='in_progress'))
+                else:
+                    assessment_session = AssessmentSession.query.filter_by(
+                        session_id=session_id).first()
+                    assessment_session.add_question_answer(
+                        f"Question {turn}", answer)
+                    assessment_session.current_question_index += 1
+                db.session.commit()
+                latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+    return latencies, errors, elapsed
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--turns', type=int, default=200,
+                        help='writes per worker')
+    parser.add_argument('--answer-bytes', type=int, default=1500)
+    options = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        db_dir = tempfile.mkdtemp(prefix='contention-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{db_dir}/contention.db"
+
+    # Create the schema once before the workers race for it
+    app, db, _ = _load_app()
+    from migrations import init_db
+    with app.app_context():
+        init_db(db)
+
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(options.workers) as pool:
+        results = pool.map(_worker,
+                           [(options.turns, options.answer_bytes)] *
+                           options.workers)
+
+    latencies = sorted(l for worker_latencies, _, _ in results
+                       for l in worker_latencies)
+    errors = sum(worker_errors for _, worker_errors, _ in results)
+    # Workers start at slightly different times; the slowest bounds the run
+    elapsed = max(worker_elapsed for _, _, worker_elapsed in results)
+
+    print(f"database      : {os.environ['DATABASE_URL']}")
+    print(f"sqlite tuning : {os.environ.get('SQLITE_TUNING', '1')}")
+    print(f"workers       : {options.workers}")
+    print(f"commits       : {len(latencies)} ok, {errors} failed")
+    print(f"throughput    : {len(latencies) / elapsed:.1f} commits/s")
+    for label, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99),
+                            ('max', 1.0)):
+        print(f"{label:<14}: {_percentile(latencies, fraction) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
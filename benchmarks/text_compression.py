@@ -0,0 +1,143 @@
+"""
+Database size, row-read latency and cache fit with and without CompressedText
+
+Writes the same synthetic sessions (a CV, its analysis and a long French
+Q&A transcript each) to two SQLite files, one with plain TEXT values and one
+through services.text_compression, then reads random rows by primary key
+with a page cache of --cache-mib, as a worker would load sessions.
+
+SQLite does not report page cache hits to Python, so the hit rate shown is
+the share of the table's pages that fit in the cache: for reads spread
+evenly across the sessions, the expected hit rate once the cache is warm.
+Both files stay in the OS page cache during the run, so the read latency
+here is the decompression cost; the saving is in reads that miss both
+caches and go to disk.
+
+Usage:
+    python benchmarks/text_compression.py --sessions 5000 --cache-mib 8
+    TEXT_COMPRESSION=zstd python benchmarks/text_compression.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ANSWERS = [
+    "Nous avons ouvert le restaurant il y a six ans et la clientèle est "
+    "surtout locale, avec beaucoup d'habitués le midi.",
+    "Le loyer a augmenté de vingt pour cent et les fournisseurs ont revu "
+    "leurs prix, donc la marge s'est réduite cette année.",
+    "On communique surtout sur Instagram, et le bouche-à-oreille fait le "
+    "reste, mais on n'a jamais vraiment mesuré ce qui marche.",
+    "Le recrutement est difficile, surtout pour la cuisine, et je passe "
+    "beaucoup de temps à former les nouveaux.",
+    "Je voudrais développer la vente à emporter et peut-être une petite "
+    "épicerie fine avec nos produits.",
+]
+
+
+def synthetic_session(cv: str) -> dict:
+    lines = cv.splitlines()
+    random.shuffle(lines)
+    qa_list = [{"question": f"Question {turn} ?",
+                "answer": " ".join(random.choice(ANSWERS)
+                                   for _ in range(random.randint(3, 12))),
+                "timestamp": "2026-01-01T10:00:00"}
+               for turn in range(random.randint(5, 15))]
+    return {"cv_content": "\n".join(lines),
+            "cv_analysis": str({"skills": lines[:20],
+                                "summary": " ".join(lines[:10])}),
+            "questions_answers": json.dumps(qa_list)}
+
+
+def build(path: str, column_type, rows: list):
+    import sqlalchemy as sa
+
+    engine = sa.create_engine(f"sqlite:///{path}")
+    metadata = sa.MetaData()
+    table = sa.Table("assessment_session", metadata,
+                     sa.Column("id", sa.Integer, primary_key=True),
+                     sa.Column("status", sa.String(50)),
+                     sa.Column("cv_content", column_type),
+                     sa.Column("cv_analysis", column_type),
+                     sa.Column("questions_answers", column_type))
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(table.insert(),
+                           [dict(row, status="completed") for row in rows])
+    engine.dispose()
+    return table
+
+
+def read_latency(path: str, table, count: int, reads: int,
+                 cache_mib: int) -> float:
+    import sqlalchemy as sa
+
+    engine = sa.create_engine(f"sqlite:///{path}")
+    ids = [random.randint(1, count) for _ in range(reads)]
+    with engine.connect() as connection:
+        connection.exec_driver_sql(f"PRAGMA cache_size=-{cache_mib * 1024}")
+        connection.exec_driver_sql("PRAGMA mmap_size=0")
+        query = sa.select(table).where(table.c.id == sa.bindparam("row_id"))
+        for row_id in ids[:reads // 10]:  # warm the cache
+            connection.execute(query, {"row_id": row_id}).one()
+        started = time.perf_counter()
+        for row_id in ids:
+            row = connection.execute(query, {"row_id": row_id}).one()
+            json.loads(row.questions_answers)
+        elapsed = time.perf_counter() - started
+    engine.dispose()
+    return elapsed / reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--cache-mib", type=int, default=8)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import sqlalchemy as sa
+    from services.text_compression import CODECS, CompressedText, \
+        text_compression
+
+    text_compression.codec = CODECS[os.environ.get("TEXT_COMPRESSION",
+                                                   "zlib")]
+    with open(os.path.join(ROOT, "sample_cv.txt")) as f:
+        cv = f.read()
+    random.seed(1)
+    rows = [synthetic_session(cv) for _ in range(args.sessions)]
+
+    print(f"{args.sessions} sessions, {args.cache_mib} MiB page cache, "
+          f"codec {os.environ.get('TEXT_COMPRESSION', 'zlib')}")
+    print(f"{'':10}  {'size MiB':>8}  {'pages':>7}  {'cache fit':>9}  "
+          f"{'read µs':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for label, column_type in (("plain", sa.Text),
+                                   ("compressed", CompressedText)):
+            path = os.path.join(directory, f"{label}.db")
+            started = time.perf_counter()
+            table = build(path, column_type, rows)
+            write = time.perf_counter() - started
+            size = os.path.getsize(path)
+            engine = sa.create_engine(f"sqlite:///{path}")
+            with engine.connect() as connection:
+                pages = connection.exec_driver_sql(
+                    "PRAGMA page_count").scalar()
+            engine.dispose()
+            fit = min(1.0, args.cache_mib * 1024 * 1024 / size)
+            latency = read_latency(path, table, args.sessions, args.reads,
+                                   args.cache_mib)
+            print(f"{label:10}  {size / 1024 / 1024:8.1f}  {pages:7d}  "
+                  f"{fit:9.0%}  {latency * 1e6:7.1f}  "
+                  f"(write {write:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import csv
+import os
+
+import click
+from flask import current_app
+
+from app import db
+from assets import assets, build_assets
+from migrations import init_db
+from services.storage_service import storage
+
+
+@click.command('db-upgrade')
+def db_upgrade():
+    """Create missing tables and columns (run before starting the server)."""
+    init_db(db)
+    click.echo("Database schema is up to date")
+
+
+@click.command('storage-import-legacy')
+def storage_import_legacy():
+    """Move flat uploads/ and reports/ files into shards and index them."""
+    imported = storage.import_legacy_files()
+    click.echo(f"Imported {imported} files")
+
+
+@click.command('storage-clean')
+@click.option('--cycles', default=1, show_default=True,
+              help='Number of janitor batches to run.')
+def storage_clean(cycles):
+    """Run storage janitor cycles now (TTL and quota eviction)."""
+    deleted = 0
+    for _ in range(cycles):
+        deleted += storage.run_janitor_cycle()
+    click.echo(f"Deleted {deleted} files")
+
+
+@click.command('assets-build')
+def assets_build():
+    """Minify, fingerprint and precompress static assets into static/dist."""
+    manifest = build_assets(current_app.static_folder)
+    assets.load_manifest()
+    click.echo(f"Built {len(manifest['files'])} assets")
+
+
+@click.command('batch-analyze')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--name', help='Batch name (default: the directory name).')
+@click.option('--mode', type=click.Choice(['online', 'batch']),
+              default='online', show_default=True,
+              help='online: bounded concurrent calls now; batch: Gemini '
+              'batch jobs, collected by a later run (or --wait).')
+@click.option('--concurrency', default=4, show_default=True,
+              help='Gemini calls in flight (online mode).')
+@click.option('--rate', default=2.0, show_default=True,
+              help='Gemini calls started per second (online mode).')
+@click.option('--extract-workers', type=int,
+              help='Text extraction processes (default: CPU count).')
+@click.option('--wait', is_flag=True,
+              help='Batch mode: poll until submitted jobs finish.')
+@click.option('--manifest', type=click.Path(dir_okay=False),
+              help='Write a CSV of files, statuses and start links.')
+def batch_analyze(directory, name, mode, concurrency, rate, extract_workers,
+                  wait, manifest):
+    """Pre-analyze a directory of CVs into ready-to-start sessions.
+
+    Progress is checkpointed in the database: run the same command again to
+    resume an interrupted batch or retry failures.
+    """
+    from services.batch_assessment import BatchAssessment, wait_for_jobs
+    from services.gemini_service import gemini_api_key
+
+    if not gemini_api_key:
+        raise click.ClickException("GEMINI_API_KEY is not configured")
+    batch = BatchAssessment(
+        name or os.path.basename(os.path.abspath(directory)), directory)
+
+    click.echo(f"Found {batch.discover()} new or changed CVs")
+    click.echo(f"Extracted {batch.extract(extract_workers)} CVs")
+    if mode == 'online':
+        click.echo(f"Analyzed {batch.analyze(concurrency, rate)} CVs")
+    else:
+        done, running = batch.collect()
+        click.echo(f"Collected {done} CVs from finished batch jobs")
+        jobs = batch.submit()
+        click.echo(f"Submitted {len(jobs)} batch jobs")
+        if wait:
+            click.echo(f"Collected {wait_for_jobs(batch)} CVs")
+        elif running or jobs:
+            click.echo("Run again later to collect the results")
+
+    if manifest:
+        with open(manifest, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['source_path', 'status', 'start_url', 'error'])
+            for source_path, status, session_id, error in batch.manifest():
+                start_url = f"/start/{session_id}" if status == 'analyzed' else ''
+                writer.writerow([source_path, status, start_url, error])
+    click.echo(", ".join(f"{status}: {count}"
+                         for status, count in sorted(batch.summary().items())))
+
+
+@click.command('reports-rerender')
+@click.option('--workers', type=int,
+              help='Rendering processes (default: CPU count).')
+@click.option('--page-size', default=200, show_default=True,
+              help='Sessions read per query.')
+@click.option('--after-id', default=0, show_default=True,
+              help='Resume after this session id.')
+@click.option('--limit', type=int, help='Stop after this many sessions.')
+@click.option('--regenerate-missing', is_flag=True,
+              help='Ask Gemini for the summary of sessions completed before '
+              'summaries were stored (one call each), store it and render '
+              'them too. Without it those sessions are skipped.')
+def reports_rerender(workers, page_size, after_id, limit, regenerate_missing):
+    """Re-render the PDF reports of completed sessions.
+
+    Uses the stored analysis, answers and summary, without calling Gemini.
+    Sessions completed before summaries were stored are skipped and keep
+    their old report, unless --regenerate-missing is given.
+    """
+    from services.gemini_service import gemini_api_key
+    from services.report_rerender import rerender_reports
+
+    if regenerate_missing and not gemini_api_key:
+        raise click.UsageError('--regenerate-missing needs GEMINI_API_KEY')
+
+    def progress(done, total, rate, eta, resume_after):
+        remaining = f"{eta:.0f}s" if eta is not None else "?"
+        click.echo(f"{done}/{total} sessions, {rate:.1f}/s, ETA {remaining} "
+                   f"(resume with --after-id {resume_after})")
+
+    stats = rerender_reports(workers, page_size, after_id, limit, progress,
+                             regenerate_missing=regenerate_missing)
+    click.echo(f"Rendered {stats['rendered']} ({stats['regenerated']} with a "
+               f"regenerated summary), skipped {stats['skipped']} without a "
+               f"stored summary, {stats['failed']} failed")
+
+
+@click.command('sessions-export')
+@click.option('--format', 'export_format', type=click.Choice(['ndjson', 'csv']),
+              default='ndjson', show_default=True)
+@click.option('--fields', help='Comma-separated fields (default: metadata '
+              'only). Also: cv_analysis, questions_answers, interview_digest, '
+              'final_summary, cv_content.')
+@click.option('--status', help='Only sessions with this status.')
+@click.option('--since', help='Created at or after (ISO date, UTC).')
+@click.option('--until', help='Created before (ISO date, UTC).')
+@click.option('--output', type=click.File('w'), default='-',
+              help='Output file (default: stdout).')
+def sessions_export(export_format, fields, status, since, until, output):
+    """Stream assessment sessions as NDJSON or CSV."""
+    from services.session_export import export_lines, parse_date, parse_fields
+
+    try:
+        fields = parse_fields(fields)
+        since, until = parse_date(since), parse_date(until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    for line in export_lines(export_format, fields, status=status,
+                             since=since, until=until):
+        output.write(line)
+
+
+@click.command('analytics-build')
+@click.option('--rebuild', is_flag=True,
+              help='Drop the existing segments and start over.')
+def analytics_build(rebuild):
+    """Materialize metrics of newly completed sessions into columnar files."""
+    from services.analytics import analytics_store
+
+    store = analytics_store(current_app)
+    if rebuild:
+        store.reset()
+    written = store.build()
+    click.echo(f"Materialized {written} sessions "
+               f"({len(store.manifest['segments'])} segments in "
+               f"{store.directory})")
+
+
+@click.command('analytics-report')
+@click.option('--days', type=int,
+              help='Only sessions completed in the last N days.')
+@click.option('--json', 'as_json', is_flag=True, help='Print JSON.')
+def analytics_report(days, as_json):
+    """Latency, answer length, fallback and cohort statistics."""
+    import json
+    import time
+
+    from services.analytics import analytics_store, summarize
+
+    store = analytics_store(current_app)
+    sessions, turns = store.load()
+    since = time.time() - days * 86400 if days else None
+    report = summarize(sessions, turns, store.manifest['career_stages'],
+                       since=since)
+    if as_json:
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    click.echo(f"Sessions: {report['sessions']}  Turns: {report['turns']}")
+    for key, label in (('time_to_completion_s', 'Time to completion (s)'),
+                       ('turn_latency_s', 'Turn latency (s)'),
+                       ('answer_words', 'Answer length (words)')):
+        values = report[key]
+        click.echo(f"{label}: p50 {values['p50']}  p90 {values['p90']}  "
+                   f"p99 {values['p99']}")
+    click.echo(f"Fallback questions: {report['fallback_rate']} of turns, "
+               f"{report['sessions_with_fallback']} of sessions")
+    for cohort, label in (('career_stage', 'Career stage'),
+                          ('experience_years', 'Experience (years)')):
+        click.echo(f"{label}:")
+        for name, values in report[cohort].items():
+            click.echo(f"  {name}: {values['sessions']} sessions, "
+                       f"{values['mean_duration_s']} s, "
+                       f"{values['mean_answer_words']} words, "
+                       f"{values['mean_fallback_turns']} fallbacks")
+
+
+@click.command('db-compress-text')
+@click.option('--batch-size', default=200, show_default=True,
+              help='Rows rewritten per transaction.')
+@click.option('--pause', default=0.05, show_default=True,
+              help='Seconds to sleep between batches.')
+def db_compress_text(batch_size, pause):
+    """Compress large text values written before TEXT_COMPRESSION."""
+    from services.text_compression import compress_existing_rows
+
+    def progress(column, after_id, rewritten):
+        click.echo(f"{column}: {rewritten} rewritten, up to id {after_id}")
+
+    try:
+        stats = compress_existing_rows(batch_size, pause, progress)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for column, rewritten in stats.items():
+        click.echo(f"{column}: {rewritten} values compressed")
+    if db.engine.dialect.name == 'sqlite':
+        click.echo("Run VACUUM to return the freed pages to the filesystem")
+
+
+@click.command('traffic-replay')
+@click.option('--capture', 'directory', type=click.Path(exists=True,
+                                                         file_okay=False),
+              help='Capture directory (default: TRAFFIC_CAPTURE_DIR).')
+@click.option('--target', default='http://127.0.0.1:5000', show_default=True,
+              help='Instance started with TRAFFIC_REPLAY_FIXTURES.')
+@click.option('--speed', default=1.0, show_default=True,
+              help='Arrival rate multiplier (2 = twice as fast).')
+@click.option('--workers', default=256, show_default=True,
+              help='Sessions replayed at the same time at most.')
+@click.option('--output', type=click.File('w'),
+              help='Write one JSON result per request to this file.')
+@click.option('--json', 'as_json', is_flag=True, help='Print JSON.')
+def traffic_replay(directory, target, speed, workers, output, as_json):
+    """Replay captured traffic against a local instance."""
+    import json
+
+    from services.traffic_replay import replay, summarize
+
+    directory = directory or current_app.config['TRAFFIC_CAPTURE_DIR']
+
+    def progress(done, total):
+        if done % 100 == 0 or done == total:
+            click.echo(f"{done}/{total} requests", err=True)
+
+    results = replay(directory, target, speed, workers, progress=progress)
+    if output:
+        for result in results:
+            output.write(json.dumps(result) + '\n')
+    summary = summarize(results)
+    if as_json:
+        click.echo(json.dumps(summary, indent=2))
+        return
+    for endpoint, stats in summary.items():
+        recorded, replayed = stats['recorded_ms'], stats['replayed_ms']
+        click.echo(f"{endpoint}: {stats['requests']} requests, "
+                   f"p50 {recorded['p50']} -> {replayed['p50']} ms, "
+                   f"p99 {recorded['p99']} -> {replayed['p99']} ms, "
+                   f"{stats['status_mismatches']} status mismatches, "
+                   f"{stats['errors']} errors, "
+                   f"send lag p99 {stats['lag_p99_ms']} ms")
+
+
+def init_app(app):
+    app.cli.add_command(db_upgrade)
+    app.cli.add_command(db_compress_text)
+    app.cli.add_command(storage_import_legacy)
+    app.cli.add_command(storage_clean)
+    app.cli.add_command(assets_build)
+    app.cli.add_command(batch_analyze)
+    app.cli.add_command(reports_rerender)
+    app.cli.add_command(sessions_export)
+    app.cli.add_command(analytics_build)
+    app.cli.add_command(analytics_report)
+    app.cli.add_command(traffic_replay)
@@ -0,0 +1,36 @@
+import multiprocessing
+import os
+
+# SERVER_PROFILE=development (default) serves main:app with auto-reload.
+# SERVER_PROFILE=production serves the ASGI entry point (asgi:asgi_app) on
+# uvicorn workers, each holding many concurrent, mostly-waiting interviews.
+profile = os.environ.get("SERVER_PROFILE", "development")
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+reuse_port = True
+
+if profile == "production":
+    # JSON lines for the log collector (logging_config.py)
+    os.environ.setdefault("LOG_FORMAT", "json")
+    wsgi_app = "asgi:asgi_app"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    workers = int(
+        os.environ.get("WEB_CONCURRENCY",
+                       min(multiprocessing.cpu_count() * 2, 8)))
+    # Gemini summaries can take tens of seconds
+    timeout = 120
+    graceful_timeout = 30
+    keepalive = 5
+    max_requests = 5000
+    max_requests_jitter = 500
+else:
+    wsgi_app = "main:app"
+    reload = True
+
+
+def post_worker_init(worker):
+    # Preload lazy modules, render a throwaway report, open upstream
+    # connections and synthesize fixed audio; /healthz/ready reports 503
+    # until this worker is done (services/warmup.py)
+    from services.warmup import warmup
+    warmup.start()
@@ -0,0 +1,236 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging is configured from the environment:
+#   LOG_LEVEL            root level (default INFO)
+#   LOG_LEVELS           per-logger levels, e.g. "routes.api_routes=DEBUG,sqlalchemy.engine=INFO"
+#   LOG_FORMAT           "text" (default) or "json", one event per line
+#   LOG_SAMPLE_RATES     fraction of DEBUG events kept per logger, e.g. "routes.api_routes=0.1"
+#   LOG_MAX_FIELD_CHARS  longer messages and fields are truncated (default 1000)
+#   LOG_QUEUE_SIZE       events buffered for the writer thread; beyond it they are dropped
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_MAX_FIELD_CHARS = int(os.environ.get("LOG_MAX_FIELD_CHARS", "1000"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+# Chatty third-party loggers, unless LOG_LEVELS says otherwise
+DEFAULT_LOGGER_LEVELS = {
+    "httpcore": "WARNING",
+    "urllib3": "WARNING",
+    "PIL": "WARNING",
+}
+
+# Credentials are never written out, even from debug dumps of requests
+SECRET_FIELDS = re.compile(
+    r"(?i)(api[_-]?key|token|secret|password|authorization)")
+SECRET_VALUES = re.compile(
+    r"(?i)((?:api[_-]?key|token|secret|password)['\"]?\s*[:=]\s*['\"]?"
+    r"|bearer\s+)([^\s'\",}]+)")
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_handler = None
+_listener = None
+
+
+def _parse_mapping(value: str) -> dict:
+    mapping = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, setting = item.split("=", 1)
+            mapping[name.strip()] = setting.strip()
+    return mapping
+
+
+def redact(text: str) -> str:
+    return SECRET_VALUES.sub(r"\1[redacted]", text)
+
+
+def truncate(text: str, limit: int = None) -> str:
+    limit = limit or LOG_MAX_FIELD_CHARS
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[+{len(text) - limit} chars]"
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Text or JSON lines with truncated, redacted messages and extra fields
+
+    Runs in the writer thread, so %-style arguments are only formatted
+    there: log with logger.debug("...%s", value) rather than f-strings on
+    hot paths.
+    """
+
+    def __init__(self, json_output: bool = False):
+        super().__init__("%(levelname)s:%(name)s:%(message)s")
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = truncate(redact(record.getMessage()))
+        fields = {
+            key: self._field(key, value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_FIELDS and not key.startswith("_")
+        }
+
+        if not self.json_output:
+            record.message = message
+            line = self.formatMessage(record)
+            if fields:
+                line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+            if record.exc_text:
+                line += "\n" + record.exc_text
+            return line
+
+        event = {
+            "ts": datetime.fromtimestamp(record.created,
+                                         timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        event.update(fields)
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+    def _field(self, key: str, value):
+        if SECRET_FIELDS.search(key):
+            return "[redacted]"
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        return truncate(redact(str(value)))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of DEBUG events for loggers listed in LOG_SAMPLE_RATES
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        # Longest prefix first so "routes.api_routes" beats "routes"
+        self.rates = sorted(((name, float(rate))
+                             for name, rate in rates.items()),
+                            key=lambda item: -len(item[0]))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not self.rates:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + "."):
+                return random.random() < rate
+        return True
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread without formatting them
+
+    The stock QueueHandler formats every record in the calling thread. Here
+    only tracebacks are rendered up front (they pin frames); messages are
+    formatted by the writer. Records that do not fit in the queue are
+    dropped and counted instead of blocking a request.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _Listener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # Wait for room: a full queue must still be flushed on shutdown
+        self.queue.put(self._sentinel)
+
+
+def _start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(StructuredFormatter(LOG_FORMAT == "json"))
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = _Listener(_handler.queue, output,
+                          respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The writer thread does not survive fork, and the old queue's locks may
+    # have been held by it: give the child its own queue and writer
+    if _handler is not None:
+        _start_listener()
+
+
+def stop_logging():
+    """
+    Flush queued events and stop the writer thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging():
+    """
+    Route all logging through a bounded queue to a background writer
+    """
+    global _handler
+    stop_logging()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    _handler = AsyncQueueHandler(None)
+    _handler.addFilter(
+        SamplingFilter(_parse_mapping(os.environ.get("LOG_SAMPLE_RATES",
+                                                     ""))))
+    _start_listener()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL.upper())
+
+    levels = dict(DEFAULT_LOGGER_LEVELS)
+    levels.update(_parse_mapping(os.environ.get("LOG_LEVELS", "")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+def dropped_events() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
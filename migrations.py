@@ -0,0 +1,58 @@
+import logging
+from sqlalchemy import inspect, text
+
+# Additive schema changes for databases created before a column existed.
+# db.create_all() only creates missing tables, so new columns on existing
+# tables are added here: (table, column, DDL type and default).
+ADDITIVE_COLUMNS = [
+    ("assessment_session", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("stored_file", "content_hash", "VARCHAR(64)"),
+    ("assessment_session", "interview_digest", "TEXT"),
+    ("assessment_session", "final_summary", "TEXT"),
+    ("idempotency_record", "content_type", "VARCHAR(255)"),
+]
+
+# Indexes added to existing tables the same way: (table, index name, columns)
+ADDITIVE_INDEXES = [
+    ("assessment_session", "ix_assessment_session_created_at_id",
+     "created_at, id"),
+    ("assessment_session", "ix_assessment_session_status_created_at_id",
+     "status, created_at, id"),
+]
+
+
+def init_db(db):
+    """
+    Create missing tables, then add missing columns to existing ones
+    """
+    db.create_all()
+    upgrade_schema(db)
+
+
+def upgrade_schema(db):
+    """
+    Add any missing columns and indexes from ADDITIVE_COLUMNS and
+    ADDITIVE_INDEXES to existing tables
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with db.engine.begin() as connection:
+        for table, column, ddl in ADDITIVE_COLUMNS:
+            if table not in existing_tables:
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table)}
+            if column in columns:
+                continue
+            logging.info(f"Adding column {table}.{column}")
+            connection.execute(
+                text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+        for table, index, columns in ADDITIVE_INDEXES:
+            if table not in existing_tables:
+                continue
+            if index in {i["name"] for i in inspector.get_indexes(table)}:
+                continue
+            logging.info(f"Adding index {index} on {table}")
+            connection.execute(
+                text(f"CREATE INDEX {index} ON {table} ({columns})"))
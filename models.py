@@ -1,18 +1,38 @@
 from app import db
+from services.text_compression import CompressedText
 from datetime import datetime
+import ast
 import json
 
 class AssessmentSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     cv_filename = db.Column(db.String(255), nullable=False)
-    cv_content = db.Column(db.Text, nullable=False)
-    cv_analysis = db.Column(db.Text, nullable=True)
-    questions_answers = db.Column(db.Text, nullable=True)  # JSON string
+    cv_content = db.Column(CompressedText, nullable=False)
+    cv_analysis = db.Column(CompressedText, nullable=True)
+    questions_answers = db.Column(CompressedText, nullable=True)  # JSON string
+    interview_digest = db.Column(db.Text, nullable=True)  # JSON, see services/interview_digest.py
+    final_summary = db.Column(db.Text, nullable=True)  # summary in the latest report, reused by reports-rerender
     current_question_index = db.Column(db.Integer, default=0)
     status = db.Column(db.String(50), default='started')  # started, in_progress, completed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every write so cached copies in other workers can detect staleness
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {"version_id_col": version}
+    # Keyset pagination of exports (services/session_export.py)
+    __table_args__ = (
+        db.Index('ix_assessment_session_created_at_id', 'created_at', 'id'),
+        db.Index('ix_assessment_session_status_created_at_id', 'status',
+                 'created_at', 'id'),
+    )
+
+    def get_cv_analysis(self):
+        # Stored as str(dict) by analyze_cv
+        if self.cv_analysis:
+            return ast.literal_eval(self.cv_analysis)
+        return {}
 
     def get_questions_answers(self):
         if self.questions_answers:
@@ -22,6 +42,11 @@ class AssessmentSession(db.Model):
     def set_questions_answers(self, qa_list):
         self.questions_answers = json.dumps(qa_list)
 
+    def get_interview_digest(self):
+        if self.interview_digest:
+            return json.loads(self.interview_digest)
+        return {}
+
     def add_question_answer(self, question, answer):
         qa_list = self.get_questions_answers()
         qa_list.append({
@@ -36,5 +61,77 @@ class AudioFile(db.Model):
     session_id = db.Column(db.String(100), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
-    transcription = db.Column(db.Text, nullable=True)
+    transcription = db.Column(CompressedText, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdempotencyRecord(db.Model):
+    """Stored response for a request carrying an Idempotency-Key header"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(100), nullable=False)  # assessment session ID
+    key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)  # NULL while in progress
+    response_body = db.Column(db.Text, nullable=True)
+    content_type = db.Column(db.String(255), nullable=True)  # of the stored response
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('scope', 'key'),)
+
+class StoredFile(db.Model):
+    """Index of files kept by the storage manager (services/storage_service.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    storage_class = db.Column(db.String(20), nullable=False)  # audio, cv, report
+    name = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    content_hash = db.Column(db.String(64), nullable=True)  # sha256, used as ETag
+    session_id = db.Column(db.String(100), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (db.UniqueConstraint('storage_class', 'name'),)
+
+class StoredFileRef(db.Model):
+    """Session using a shared (content-addressed) stored file; keeps it from eviction while the session is live"""
+    id = db.Column(db.Integer, primary_key=True)
+    stored_file_id = db.Column(db.Integer, db.ForeignKey('stored_file.id'), nullable=False, index=True)
+    session_id = db.Column(db.String(100), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('stored_file_id', 'session_id'),)
+
+class AvatarSession(db.Model):
+    """HeyGen streaming session created by the avatar pool (services/heygen_service.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    heygen_session_id = db.Column(db.String(100), unique=True, nullable=False)
+    url = db.Column(db.String(500), nullable=False)  # LiveKit server URL
+    access_token = db.Column(db.Text, nullable=False)  # LiveKit room token
+    session_token = db.Column(db.Text, nullable=False)  # HeyGen streaming token
+    status = db.Column(db.String(20), nullable=False, default='ready', index=True)  # ready, claimed, closed
+    assessment_session_id = db.Column(db.String(100), nullable=True, index=True)
+    warmup_ms = db.Column(db.Integer, nullable=True)  # time to create and start upstream
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=True, index=True)
+
+class Lease(db.Model):
+    """Time-limited claim on a job only one process in the cluster should run (services/leases.py)"""
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False)  # host:pid of the holder
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class BatchCV(db.Model):
+    """Checkpoint of one CV in an offline batch analysis (services/batch_assessment.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    batch_name = db.Column(db.String(100), nullable=False)
+    source_path = db.Column(db.String(500), nullable=False)  # relative to the batch directory
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the file
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, extracted, submitted, analyzed, failed
+    assessment_session_id = db.Column(db.String(100), nullable=True)
+    gemini_batch_job = db.Column(db.String(200), nullable=True)  # batch-submission mode only
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('batch_name', 'source_path'),)
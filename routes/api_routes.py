@@ -1,60 +1,100 @@
-from flask import Blueprint, request, jsonify, session, send_file
+from flask import Blueprint, Response, current_app, request, jsonify, session, stream_with_context
+import asyncio
 import os
 import logging
 import uuid
 import json
-from datetime import datetime
-from app import db, app
+from sqlalchemy import update
+from app import admin_authorized, db
 from models import AssessmentSession, AudioFile
-from services.gemini_service import analyze_cv_content, generate_first_question, generate_followup_question, generate_final_summary
-from services.speech_service import text_to_speech, speech_to_text
-from services.document_service import generate_assessment_report, create_report_filename
+from services.async_runtime import run_upstream, spawn_upstream
+from services.coverage import fallback_question, track, uncovered_areas
+from services.idempotency import idempotent
+from services.interview_digest import update_digest_async
+from services.session_cache import session_cache
+from services.storage_service import storage, blob_key, AUDIO, REPORT
+from services.stt_service import stt, StreamError
+from services.heygen_service import avatar_pool, create_token_async, create_session_async, send_task_async, stop_session_async, websocket_url
+from services.gemini_service import analyze_cv_content_async, generate_first_question_async, generate_followup_question_async, generate_final_summary_async, fallback_summary, FALLBACK_CV_ANALYSIS, FALLBACK_FIRST_QUESTION
+from services.speech_service import text_to_speech_async, audio_stem, audio_mimetype, AUDIO_FORMATS, TTS_AUDIO_FORMATS
 
 api_bp = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
+
+# Audio names are content-addressed, so browsers and CDNs may keep them
+AUDIO_CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+def _get_assessment_session(session_id):
+    return AssessmentSession.query.filter_by(session_id=session_id).first()
+
+
+def _record_report(session_id, report_filename, final_summary, stored):
+    storage.register(REPORT, report_filename, session_id, *stored)
+    # Kept so `flask reports-rerender` can rebuild the PDF without Gemini.
+    # Cached session state does not hold it, so the version is not bumped.
+    db.session.execute(
+        update(AssessmentSession).where(
+            AssessmentSession.session_id == session_id).values(
+                final_summary=final_summary).execution_options(
+                    synchronize_session=False))
+    db.session.commit()
+
+
+async def _refresh_digest(session_id, digest, qa_list):
+    """
+    Fold new answers into the session's interview digest (in memory; it is
+    persisted with the next save). Runs on the upstream loop.
+    """
+    digest = await update_digest_async(digest, qa_list)
+
+    def apply():
+        state = session_cache.get(session_id)
+        # An older update finishing late must not replace a newer one
+        if state and state.interview_digest.get('turns', 0) < digest['turns']:
+            session_cache.update_cached(session_id, interview_digest=digest)
+
+    await asyncio.to_thread(apply)
+    return digest
 
 
 @api_bp.route('/analyze_cv', methods=['POST'])
-def analyze_cv():
+@idempotent(serialize=True)
+async def analyze_cv():
     """Analyze CV content and generate first question"""
     try:
         session_id = session.get('assessment_session_id')
         if not session_id:
             return jsonify({'error': 'No active session'}), 400
 
-        assessment_session = AssessmentSession.query.filter_by(
-            session_id=session_id).first()
+        assessment_session = await asyncio.to_thread(_get_assessment_session,
+                                                     session_id)
         if not assessment_session:
             return jsonify({'error': 'Session not found'}), 404
 
         try:
-            # Analyze CV content with Gemini
-            cv_analysis = analyze_cv_content(assessment_session.cv_content)
+            # Sessions prepared by `flask batch-analyze` are already analyzed
+            cv_analysis = assessment_session.get_cv_analysis()
+            if not cv_analysis:
+                # Analyze CV content with Gemini
+                cv_analysis = await run_upstream(
+                    analyze_cv_content_async(assessment_session.cv_content))
 
             # Generate first question
-            first_question = generate_first_question(cv_analysis)
+            first_question = await run_upstream(
+                generate_first_question_async(cv_analysis))
         except Exception as api_error:
-            logging.warning(f"API error, using fallback: {str(api_error)}")
+            logger.warning(f"API error, using fallback: {str(api_error)}")
             # Fallback analysis when Gemini API is not available
-            cv_analysis = {
-                'summary':
-                'Professional with diverse experience and skills',
-                'key_skills':
-                ['Communication', 'Problem Solving', 'Teamwork', 'Leadership'],
-                'experience_years':
-                5,
-                'career_stage':
-                'Mid-level Professional',
-                'notable_achievements':
-                ['Professional development', 'Project completion'],
-                'potential_areas_for_growth':
-                ['Technical skills', 'Leadership development']
-            }
-            first_question = "I'd like to understand your career journey better. What are your current professional goals and what motivates you in your work?"
+            cv_analysis = dict(FALLBACK_CV_ANALYSIS)
+            first_question = FALLBACK_FIRST_QUESTION
 
         # Update session with analysis
-        assessment_session.cv_analysis = str(cv_analysis)
-        assessment_session.status = 'in_progress'
-        db.session.commit()
+        await asyncio.to_thread(session_cache.update,
+                                session_id,
+                                cv_analysis=cv_analysis,
+                                status='in_progress')
+        await asyncio.to_thread(session_cache.save, session_id)
 
         return jsonify({
             'success': True,
@@ -63,12 +103,13 @@ def analyze_cv():
         })
 
     except Exception as e:
-        logging.error(f"Error in analyze_cv: {str(e)}")
+        logger.error(f"Error in analyze_cv: {str(e)}")
         return jsonify({'error': 'Failed to analyze CV'}), 500
 
 
 @api_bp.route('/generate_audio', methods=['POST'])
-def generate_audio():
+@idempotent()
+async def generate_audio():
     """Generate audio from text using TTS"""
     try:
         data = request.get_json()
@@ -77,12 +118,39 @@ def generate_audio():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
 
-        # Generate unique filename
-        audio_filename = f"question_{uuid.uuid4().hex}.mp3"
-        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_filename)
-
-        # Convert text to speech
-        success = text_to_speech(text, audio_path)
+        # Same text, same files: repeated questions reuse earlier audio
+        stem = audio_stem(text)
+        session_id = session.get('assessment_session_id')
+        audio_filename = f"{stem}.mp3"
+
+        formats = ['mp3'] + [f for f in TTS_AUDIO_FORMATS if f != 'mp3']
+        names = [f"{stem}.{f}" for f in formats]
+        records = await asyncio.to_thread(
+            lambda: [storage.lookup(AUDIO, name) for name in names])
+
+        # Convert text to speech, all missing formats at once
+        missing = [(f, name) for f, name, record in zip(formats, names, records)
+                   if record is None]
+        results = await asyncio.gather(*(run_upstream(
+            text_to_speech_async(text, blob_key(AUDIO, name), f))
+                                          for f, name in missing))
+        synthesized = {name: stored
+                       for (_, name), stored in zip(missing, results)
+                       if stored}
+
+        def register_all():
+            # One thread: requests share a single DB session. The files are
+            # shared by every session asking the same question; each one
+            # references them to keep them while it is in progress
+            for name, stored in synthesized.items():
+                storage.register(AUDIO, name, None, *stored)
+            storage.add_references(
+                AUDIO, list(synthesized) + [record.name for record in records
+                                            if record is not None],
+                session_id)
+
+        await asyncio.to_thread(register_all)
+        success = records[0] is not None or audio_filename in synthesized
 
         if success:
             return jsonify({
@@ -93,35 +161,214 @@ def generate_audio():
             return jsonify({'error': 'Failed to generate audio'}), 500
 
     except Exception as e:
-        logging.error(f"Error in generate_audio: {str(e)}")
+        logger.error(f"Error in generate_audio: {str(e)}")
         return jsonify({'error': 'Audio generation failed'}), 500
 
 
 @api_bp.route('/audio/<filename>')
 def serve_audio(filename):
-    """Serve audio files"""
+    """Serve audio files, picking the smallest variant the client accepts"""
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, mimetype='audio/mpeg')
+        stem = os.path.splitext(filename)[0]
+        variants = {}
+        for ext, (_, mimetype) in AUDIO_FORMATS.items():
+            name = f"{stem}.{ext}"
+            record = storage.lookup(AUDIO, name)
+            if record is not None:
+                variants[mimetype] = record
+        response = None
+        if variants:
+            # The requested format wins ties (e.g. "Accept: */*")
+            requested = audio_mimetype(filename)
+            offers = sorted(variants, key=lambda m: m != requested)
+            mimetype = request.accept_mimetypes.best_match(offers) or requested
+            record = variants.get(mimetype) or variants.get(requested)
+            if record is not None:
+                response = storage.send(AUDIO, record.name,
+                                        mimetype=audio_mimetype(record.name),
+                                        max_age=AUDIO_CACHE_MAX_AGE,
+                                        immutable=True,
+                                        record=record)
+                if response is not None:
+                    response.vary.add('Accept')
+        if response is None:
+            # Audio written before the index or before content addressing
+            response = storage.send(AUDIO, filename,
+                                    mimetype=audio_mimetype(filename))
+        if response is not None:
+            return response
         else:
             return jsonify({'error': 'Audio file not found'}), 404
     except Exception as e:
-        logging.error(f"Error serving audio: {str(e)}")
+        logger.error(f"Error serving audio: {str(e)}")
         return jsonify({'error': 'Failed to serve audio'}), 500
 
 
+def _stream_error(error: StreamError):
+    body = {'error': str(error)}
+    if error.resend_from is not None:
+        body['resend_from'] = error.resend_from
+    return jsonify(body), error.status_code
+
+
+@api_bp.route('/stt/streams', methods=['POST'])
+def open_stt_stream():
+    """Start server-side transcription of the answer being recorded"""
+    try:
+        session_id = session.get('assessment_session_id')
+        if not session_id:
+            return jsonify({'error': 'No active session'}), 400
+
+        if not stt.enabled:
+            return jsonify({'error': 'Server speech recognition is disabled'}), 503
+
+        record = stt.open(session_id)
+        return jsonify({
+            'success': True,
+            'stream_id': record.id,
+            'sample_rate': current_app.config['STT_SAMPLE_RATE']
+        })
+
+    except Exception as e:
+        logger.error(f"Error in open_stt_stream: {str(e)}")
+        return jsonify({'error': 'Failed to start transcription'}), 500
+
+
+@api_bp.route('/stt/streams/<int:stream_id>/chunks/<int:seq>', methods=['POST'])
+def stt_chunk(stream_id, seq):
+    """Feed one chunk of 16-bit mono PCM and return the partial transcript"""
+    try:
+        partial, persisted = stt.feed(stream_id,
+                                      session.get('assessment_session_id'),
+                                      seq, request.get_data())
+        return jsonify({'success': True, 'partial': partial,
+                        'persisted': persisted})
+
+    except StreamError as e:
+        return _stream_error(e)
+    except Exception as e:
+        logger.error(f"Error in stt_chunk: {str(e)}")
+        return jsonify({'error': 'Failed to process audio'}), 500
+
+
+@api_bp.route('/stt/streams/<int:stream_id>/finish', methods=['POST'])
+def finish_stt_stream(stream_id):
+    """Finish a recording and return its final transcript"""
+    try:
+        data = request.get_json(silent=True) or {}
+        record = stt.finish(stream_id, session.get('assessment_session_id'),
+                            int(data.get('chunks', 0)))
+        return jsonify({
+            'success': True,
+            'transcript': record.transcription,
+            'audio_url': f'/api/audio/{record.filename}'
+        })
+
+    except StreamError as e:
+        return _stream_error(e)
+    except Exception as e:
+        logger.error(f"Error in finish_stt_stream: {str(e)}")
+        return jsonify({'error': 'Failed to finish transcription'}), 500
+
+
+@api_bp.route('/avatar/session', methods=['POST'])
+@idempotent(serialize=True)
+async def avatar_session():
+    """Attach the assessment to a ready HeyGen avatar session"""
+    try:
+        session_id = session.get('assessment_session_id')
+        if not session_id:
+            return jsonify({'error': 'No active session'}), 400
+
+        if not avatar_pool.enabled:
+            return jsonify({'error': 'Avatar is not configured'}), 503
+
+        record = await asyncio.to_thread(avatar_pool.claim, session_id)
+        if record is None:
+            # Pool empty: pay the token and session start-up now
+            logger.info("Avatar pool empty, creating a session on demand")
+            token = await run_upstream(create_token_async())
+            info = await run_upstream(
+                create_session_async(token, current_app.config['HEYGEN_IDLE_TIMEOUT']))
+            record = await asyncio.to_thread(avatar_pool.add, info, session_id)
+
+        return jsonify({
+            'success': True,
+            'session_id': record.heygen_session_id,
+            'url': record.url,
+            'access_token': record.access_token,
+            'session_token': record.session_token,
+            'ws_url': websocket_url()
+        })
+
+    except Exception as e:
+        logger.error(f"Error in avatar_session: {str(e)}")
+        return jsonify({'error': 'Failed to start avatar session'}), 500
+
+
+@api_bp.route('/avatar/task', methods=['POST'])
+async def avatar_task():
+    """Make the assessment's avatar say a text"""
+    try:
+        session_id = session.get('assessment_session_id')
+        if not session_id:
+            return jsonify({'error': 'No active session'}), 400
+
+        data = request.get_json()
+        text = data.get('text', '')
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
+
+        record = await asyncio.to_thread(avatar_pool.current, session_id)
+        if not record:
+            return jsonify({'error': 'No avatar session'}), 404
+
+        await run_upstream(
+            send_task_async(record, text, data.get('task_type', 'repeat')))
+        return jsonify({'success': True})
+
+    except Exception as e:
+        logger.error(f"Error in avatar_task: {str(e)}")
+        return jsonify({'error': 'Failed to send text to avatar'}), 500
+
+
+@api_bp.route('/avatar/stop', methods=['POST'])
+async def avatar_stop():
+    """End the assessment's avatar session"""
+    try:
+        session_id = session.get('assessment_session_id')
+        if not session_id:
+            return jsonify({'error': 'No active session'}), 400
+
+        record = await asyncio.to_thread(avatar_pool.current, session_id)
+        if record:
+            try:
+                await run_upstream(
+                    stop_session_async(record.heygen_session_id,
+                                       record.session_token))
+            except Exception as stop_error:
+                logger.warning(
+                    f"Error stopping avatar session: {str(stop_error)}")
+            await asyncio.to_thread(avatar_pool.close, record)
+
+        return jsonify({'success': True})
+
+    except Exception as e:
+        logger.error(f"Error in avatar_stop: {str(e)}")
+        return jsonify({'error': 'Failed to stop avatar session'}), 500
+
+
 @api_bp.route('/submit_answer', methods=['POST'])
-def submit_answer():
+@idempotent(serialize=True)
+async def submit_answer():
     """Submit answer and get next question"""
     try:
         session_id = session.get('assessment_session_id')
         if not session_id:
             return jsonify({'error': 'No active session'}), 400
 
-        assessment_session = AssessmentSession.query.filter_by(
-            session_id=session_id).first()
-        if not assessment_session:
+        state = await asyncio.to_thread(session_cache.get, session_id)
+        if not state:
             return jsonify({'error': 'Session not found'}), 404
 
         data = request.get_json()
@@ -132,17 +379,23 @@ def submit_answer():
             return jsonify({'error': 'Question and answer are required'}), 400
 
         # Add Q&A to session
-        assessment_session.add_question_answer(question, answer)
-        assessment_session.current_question_index += 1
+        state = session_cache.append_answer(state, question, answer)
 
         # Get current Q&A list
-        qa_list = assessment_session.get_questions_answers()
-        logging.info(f"Current Q&A list: {qa_list}")
+        qa_list = list(state.questions_answers)
+        logger.debug("Session %s answered question %d",
+                     session_id,
+                     len(qa_list),
+                     extra={'event': 'answer_submitted'})
 
         # Check if we should continue with more questions (limit to 8 questions)
         if len(qa_list) >= 10:
-            assessment_session.status = 'completed'
-            db.session.commit()
+            # No next question to wait for: bring the digest up to date so
+            # the report is written from the whole interview
+            await run_upstream(
+                _refresh_digest(session_id, state.interview_digest, qa_list))
+            session_cache.update(session_id, status='completed')
+            await asyncio.to_thread(session_cache.save, session_id)
 
             return jsonify({
                 'success': True,
@@ -150,154 +403,164 @@ def submit_answer():
                 'message': 'Assessment completed successfully!'
             })
         else:
+            # Persist the answer while the next question is being generated
+            save = asyncio.ensure_future(
+                asyncio.to_thread(session_cache.save, session_id))
+
+            # Fold this answer into the digest in the background; the next
+            # question is written from the digest so far plus this answer.
+            # An update lost with the worker is caught up on the next turn.
+            digest = state.interview_digest
+            spawn_upstream(_refresh_digest(session_id, digest, qa_list))
+
+            # Local coverage of the strategic areas: the prompt only offers
+            # the uncovered ones, and the fallback asks about the least
+            # covered one
+            coverage = track(state)
+            fallback = fallback_question(coverage, qa_list)
+
             # Generate next question
             try:
-                print(type(assessment_session.cv_analysis))
-                cv_analysis = eval(assessment_session.cv_analysis
-                                   ) if assessment_session.cv_analysis else {}
-                logging.info(f"CV analysis: {cv_analysis}")
-                next_question = generate_followup_question(
-                    cv_analysis, qa_list)
+                cv_analysis = state.cv_analysis
+                next_question = await run_upstream(
+                    generate_followup_question_async(
+                        cv_analysis, qa_list, digest,
+                        uncovered_areas(coverage), fallback))
             except Exception as api_error:
-                logging.warning(
+                logger.warning(
                     f"API error generating question, using fallback: {str(api_error)}"
                 )
-                # Fallback questions when API is not available
-                fallback_questions = [
-                    "Quels défis avez-vous rencontrés dans votre carrière, et comment les avez-vous surmontés ?",
-                    "Quelles compétences ou domaines aimeriez-vous développer davantage ?",
-                    "Décrivez un projet ou une réalisation dont vous êtes particulièrement fier(ère).",
-                    "Qu'est-ce qui vous motive le plus dans votre travail professionnel ?",
-                    "Où voyez-vous votre carrière se diriger dans les prochaines années ?",
-                    "Comment gérez-vous le travail sous pression ou avec des délais serrés ?",
-                    "Quelle expérience de leadership avez-vous, et qu'en avez-vous appris ?",
-                    "Quelle est selon vous votre plus grande force et faiblesse professionnelle ?"
-                ]
-                question_index = min(len(qa_list), len(fallback_questions) - 1)
-                next_question = fallback_questions[question_index]
-
-            db.session.commit()
+                next_question = fallback
+
+            await save
 
             return jsonify({
                 'success': True,
                 'completed': False,
                 'next_question': next_question,
-                'question_number': len(qa_list) + 1
+                # Re-read: saving may have merged turns written by another worker
+                'question_number': len(state.questions_answers) + 1
             })
 
     except Exception as e:
-        logging.error(f"Error in submit_answer: {str(e)}")
+        logger.error(f"Error in submit_answer: {str(e)}")
         return jsonify({'error': 'Failed to submit answer'}), 500
 
 
 @api_bp.route('/generate_report', methods=['POST'])
-def generate_report():
+@idempotent(serialize=True)
+async def generate_report():
     """Generate final assessment report"""
     try:
 
-        logging.info("Starting report generation process")
+        logger.info("Starting report generation process")
         session_id = session.get('assessment_session_id')
         if not session_id:
-            logging.error("No active session found")
+            logger.error("No active session found")
             return jsonify({'error': 'No active session'}), 400
 
-        assessment_session = AssessmentSession.query.filter_by(
-            session_id=session_id).first()
-        if not assessment_session:
-            logging.error(f"Session not found for ID: {session_id}")
+        state = await asyncio.to_thread(session_cache.get, session_id)
+        if not state:
+            logger.error(f"Session not found for ID: {session_id}")
             return jsonify({'error': 'Session not found'}), 404
 
-        logging.info(f"Assessment session status: {assessment_session.status}")
-        if assessment_session.status != 'completed':
+        logger.info(f"Assessment session status: {state.status}")
+        if state.status != 'completed':
             return jsonify({'error': 'Assessment not completed'}), 400
 
         # Get CV analysis and Q&A pairs
-        try:
-            cv_analysis = eval(assessment_session.cv_analysis
-                               ) if assessment_session.cv_analysis else {}
-        except Exception as e:
-            # Fallback if JSON parsing fails
-            cv_analysis = {
-                'summary': 'CV analysis completed',
-                'key_skills': [],
-                'experience_years': 0,
-                'career_stage': 'Professional',
-                'notable_achievements': [],
-                'potential_areas_for_growth': []
-            }
-        qa_pairs = assessment_session.get_questions_answers()
+        cv_analysis = state.cv_analysis
+        qa_pairs = list(state.questions_answers)
 
         # Generate final summary using Gemini API
-        logging.info("Generating final summary using Gemini API")
+        logger.info("Generating final summary using Gemini API")
         try:
-            final_summary = generate_final_summary(cv_analysis, qa_pairs)
+            # Normally a no-op: the digest was completed with the last answer
+            digest = await run_upstream(
+                _refresh_digest(session_id, state.interview_digest, qa_pairs))
+            final_summary = await run_upstream(
+                generate_final_summary_async(cv_analysis, qa_pairs, digest))
         except Exception as summary_error:
-            logging.warning(
+            logger.warning(
                 f"Error generating summary with API, using fallback: {str(summary_error)}"
             )
-            final_summary = f"""Résumé de l'Évaluation Professionnelle
-
-Cette évaluation complète a été réalisée avec {len(qa_pairs)} questions d'entretien basées sur l'analyse du CV du candidat.
-
-Points Clés de l'Évaluation :
-• Compétences de Communication : Réponses claires et articulées démontrées tout au long de l'entretien
-• Expérience Professionnelle : Les réponses ont montré une bonne compréhension de la progression de carrière et des défis
-• Compétence Technique : Les réponses reflètent des connaissances appropriées pour le niveau de carrière
-• Orientation Future : Le candidat a montré une réflexion approfondie sur le développement professionnel
-
-Évaluation Globale :
-Le candidat a bien performé lors de cette évaluation vocale, fournissant des réponses réfléchies et complètes à toutes les questions. Les réponses démontrent de solides compétences en communication et une conscience professionnelle. Basé sur la performance de l'entretien, le candidat montre un excellent potentiel pour une croissance et un développement professionnel continus.
-
-Évaluation complétée le {datetime.now().strftime('%d %B %Y à %H:%M')}"""
+            final_summary = fallback_summary(len(qa_pairs))
 
         # Generate PDF report
-        logging.info("Generating PDF report")
+        logger.info("Generating PDF report")
+        # ReportLab is only imported once a report is actually generated
+        from services.document_service import generate_assessment_report, create_report_filename
         report_filename = create_report_filename(session_id)
-        report_path = os.path.join(app.config['REPORTS_FOLDER'],
-                                   report_filename)
-
-        # Ensure reports directory exists
-        os.makedirs(app.config['REPORTS_FOLDER'], exist_ok=True)
-        logging.info(f"Report will be saved to: {report_path}")
-
-        success = generate_assessment_report(cv_analysis, qa_pairs,
-                                             final_summary, report_path)
-
-        if success:
-            logging.info("Report generated successfully")
+        report_key = blob_key(REPORT, report_filename)
+        logger.info(f"Report will be saved to: {report_key}")
+
+        # ReportLab rendering is blocking work; keep it off the event loop
+        stored = await asyncio.to_thread(generate_assessment_report,
+                                         cv_analysis, qa_pairs,
+                                         final_summary, report_key)
+
+        if stored:
+            await asyncio.to_thread(_record_report, session_id,
+                                    report_filename, final_summary, stored)
+            logger.info("Report generated successfully")
             return jsonify({
                 'success': True,
                 'report_url': f'/download_report/{session_id}',
                 'summary': final_summary
             })
         else:
-            logging.error("Failed to generate PDF report")
+            logger.error("Failed to generate PDF report")
             return jsonify({'error': 'Failed to generate report'}), 500
 
     except Exception as e:
-        logging.error(f"Error in generate_report: {str(e)}")
+        logger.error(f"Error in generate_report: {str(e)}")
         import traceback
-        logging.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error(f"Full traceback: {traceback.format_exc()}")
         return jsonify({'error': 'Report generation failed'}), 500
 
 
+@api_bp.route('/export/sessions')
+def export_sessions():
+    """Stream sessions as NDJSON or CSV (admin, bearer token)"""
+    from services.session_export import (FORMATS, export_lines, parse_date,
+                                         parse_fields)
+
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)}'}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'))
+        page_size = int(request.args.get('page_size', 500))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    lines = export_lines(export_format, fields,
+                         status=request.args.get('status'),
+                         since=since, until=until, page_size=page_size)
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(lines), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename=sessions.{export_format}')
+    return response
+
+
 @api_bp.route('/debug_session')
 def debug_session():
     """Debug endpoint to check session status"""
     session_id = session.get('assessment_session_id')
     if session_id:
-        assessment_session = AssessmentSession.query.filter_by(
-            session_id=session_id).first()
-        if assessment_session:
+        state = session_cache.get(session_id)
+        if state:
             return jsonify({
-                'session_id':
-                session_id,
-                'status':
-                assessment_session.status,
-                'questions_count':
-                len(assessment_session.get_questions_answers()),
-                'has_cv_analysis':
-                bool(assessment_session.cv_analysis)
+                'session_id': session_id,
+                'status': state.status,
+                'questions_count': len(state.questions_answers),
+                'has_cv_analysis': bool(state.cv_analysis)
             })
         else:
             return jsonify({'error': 'Session not found in database'})
@@ -313,21 +576,18 @@ def session_status():
         if not session_id:
             return jsonify({'error': 'No active session'}), 400
 
-        assessment_session = AssessmentSession.query.filter_by(
-            session_id=session_id).first()
-        if not assessment_session:
+        state = session_cache.get(session_id)
+        if not state:
             return jsonify({'error': 'Session not found'}), 404
 
-        qa_pairs = assessment_session.get_questions_answers()
-
         return jsonify({
             'session_id': session_id,
-            'status': assessment_session.status,
-            'current_question': assessment_session.current_question_index,
-            'total_questions': len(qa_pairs),
-            'cv_filename': assessment_session.cv_filename
+            'status': state.status,
+            'current_question': state.current_question_index,
+            'total_questions': len(state.questions_answers),
+            'cv_filename': state.cv_filename
         })
 
     except Exception as e:
-        logging.error(f"Error in session_status: {str(e)}")
+        logger.error(f"Error in session_status: {str(e)}")
         return jsonify({'error': 'Failed to get session status'}), 500
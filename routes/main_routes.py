@@ -1,12 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session
 from werkzeug.utils import secure_filename
 import os
 import uuid
 import logging
 from app import db
 from models import AssessmentSession
-from services.cv_processor import save_uploaded_file, process_cv_file, allowed_file
-from services.gemini_service import analyze_cv_content, generate_first_question
+from services.session_cache import session_cache
+from services.storage_service import storage, REPORT
+from services.cv_processor import save_uploaded_file, process_cv_blob, allowed_file
 
 main_bp = Blueprint('main', __name__)
 
@@ -34,15 +35,14 @@ def upload_cv():
             return redirect(url_for('main.index'))
 
         # Save the uploaded file
-        from app import app
-        success, filename, file_path = save_uploaded_file(file, app.config['UPLOAD_FOLDER'])
+        success, filename, cv_key = save_uploaded_file(file, current_app.config['UPLOAD_FOLDER'])
 
         if not success:
             flash('Error uploading file. Please try again.', 'error')
             return redirect(url_for('main.index'))
 
         # Extract text from CV
-        cv_content = process_cv_file(file_path, filename)
+        cv_content = process_cv_blob(cv_key, filename)
         if not cv_content:
             flash('Could not extract text from CV. Please ensure it\'s a valid PDF or DOCX file.', 'error')
             return redirect(url_for('main.index'))
@@ -75,6 +75,23 @@ def upload_cv():
         flash('An error occurred while processing your CV. Please try again.', 'error')
         return redirect(url_for('main.index'))
 
+@main_bp.route('/start/<session_id>')
+def start_session(session_id):
+    """Start an assessment prepared by `flask batch-analyze`"""
+    try:
+        assessment_session = AssessmentSession.query.filter_by(session_id=session_id).first()
+        if not assessment_session or assessment_session.status != 'started':
+            flash('This assessment link is invalid or has already been used.', 'error')
+            return redirect(url_for('main.index'))
+
+        session['assessment_session_id'] = session_id
+        return redirect(url_for('main.assessment'))
+
+    except Exception as e:
+        logging.error(f"Error in start_session: {str(e)}")
+        flash('An error occurred. Please try again.', 'error')
+        return redirect(url_for('main.index'))
+
 @main_bp.route('/assessment')
 def assessment():
     """Assessment page - voice interaction"""
@@ -84,7 +101,7 @@ def assessment():
             flash('No active assessment session. Please upload your CV first.', 'error')
             return redirect(url_for('main.index'))
 
-        assessment_session = AssessmentSession.query.filter_by(session_id=session_id).first()
+        assessment_session = session_cache.get(session_id)
         if not assessment_session:
             flash('Assessment session not found. Please start a new assessment.', 'error')
             return redirect(url_for('main.index'))
@@ -142,22 +159,29 @@ def new_assessment():
 def download_report(session_id):
     """Download assessment report"""
     try:
-        from app import app
         # Find the report file
-        report_filename = None
-        reports_dir = app.config['REPORTS_FOLDER']
-        
-        for filename in os.listdir(reports_dir):
-            if filename.startswith(f'assessment_report_{session_id}'):
-                report_filename = filename
-                break
-        
-        if not report_filename:
+        record = storage.latest_for_session(REPORT, session_id)
+        report_name = record.name if record else None
+
+        if not report_name:
+            # Reports written before the storage index live flat in reports/
+            reports_dir = current_app.config['REPORTS_FOLDER']
+            for filename in os.listdir(reports_dir):
+                if filename.startswith(f'assessment_report_{session_id}'):
+                    report_name = filename
+                    break
+
+        response = None
+        if report_name:
+            response = storage.send(REPORT, report_name,
+                                    mimetype='application/pdf',
+                                    download_name=f'assessment_report_{session_id}.pdf')
+
+        if response is None:
             flash('Report not found. Please generate the report first.', 'error')
             return redirect(url_for('main.report'))
-        
-        report_path = os.path.join(reports_dir, report_filename)
-        return send_file(report_path, as_attachment=True, download_name=f'assessment_report_{session_id}.pdf')
+
+        return response
         
     except Exception as e:
         logging.error(f"Error in download_report: {str(e)}")
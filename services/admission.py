@@ -0,0 +1,339 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, g, jsonify, request, session
+
+from app import admin_authorized
+
+# Concurrency class per endpoint; anything else under /api is 'default'.
+# Slow upstream-bound routes get their own small pools so they can never
+# take the threads cheap routes (session_status, audio) need.
+ROUTE_CLASSES = {
+    'api.analyze_cv': 'llm',
+    'api.submit_answer': 'llm',
+    'api.generate_report': 'llm',
+    'api.generate_audio': 'tts',
+    'api.avatar_session': 'avatar',
+    'api.avatar_task': 'avatar',
+    'api.avatar_stop': 'avatar',
+    'main.upload_cv': 'upload',
+    'api.export_sessions': 'export',
+    'api.stt_chunk': 'stream',
+    'api.serve_audio': 'stream',
+}
+
+DEFAULT_LIMITS = ('llm=16,tts=16,avatar=8,upload=4,export=2,stream=32,'
+                  'default=64')
+
+# Paced by the recording or the player rather than by the client (a chunk
+# every half second, range requests for audio): these skip the token
+# buckets and only take a slot in their class
+RATE_LIMIT_EXEMPT = {'api.stt_chunk', 'api.serve_audio'}
+
+# Waiters are served in priority order, then arrival order
+PRIORITY_INTERVIEW = 0
+PRIORITY_NEW_SESSION = 1
+
+# Requests that start an interview rather than continue one: the CV upload
+# and its analysis, which shares the llm class with answers and reports
+NEW_SESSION_ENDPOINTS = {'main.upload_cv', 'api.analyze_cv'}
+
+# Arrival time (epoch seconds) set by asgi.py before the request waits for
+# a thread, so time spent queued there counts against the queue budget.
+# Behind a proxy, X-Request-Start: t=<epoch seconds or ms> works too.
+ARRIVAL_ENVIRON_KEY = 'admission.arrived_at'
+
+# Client buckets kept in memory (least recently used are forgotten)
+MAX_CLIENTS = 10000
+
+
+def _parse_limits(value: str) -> dict:
+    limits = {}
+    for item in value.split(','):
+        if '=' in item:
+            name, limit = item.split('=', 1)
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+class _Gate:
+    """
+    Concurrency limit with a bounded, prioritized wait queue
+
+    When the queue is full a waiting new session is shed to make room for
+    an interview in progress.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        # Metrics
+        self.admitted = 0
+        self.queued = 0
+        self.shed = {'expired': 0, 'queue_full': 0, 'timeout': 0, 'evicted': 0}
+        self.wait_seconds = 0.0
+
+    def acquire(self, priority: int, timeout: float) -> str:
+        """
+        Wait for a slot; returns None when admitted, else why it was shed
+        """
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return None
+            if len(self._waiters) >= self.queue_size:
+                worst = max(self._waiters)
+                if worst[0] <= priority:
+                    self.shed['queue_full'] += 1
+                    return 'queue_full'
+                self._waiters.remove(worst)
+                heapq.heapify(self._waiters)
+                worst[2]['state'] = 'evicted'
+                worst[2]['event'].set()
+            waiter = {'state': 'waiting', 'event': threading.Event()}
+            heapq.heappush(self._waiters,
+                           (priority, next(self._order), waiter))
+            self.queued += 1
+
+        started = time.monotonic()
+        waiter['event'].wait(timeout)
+        with self._lock:
+            self.wait_seconds += time.monotonic() - started
+            if waiter['state'] == 'waiting':
+                # Timed out; a slot handed over after this is not ours
+                waiter['state'] = 'timeout'
+                self._waiters = [w for w in self._waiters if w[2] is not waiter]
+                heapq.heapify(self._waiters)
+            if waiter['state'] == 'admitted':
+                self.admitted += 1
+                return None
+            self.shed[waiter['state']] += 1
+            return waiter['state']
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the next waiter
+                _, _, waiter = heapq.heappop(self._waiters)
+                waiter['state'] = 'admitted'
+                waiter['event'].set()
+            else:
+                self.active -= 1
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+
+class _TokenBuckets:
+    """Per-client token buckets: `rate` requests per second, up to `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def take(self, client: str) -> float:
+        """
+        Spend a token; returns 0, or the seconds until one is available
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class AdmissionController:
+    """
+    Admission control for /api and new interviews (/upload)
+
+    Each request first spends a token from its client's bucket (429 when
+    empty), keyed by the assessment session or else the client address,
+    then takes a slot in its route class (ROUTE_CLASSES). When the
+    class is full it waits in a bounded queue, interviews in progress ahead
+    of new sessions. ADMISSION_QUEUE_TIMEOUT bounds the total time queued,
+    including any wait for a request thread before reaching Flask. Requests
+    that cannot be admitted get an immediate 503 with Retry-After instead
+    of tying up a worker until it times out. Limits, queues and counters
+    are per worker process; /metrics exposes them to EXPORT_API_TOKEN
+    bearers.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.gates = {}
+        self.buckets = None
+
+    def init_app(self, app):
+        app.config.setdefault('ADMISSION_ENABLED',
+                              os.environ.get('ADMISSION_ENABLED', '1') == '1')
+        # Concurrent requests per route class, e.g. "llm=16,default=64"
+        app.config.setdefault('ADMISSION_LIMITS',
+                              os.environ.get('ADMISSION_LIMITS',
+                                             DEFAULT_LIMITS))
+        app.config.setdefault('ADMISSION_QUEUE_SIZE', int(
+            os.environ.get('ADMISSION_QUEUE_SIZE', '32')))
+        app.config.setdefault('ADMISSION_QUEUE_TIMEOUT', float(
+            os.environ.get('ADMISSION_QUEUE_TIMEOUT', '5')))
+        # Requests per second per session or client (0 disables the buckets)
+        app.config.setdefault('ADMISSION_RATE', float(
+            os.environ.get('ADMISSION_RATE', '10')))
+        app.config.setdefault('ADMISSION_BURST', float(
+            os.environ.get('ADMISSION_BURST', '40')))
+        app.config.setdefault('ADMISSION_RETRY_AFTER', int(
+            os.environ.get('ADMISSION_RETRY_AFTER', '5')))
+
+        self.app = app
+        limits = _parse_limits(DEFAULT_LIMITS)
+        limits.update(_parse_limits(app.config['ADMISSION_LIMITS']))
+        self.gates = {
+            name: _Gate(name, limit, app.config['ADMISSION_QUEUE_SIZE'])
+            for name, limit in limits.items()
+        }
+        self.buckets = _TokenBuckets(app.config['ADMISSION_RATE'],
+                                     app.config['ADMISSION_BURST'])
+        app.extensions['admission'] = self
+
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def route_class(self, endpoint: str) -> str:
+        """
+        Concurrency class of an endpoint, or None if it is not controlled
+        """
+        if endpoint in ROUTE_CLASSES:
+            return ROUTE_CLASSES[endpoint]
+        if endpoint and endpoint.startswith('api.'):
+            return 'default'
+        return None
+
+    def _admit(self):
+        if not self.app.config['ADMISSION_ENABLED']:
+            return None
+        name = self.route_class(request.endpoint)
+        if name is None:
+            return None
+
+        wait = 0
+        if (self.buckets.rate > 0 and
+                request.endpoint not in RATE_LIMIT_EXEMPT):
+            wait = self.buckets.take(self._client())
+        if wait:
+            return self._reject('Too many requests', 429, wait)
+
+        if (request.endpoint in NEW_SESSION_ENDPOINTS or
+                not session.get('assessment_session_id')):
+            priority = PRIORITY_NEW_SESSION
+        else:
+            priority = PRIORITY_INTERVIEW
+        gate = self.gates[name]
+        budget = self.app.config['ADMISSION_QUEUE_TIMEOUT'] - self._queued_for()
+        if budget <= 0:
+            # Already waited too long for a thread; the client has likely
+            # given up, so free the thread at once
+            gate.shed['expired'] += 1
+            reason = 'expired'
+        else:
+            reason = gate.acquire(priority, budget)
+        if reason:
+            logging.info("Shedding %s (%s): %s", request.endpoint, name,
+                         reason)
+            return self._reject('Server busy, please retry', 503,
+                                self.app.config['ADMISSION_RETRY_AFTER'])
+        g.admission_gate = gate
+        return None
+
+    @staticmethod
+    def _client() -> str:
+        # The client address comes from X-Forwarded-For via ProxyFix
+        # (PROXY_FIX_X_FOR), so candidates behind one NAT share a bucket
+        # only until they have a session
+        session_id = session.get('assessment_session_id')
+        if session_id:
+            return f"session:{session_id}"
+        return f"addr:{request.remote_addr or 'unknown'}"
+
+    def _queued_for(self) -> float:
+        arrived = request.environ.get(ARRIVAL_ENVIRON_KEY)
+        if arrived is None:
+            header = request.headers.get('X-Request-Start', '')
+            try:
+                arrived = float(header.removeprefix('t='))
+            except ValueError:
+                return 0.0
+            if arrived > 1e11:
+                arrived /= 1000
+        return max(0.0, time.time() - arrived)
+
+    def _release(self, exc=None):
+        gate = g.pop('admission_gate', None)
+        if gate is not None:
+            gate.release()
+
+    def _reject(self, message: str, status: int, retry_after: float):
+        response = jsonify({'error': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def metrics(self):
+        """
+        Prometheus text exposition of this worker's admission counters
+        """
+        if not admin_authorized():
+            return jsonify({'error': 'Unauthorized'}), 401
+        pid = os.getpid()
+        families = [
+            ('admission_active', 'gauge', lambda gate: gate.active),
+            ('admission_queue_depth', 'gauge', lambda gate: gate.depth),
+            ('admission_admitted_total', 'counter',
+             lambda gate: gate.admitted),
+            ('admission_queued_total', 'counter', lambda gate: gate.queued),
+            ('admission_queue_wait_seconds_total', 'counter',
+             lambda gate: round(gate.wait_seconds, 3)),
+        ]
+        lines = []
+        for family, kind, value in families:
+            lines.append(f'# TYPE {family} {kind}')
+            lines += [f'{family}{{class="{name}",pid="{pid}"}} {value(gate)}'
+                      for name, gate in sorted(self.gates.items())]
+        lines.append('# TYPE admission_shed_total counter')
+        for name, gate in sorted(self.gates.items()):
+            lines += [
+                f'admission_shed_total{{class="{name}",pid="{pid}",'
+                f'reason="{reason}"}} {count}'
+                for reason, count in sorted(gate.shed.items())
+            ]
+        lines += ['# TYPE admission_rate_limited_total counter',
+                  f'admission_rate_limited_total{{pid="{pid}"}} '
+                  f'{self.buckets.limited}']
+        return Response('\n'.join(lines) + '\n',
+                        mimetype='text/plain; version=0.0.4')
+
+
+admission = AdmissionController()
@@ -0,0 +1,376 @@
+import ast
+import json
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+
+import numpy
+from sqlalchemy import tuple_
+
+from app import db
+from models import AssessmentSession
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: segments are written as .npz without it
+    pyarrow = None
+
+# Operational and quality statistics over completed sessions.
+#
+# `flask analytics-build` materializes per-session and per-turn metrics into
+# columnar segment files (Parquet with pyarrow, else NumPy .npz) under
+# ANALYTICS_DIR. Each build only reads sessions updated since the previous
+# one (keyset on (updated_at, id)) and appends a segment; a session updated
+# again appears in a later segment, and loading keeps its latest copy.
+# `flask analytics-report` loads the columns and aggregates them with NumPy,
+# without touching the database.
+
+MANIFEST = 'manifest.json'
+# Sessions read per query while building
+PAGE_SIZE = 2000
+# Rebuild from scratch once this many segments have accumulated
+MAX_SEGMENTS = 200
+# Re-read sessions updated this long before the watermark, in case a slow
+# transaction committed an older updated_at after the previous build
+OVERLAP_SECONDS = 300
+
+SESSION_COLUMNS = {
+    'id': 'int64',
+    'segment': 'int32',
+    'created_at': 'float64',  # epoch seconds, UTC
+    'completed_at': 'float64',
+    'duration_s': 'float64',
+    'turns': 'int16',
+    'fallback_turns': 'int16',
+    'answer_words': 'int32',
+    'experience_years': 'int16',  # -1 when unknown
+    'career_stage': 'int16',  # index into the manifest's career_stages
+}
+TURN_COLUMNS = {
+    'session_id': 'int64',
+    'segment': 'int32',
+    'turn': 'int16',
+    'answer_chars': 'int32',
+    'answer_words': 'int32',
+    'latency_s': 'float32',  # since the previous answer; NaN for the first
+    'fallback': 'int8',
+}
+
+EXPERIENCE_BUCKETS = (0, 3, 6, 11)  # 0-2, 3-5, 6-10, 11+ years
+
+
+def _fallback_texts() -> set:
+    from services.gemini_service import (AREA_QUESTIONS,
+                                         DEFAULT_FIRST_QUESTION,
+                                         FALLBACK_FIRST_QUESTION,
+                                         FALLBACK_QUESTIONS)
+    return ({DEFAULT_FIRST_QUESTION, FALLBACK_FIRST_QUESTION} |
+            set(FALLBACK_QUESTIONS) | set(AREA_QUESTIONS.values()))
+
+
+def _epoch(value) -> float:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+class AnalyticsStore:
+    """
+    Columnar segment files plus a manifest: the build watermark, the
+    segment list and the career stage dictionary
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'watermark': None, 'recent': {}, 'segments': [],
+                    'career_stages': []}
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def reset(self):
+        for name in self.manifest['segments']:
+            for table in ('sessions', 'turns'):
+                try:
+                    os.remove(self._path(name, table))
+                except FileNotFoundError:
+                    pass
+        self.manifest = {'watermark': None, 'recent': {}, 'segments': [],
+                         'career_stages': []}
+        self._write_manifest()
+
+    # ---------- Files ----------
+
+    def _path(self, segment: str, table: str) -> str:
+        ext = 'parquet' if segment.endswith('.parquet') else 'npz'
+        return os.path.join(self.directory,
+                            f"{segment.rsplit('.', 1)[0]}.{table}.{ext}")
+
+    def _write(self, segment: str, table: str, columns: dict):
+        path = self._path(segment, table)
+        tmp_path = path + '.tmp'
+        if pyarrow is not None:
+            pyarrow.parquet.write_table(pyarrow.table(columns), tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                numpy.savez(f, **columns)
+        os.replace(tmp_path, path)
+
+    def _read(self, segment: str, table: str) -> dict:
+        path = self._path(segment, table)
+        if segment.endswith('.parquet'):
+            data = pyarrow.parquet.read_table(path)
+            return {name: data[name].to_numpy() for name in data.column_names}
+        with numpy.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    # ---------- Build ----------
+
+    def build(self) -> int:
+        """
+        Materialize sessions completed or updated since the last build;
+        returns the number of sessions written
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if len(self.manifest['segments']) >= MAX_SEGMENTS:
+            logging.info("Compacting analytics segments")
+            self.reset()
+
+        fallbacks = _fallback_texts()
+        stages = {stage: i
+                  for i, stage in enumerate(self.manifest['career_stages'])}
+        sessions = {name: [] for name in SESSION_COLUMNS}
+        turns = {name: [] for name in TURN_COLUMNS}
+        number = len(self.manifest['segments'])
+        written = 0
+
+        # Sessions of the overlap window already materialized, by updated_at
+        seen = self.manifest.get('recent', {})
+        recent = {}
+        for row in self._changed_sessions():
+            updated = row.updated_at.isoformat()
+            recent[str(row.id)] = updated
+            if seen.get(str(row.id)) == updated:
+                continue
+            qa_list = json.loads(row.questions_answers or '[]')
+            try:
+                analysis = ast.literal_eval(row.cv_analysis or '{}')
+            except (ValueError, SyntaxError):
+                analysis = {}
+            stage = str(analysis.get('career_stage') or '')
+            if stage not in stages:
+                stages[stage] = len(stages)
+            try:
+                experience = int(analysis.get('experience_years'))
+            except (TypeError, ValueError):
+                experience = -1
+
+            previous = _epoch(row.created_at)
+            words_total = fallback_total = 0
+            for index, qa in enumerate(qa_list):
+                answer = qa.get('answer', '')
+                words = len(answer.split())
+                fallback = qa.get('question') in fallbacks
+                answered = (_epoch(qa['timestamp'])
+                            if qa.get('timestamp') else float('nan'))
+                turns['session_id'].append(row.id)
+                turns['segment'].append(number)
+                turns['turn'].append(index)
+                turns['answer_chars'].append(len(answer))
+                turns['answer_words'].append(words)
+                turns['latency_s'].append(
+                    answered - previous if index else float('nan'))
+                turns['fallback'].append(fallback)
+                previous = answered
+                words_total += words
+                fallback_total += fallback
+
+            created = _epoch(row.created_at)
+            # The last answer, rather than updated_at, which later report
+            # generations move
+            completed = (previous if qa_list and not math.isnan(previous)
+                         else _epoch(row.updated_at))
+            sessions['id'].append(row.id)
+            sessions['segment'].append(number)
+            sessions['created_at'].append(created)
+            sessions['completed_at'].append(completed)
+            sessions['duration_s'].append(completed - created)
+            sessions['turns'].append(len(qa_list))
+            sessions['fallback_turns'].append(fallback_total)
+            sessions['answer_words'].append(words_total)
+            sessions['experience_years'].append(experience)
+            sessions['career_stage'].append(stages[stage])
+            watermark = self.manifest['watermark']
+            if watermark is None or [updated, row.id] > watermark:
+                self.manifest['watermark'] = [updated, row.id]
+            written += 1
+
+        if recent:
+            horizon = (datetime.fromisoformat(max(recent.values())) -
+                       timedelta(seconds=OVERLAP_SECONDS)).isoformat()
+            self.manifest['recent'] = {
+                key: updated for key, updated in recent.items()
+                if updated >= horizon}
+        if not written:
+            self._write_manifest()
+            return 0
+        segment = f"segment-{number:05d}.{'parquet' if pyarrow else 'npz'}"
+        self._write(segment, 'sessions', {
+            name: numpy.asarray(values, dtype=SESSION_COLUMNS[name])
+            for name, values in sessions.items()})
+        self._write(segment, 'turns', {
+            name: numpy.asarray(values, dtype=TURN_COLUMNS[name])
+            for name, values in turns.items()})
+        self.manifest['segments'].append(segment)
+        self.manifest['career_stages'] = sorted(stages, key=stages.get)
+        self._write_manifest()
+        return written
+
+    def _changed_sessions(self):
+        columns = (AssessmentSession.id, AssessmentSession.created_at,
+                   AssessmentSession.updated_at, AssessmentSession.cv_analysis,
+                   AssessmentSession.questions_answers)
+        query = db.session.query(*columns).filter(
+            AssessmentSession.status == 'completed',
+            AssessmentSession.created_at.isnot(None),
+            AssessmentSession.updated_at.isnot(None)).order_by(
+                AssessmentSession.updated_at, AssessmentSession.id)
+        last = self.manifest['watermark']
+        if last is not None:
+            # Sessions read twice are deduplicated when loading
+            last = (datetime.fromisoformat(last[0]) -
+                    timedelta(seconds=OVERLAP_SECONDS), 0)
+        while True:
+            page = query
+            if last is not None:
+                page = page.filter(
+                    tuple_(AssessmentSession.updated_at, AssessmentSession.id)
+                    > tuple_(*last))
+            rows = page.limit(PAGE_SIZE).all()
+            if not rows:
+                return
+            yield from rows
+            last = (rows[-1].updated_at, rows[-1].id)
+
+    # ---------- Load ----------
+
+    def load(self) -> tuple:
+        """
+        (sessions, turns) column dicts, with each session's latest copy only
+        """
+        tables = {'sessions': [], 'turns': []}
+        for segment in self.manifest['segments']:
+            for table in tables:
+                tables[table].append(self._read(segment, table))
+        if not tables['sessions']:
+            empty = {}
+            for table, schema in (('sessions', SESSION_COLUMNS),
+                                  ('turns', TURN_COLUMNS)):
+                empty[table] = {name: numpy.empty(0, dtype=dtype)
+                                for name, dtype in schema.items()}
+            return empty['sessions'], empty['turns']
+
+        sessions, turns = (
+            {name: numpy.concatenate([part[name] for part in parts])
+             for name in parts[0]}
+            for parts in (tables['sessions'], tables['turns']))
+
+        # Segments are in build order: keep the last copy of each session
+        order = numpy.lexsort((sessions['segment'], sessions['id']))
+        ids = sessions['id'][order]
+        last = numpy.append(ids[1:] != ids[:-1], True)
+        keep = order[last]
+        sessions = {name: values[keep] for name, values in sessions.items()}
+
+        # ... and the turns from that copy's segment
+        position = numpy.searchsorted(sessions['id'], turns['session_id'])
+        position = numpy.minimum(position, len(sessions['id']) - 1)
+        current = ((sessions['id'][position] == turns['session_id']) &
+                   (sessions['segment'][position] == turns['segment']))
+        turns = {name: values[current] for name, values in turns.items()}
+        return sessions, turns
+
+
+def _percentiles(values) -> dict:
+    values = values[~numpy.isnan(values)] if values.dtype.kind == 'f' \
+        else values
+    if not len(values):
+        return {'p50': None, 'p90': None, 'p99': None}
+    p50, p90, p99 = numpy.percentile(values, [50, 90, 99])
+    return {'p50': round(float(p50), 2), 'p90': round(float(p90), 2),
+            'p99': round(float(p99), 2)}
+
+
+def _cohorts(labels, sessions: dict, names: list) -> dict:
+    count = numpy.bincount(labels, minlength=len(names))
+    stats = {}
+    for metric in ('duration_s', 'answer_words', 'fallback_turns'):
+        total = numpy.bincount(labels, weights=sessions[metric],
+                               minlength=len(names))
+        stats[metric] = numpy.divide(total, count,
+                                     out=numpy.zeros(len(names)),
+                                     where=count > 0)
+    return {
+        name: {'sessions': int(count[i]),
+               'mean_duration_s': round(float(stats['duration_s'][i]), 1),
+               'mean_answer_words': round(float(stats['answer_words'][i]), 1),
+               'mean_fallback_turns': round(float(stats['fallback_turns'][i]),
+                                            2)}
+        for i, name in enumerate(names) if count[i]
+    }
+
+
+def summarize(sessions: dict, turns: dict, career_stages: list,
+              since: float = None) -> dict:
+    """
+    Aggregate statistics over the loaded columns, optionally only for
+    sessions completed at or after `since` (epoch seconds)
+    """
+    if since is not None:
+        recent = sessions['completed_at'] >= since
+        sessions = {name: values[recent] for name, values in sessions.items()}
+        turns_kept = numpy.isin(turns['session_id'], sessions['id'])
+        turns = {name: values[turns_kept] for name, values in turns.items()}
+
+    experience = sessions['experience_years']
+    known = experience >= 0
+    buckets = numpy.digitize(experience[known], EXPERIENCE_BUCKETS) - 1
+    bucket_names = [f"{low}-{high - 1}"
+                    for low, high in zip(EXPERIENCE_BUCKETS,
+                                         EXPERIENCE_BUCKETS[1:])]
+    bucket_names.append(f"{EXPERIENCE_BUCKETS[-1]}+")
+
+    return {
+        'sessions': int(len(sessions['id'])),
+        'turns': int(len(turns['turn'])),
+        'time_to_completion_s': _percentiles(sessions['duration_s']),
+        'turn_latency_s': _percentiles(turns['latency_s']),
+        'answer_words': _percentiles(turns['answer_words']),
+        'fallback_rate': (round(float(turns['fallback'].mean()), 4)
+                          if len(turns['fallback']) else None),
+        'sessions_with_fallback': (
+            round(float((sessions['fallback_turns'] > 0).mean()), 4)
+            if len(sessions['id']) else None),
+        'career_stage': _cohorts(sessions['career_stage'], sessions,
+                                 [stage or '(unknown)'
+                                  for stage in career_stages]),
+        'experience_years': _cohorts(
+            buckets, {name: values[known]
+                      for name, values in sessions.items()}, bucket_names),
+    }
+
+
+def analytics_store(app) -> AnalyticsStore:
+    return AnalyticsStore(app.config['ANALYTICS_DIR'])
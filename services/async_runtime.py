@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+
+# All async upstream calls (Gemini, ElevenLabs) run on one long-lived event
+# loop per worker process. Flask runs every async view in its own short-lived
+# loop, so clients with connection pools must not be bound to the view's loop;
+# views hand their coroutines over to this loop instead and await the result.
+
+# Seconds pooled upstream connections stay open while idle. httpx's default
+# (5 s) drops them between questions; warmup pings keep them open.
+UPSTREAM_KEEPALIVE_EXPIRY = float(
+    os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "120"))
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def get_upstream_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide upstream event loop, starting it on first use
+    """
+    global _loop, _loop_pid
+
+    # A loop inherited through fork has no thread running it
+    if _loop is not None and _loop_pid == os.getpid():
+        return _loop
+
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever,
+                                      name="upstream-loop",
+                                      daemon=True)
+            thread.start()
+            _loop = loop
+            _loop_pid = os.getpid()
+            logging.info("Started upstream event loop")
+    return _loop
+
+
+def _submit(coro):
+    # The coroutine runs in a fresh context holding only the request ID of
+    # services.traffic_capture. A copy of the caller's context would also
+    # carry Flask's app and request contexts onto the loop thread, where
+    # code checking has_app_context() would then skip pushing its own.
+    from services.traffic_capture import current_request
+    context = contextvars.Context()
+    context.run(current_request.set, current_request.get())
+
+    async def in_context():
+        return await asyncio.get_running_loop().create_task(
+            coro, context=context)
+
+    return asyncio.run_coroutine_threadsafe(in_context(), get_upstream_loop())
+
+
+async def run_upstream(coro):
+    """
+    Await a coroutine on the upstream loop from any other event loop
+    """
+    return await asyncio.wrap_future(_submit(coro))
+
+
+def run_upstream_sync(coro, timeout: float = None):
+    """
+    Run a coroutine on the upstream loop and block until it completes
+    """
+    return _submit(coro).result(timeout)
+
+
+# Futures of spawned tasks, kept so they are not garbage collected mid-run
+_background = set()
+
+
+def spawn_upstream(coro):
+    """
+    Run a coroutine on the upstream loop without waiting for it; a failure
+    is logged
+    """
+    future = _submit(coro)
+    _background.add(future)
+    future.add_done_callback(_background_done)
+    return future
+
+
+def _background_done(future):
+    _background.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(
+            f"Background upstream task failed: {str(future.exception())}")
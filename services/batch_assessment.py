@@ -0,0 +1,368 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from werkzeug.utils import secure_filename
+
+from app import db
+from models import AssessmentSession, BatchCV
+from services.async_runtime import get_upstream_loop
+from services.blob_store import get_blob_store
+from services.cv_processor import allowed_file, process_cv_file
+from services.storage_service import storage, blob_key, CV
+
+# Offline pre-analysis of a directory of CVs ahead of a hiring campaign,
+# run from the CLI (flask batch-analyze) so no web worker is spent on it.
+#
+# Every file gets a BatchCV checkpoint row and moves through
+#   pending -> extracted (text extracted, AssessmentSession created)
+#           -> [submitted (in a Gemini batch job)] -> analyzed
+# Failures are recorded on the row and retried by the next run, up to
+# MAX_ATTEMPTS. An interrupted run resumes where it stopped: finished rows
+# are never redone. Analyzed sessions are ready to start at /start/<id>.
+
+MAX_ATTEMPTS = 3
+# Gemini batch jobs take at most this many inlined requests
+BATCH_JOB_SIZE = 500
+# Retries of one online analysis within a run (rate limits, timeouts)
+ANALYSIS_RETRIES = 2
+
+PENDING = 'pending'
+EXTRACTED = 'extracted'
+SUBMITTED = 'submitted'
+ANALYZED = 'analyzed'
+FAILED = 'failed'
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _extract(path: str) -> str:
+    # Runs in a pool process: PDF parsing is CPU-bound
+    return process_cv_file(path, os.path.basename(path))
+
+
+class _RateLimiter:
+    """Space out request starts to at most `rate` per second (upstream loop)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        await asyncio.sleep(start - now)
+
+
+class BatchAssessment:
+    """
+    One batch of CVs: a directory plus its checkpoint rows
+
+    Must be used inside an app context (the CLI command provides one).
+    """
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.directory = os.path.abspath(directory)
+
+    # ---------- Discovery ----------
+
+    def discover(self) -> int:
+        """
+        Add a checkpoint row for every new (or replaced) CV in the directory;
+        returns the number of rows added or reset
+        """
+        known = {item.source_path: item
+                 for item in BatchCV.query.filter_by(batch_name=self.name)}
+        changed = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in sorted(files):
+                if not allowed_file(filename):
+                    continue
+                path = os.path.join(root, filename)
+                source_path = os.path.relpath(path, self.directory)
+                content_hash = _file_hash(path)
+                item = known.get(source_path)
+                if item is None:
+                    db.session.add(BatchCV(batch_name=self.name,
+                                           source_path=source_path,
+                                           content_hash=content_hash))
+                elif item.content_hash != content_hash:
+                    # File replaced since the last run: start it over
+                    item.content_hash = content_hash
+                    item.status = PENDING
+                    item.assessment_session_id = None
+                    item.gemini_batch_job = None
+                    item.attempts = 0
+                    item.error = None
+                else:
+                    continue
+                changed += 1
+        db.session.commit()
+        return changed
+
+    def _items(self, *statuses) -> list:
+        return BatchCV.query.filter(
+            BatchCV.batch_name == self.name,
+            BatchCV.status.in_(statuses),
+            BatchCV.attempts < MAX_ATTEMPTS).order_by(BatchCV.id).all()
+
+    def _retryable(self, status: str) -> list:
+        # Failed rows go back to the step they failed at
+        items = self._items(status)
+        for item in self._items(FAILED):
+            step = PENDING if item.assessment_session_id is None else EXTRACTED
+            if step == status:
+                items.append(item)
+        return items
+
+    def _fail(self, item: BatchCV, error: str):
+        # The only place an attempt is counted
+        item.status = FAILED
+        item.attempts += 1
+        item.error = error
+        db.session.commit()
+        logging.warning(f"Batch {self.name}: {item.source_path} failed: {error}")
+
+    # ---------- Extraction ----------
+
+    def extract(self, workers: int = None) -> int:
+        """
+        Extract text from pending CVs in a process pool and create their
+        assessment sessions; returns the number extracted
+        """
+        items = self._retryable(PENDING)
+        if not items:
+            return 0
+        done = 0
+        # Forked workers must not reuse the parent's pooled DB connections
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=db.engine.dispose,
+                                 initargs=(False,)) as pool:
+            futures = {
+                pool.submit(_extract,
+                            os.path.join(self.directory, item.source_path)):
+                item
+                for item in items
+            }
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    cv_text = future.result()
+                except Exception as e:
+                    self._fail(item, f"Extraction failed: {str(e)}")
+                    continue
+                if not cv_text:
+                    self._fail(item, "No text could be extracted")
+                    continue
+                self._create_session(item, cv_text)
+                done += 1
+        return done
+
+    def _create_session(self, item: BatchCV, cv_text: str):
+        session_id = str(uuid.uuid4())
+        name, ext = os.path.splitext(
+            secure_filename(os.path.basename(item.source_path)))
+        filename = f"{name}_{item.content_hash[:12]}{ext}"
+        with open(os.path.join(self.directory, item.source_path), 'rb') as f:
+            size_bytes, content_hash = get_blob_store().put_bytes(
+                blob_key(CV, filename), f.read())
+        storage.register(CV, filename, session_id, size_bytes, content_hash)
+
+        db.session.add(AssessmentSession(session_id=session_id,
+                                         cv_filename=filename,
+                                         cv_content=cv_text,
+                                         status='started'))
+        item.assessment_session_id = session_id
+        item.status = EXTRACTED
+        item.error = None
+        db.session.commit()
+
+    def _session(self, item: BatchCV) -> AssessmentSession:
+        return AssessmentSession.query.filter_by(
+            session_id=item.assessment_session_id).first()
+
+    def _store_analysis(self, item: BatchCV, cv_analysis: dict):
+        assessment_session = self._session(item)
+        # Stored as str(dict), like analyze_cv
+        assessment_session.cv_analysis = str(cv_analysis)
+        item.status = ANALYZED
+        item.gemini_batch_job = None
+        item.error = None
+        db.session.commit()
+
+    # ---------- Online analysis ----------
+
+    def analyze(self, concurrency: int = 4, rate: float = 2.0) -> int:
+        """
+        Analyze extracted CVs with at most `concurrency` Gemini calls in
+        flight and `rate` started per second; returns the number analyzed
+
+        Calls run on the upstream loop; results are checkpointed here, in
+        the calling thread, as they complete.
+        """
+        from services.gemini_service import analyze_cv_content_async
+
+        items = self._retryable(EXTRACTED)
+        if not items:
+            return 0
+        semaphore = None
+        limiter = _RateLimiter(rate)
+
+        async def analyze_one(cv_text: str) -> dict:
+            nonlocal semaphore
+            # Created lazily so it belongs to the upstream loop
+            semaphore = semaphore or asyncio.Semaphore(concurrency)
+            async with semaphore:
+                for attempt in range(ANALYSIS_RETRIES + 1):
+                    await limiter.wait()
+                    try:
+                        return await analyze_cv_content_async(cv_text)
+                    except Exception:
+                        if attempt == ANALYSIS_RETRIES:
+                            raise
+                        await asyncio.sleep(2 ** attempt)
+
+        futures = {}
+        for item in items:
+            cv_text = self._session(item).cv_content
+            futures[asyncio.run_coroutine_threadsafe(
+                analyze_one(cv_text), get_upstream_loop())] = item
+
+        done = 0
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                self._store_analysis(item, future.result())
+                done += 1
+            except Exception as e:
+                self._fail(item, str(e))
+        return done
+
+    # ---------- Batch-submission mode ----------
+
+    def submit(self) -> list:
+        """
+        Submit extracted CVs as Gemini batch jobs (cheaper, results within
+        hours); returns the job names
+        """
+        from services.gemini_service import _cv_analysis_request, get_client
+
+        items = self._retryable(EXTRACTED)
+        jobs = []
+        for start in range(0, len(items), BATCH_JOB_SIZE):
+            chunk = items[start:start + BATCH_JOB_SIZE]
+            requests = []
+            for item in chunk:
+                request = _cv_analysis_request(self._session(item).cv_content)
+                requests.append({'contents': request['contents'],
+                                 'config': request['config'],
+                                 'metadata': {'item': str(item.id)}})
+            job = get_client().batches.create(
+                model=request['model'],
+                src=requests,
+                config={'display_name': f"{self.name}-{start}"})
+            for item in chunk:
+                item.status = SUBMITTED
+                item.gemini_batch_job = job.name
+            db.session.commit()
+            jobs.append(job.name)
+            logging.info(f"Batch {self.name}: submitted {len(chunk)} CVs "
+                         f"as {job.name}")
+        return jobs
+
+    def collect(self) -> tuple:
+        """
+        Store the results of finished batch jobs; returns (analyzed, still
+        running jobs)
+        """
+        from services.gemini_service import get_client
+
+        submitted = BatchCV.query.filter_by(
+            batch_name=self.name, status=SUBMITTED).order_by(BatchCV.id).all()
+        by_job = {}
+        for item in submitted:
+            by_job.setdefault(item.gemini_batch_job, []).append(item)
+
+        done, running = 0, []
+        for name, items in by_job.items():
+            job = get_client().batches.get(name=name)
+            state = job.state.name if job.state else ''
+            if state in ('JOB_STATE_SUCCEEDED', 'JOB_STATE_PARTIALLY_SUCCEEDED'):
+                done += self._store_job_results(job, items)
+            elif state in ('JOB_STATE_FAILED', 'JOB_STATE_CANCELLED',
+                           'JOB_STATE_EXPIRED'):
+                for item in items:
+                    # Retried from extracted by the next run
+                    item.gemini_batch_job = None
+                    self._fail(item, f"Batch job {name} ended in {state}")
+            else:
+                running.append(name)
+        return done, running
+
+    def _store_job_results(self, job, items: list) -> int:
+        from services.gemini_service import _parse_cv_analysis
+
+        by_id = {str(item.id): item for item in items}
+        responses = (job.dest.inlined_responses or []) if job.dest else []
+        done = 0
+        for index, result in enumerate(responses):
+            key = (result.metadata or {}).get('item')
+            if key is None and index < len(items):
+                # Without metadata, responses keep the request order
+                key = str(items[index].id)
+            item = by_id.pop(key, None)
+            if item is None:
+                continue
+            try:
+                if result.error:
+                    raise ValueError(result.error.message)
+                self._store_analysis(item, _parse_cv_analysis(result.response))
+                done += 1
+            except Exception as e:
+                self._fail(item, f"Batch result: {str(e)}")
+        for item in by_id.values():
+            self._fail(item, f"No result in batch job {job.name}")
+        return done
+
+    # ---------- Reporting ----------
+
+    def summary(self) -> dict:
+        counts = db.session.query(BatchCV.status, db.func.count()).filter(
+            BatchCV.batch_name == self.name).group_by(BatchCV.status).all()
+        return dict(counts)
+
+    def manifest(self) -> list:
+        """
+        (source_path, status, session_id, error) of every CV in the batch
+        """
+        return [(item.source_path, item.status, item.assessment_session_id,
+                 item.error or '')
+                for item in BatchCV.query.filter_by(
+                    batch_name=self.name).order_by(BatchCV.source_path)]
+
+
+def wait_for_jobs(batch: BatchAssessment, interval: float = 60) -> int:
+    """
+    Poll until every submitted job of the batch has finished; returns the
+    number of CVs analyzed
+    """
+    analyzed = 0
+    while True:
+        done, running = batch.collect()
+        analyzed += done
+        if not running:
+            return analyzed
+        logging.info(f"Batch {batch.name}: waiting for {len(running)} jobs")
+        time.sleep(interval)
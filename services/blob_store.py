@@ -0,0 +1,454 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Optional dependency: only needed for BLOB_BACKEND=s3
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+    ClientError = Exception
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingWriter:
+    """
+    Write-only file wrapper counting the size and SHA-256 of what is written
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self._digest.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    @property
+    def content_hash(self) -> str:
+        return self._digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Minimal blob storage interface used for audio, CVs and reports
+
+    Keys look like "<storage class>/<shard path>", e.g. "audio/3f/a2/x.mp3".
+    Writes report the blob's (size, SHA-256) so callers can index it without
+    reading it back.
+    """
+
+    def put_bytes(self, key: str, data: bytes,
+                  content_type: str = None) -> tuple:
+        with self.open_write(key, content_type) as f:
+            f.write(data)
+        return f.size, f.content_hash
+
+    def put_file(self, key: str, local_path: str,
+                 content_type: str = None) -> tuple:
+        with open(local_path, 'rb') as src, self.open_write(
+                key, content_type) as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        return dst.size, dst.content_hash
+
+    @contextmanager
+    def open_write(self, key: str, content_type: str = None):
+        """
+        Yield a HashingWriter; the blob appears atomically on exit
+        """
+        with self._open_write(key, content_type) as f:
+            yield HashingWriter(f)
+
+    @contextmanager
+    def _open_write(self, key: str, content_type: str = None):
+        raise NotImplementedError
+
+    def open_read(self, key: str):
+        """Return a readable binary stream, or raise FileNotFoundError"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def url_for(self, key: str, expires_in: int = 3600,
+                download_name: str = None, content_type: str = None):
+        """Presigned URL clients can fetch directly, or None if unsupported"""
+        return None
+
+    def local_path(self, key: str):
+        """Path of a local copy of the blob, or None if it does not exist"""
+        return None
+
+    def cached_path(self, key: str):
+        """Like local_path, but never fetches the blob from a remote store"""
+        return self.local_path(key)
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs stored as files under one root directory per storage class"""
+
+    def __init__(self, roots: dict):
+        self.roots = {name: os.path.abspath(root) for name, root in roots.items()}
+
+    def _path(self, key: str) -> str:
+        storage_class, _, relative = key.partition('/')
+        root = self.roots[storage_class]
+        path = os.path.normpath(os.path.join(root, relative))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    @contextmanager
+    def _open_write(self, key: str, content_type: str = None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def open_read(self, key: str):
+        return open(self._path(key), 'rb')
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str):
+        path = self._path(key)
+        return path if os.path.isfile(path) else None
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs in an S3-compatible bucket (AWS S3, MinIO, or a local stand-in
+    such as `moto_server` via S3_ENDPOINT_URL)
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None,
+                 region_name: str = None, prefix: str = '', client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError(
+                    "BLOB_BACKEND=s3 requires the boto3 package")
+            client = boto3.client('s3',
+                                  endpoint_url=endpoint_url,
+                                  region_name=region_name)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    @contextmanager
+    def _open_write(self, key: str, content_type: str = None):
+        # Spooled so small blobs never touch disk; S3 only shows the object
+        # once the upload completes
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as f:
+            yield f
+            f.seek(0)
+            extra = {'ContentType': content_type} if content_type else None
+            self.client.upload_fileobj(f, self.bucket, self._key(key),
+                                       ExtraArgs=extra)
+
+    def open_read(self, key: str):
+        try:
+            response = self.client.get_object(Bucket=self.bucket,
+                                              Key=self._key(key))
+        except ClientError as e:
+            raise FileNotFoundError(key) from e
+        return response['Body']
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError:
+            return False
+
+    def size(self, key: str) -> int:
+        response = self.client.head_object(Bucket=self.bucket,
+                                           Key=self._key(key))
+        return response['ContentLength']
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def url_for(self, key: str, expires_in: int = 3600,
+                download_name: str = None, content_type: str = None):
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if download_name:
+            params['ResponseContentDisposition'] = (
+                f'attachment; filename="{download_name}"')
+        if content_type:
+            params['ResponseContentType'] = content_type
+        return self.client.generate_presigned_url('get_object',
+                                                  Params=params,
+                                                  ExpiresIn=expires_in)
+
+
+class _CachingReader:
+    """
+    Stream of a remote blob that copies what is read into the local cache
+
+    The cached copy is only kept if the stream was read to the end; a
+    partial read (a Range request, a dropped client) leaves no file behind.
+    """
+
+    def __init__(self, source, path: str, on_cached):
+        self.source = source
+        self.path = path
+        self.on_cached = on_cached
+        self.size = 0
+        self.complete = False
+        self.closed = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                             suffix='.tmp')
+        self.cache = os.fdopen(fd, 'wb')
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self.source.read()
+            self.complete = True
+        else:
+            data = self.source.read(size)
+            if not data and size:
+                self.complete = True
+        self.cache.write(data)
+        self.size += len(data)
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.source.close()
+        self.cache.close()
+        if self.complete:
+            os.replace(self.tmp_path, self.path)
+            self.on_cached(self.size)
+        else:
+            os.unlink(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReadThroughCache(BlobStore):
+    """
+    Wraps a remote store with a small size-bounded local file cache so
+    blobs can be served with send_file on any node
+
+    Reads stream from the remote store while filling the cache. The cache
+    size is tracked incrementally; once it passes max_bytes a background
+    sweep evicts the least recently used files (the storage janitor also
+    sweeps, for files other workers added).
+    """
+
+    def __init__(self, inner: BlobStore, cache_dir: str, max_bytes: int):
+        self.inner = inner
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Bytes cached as of the last sweep plus those this process added
+        # since; None until the first sweep
+        self._cached_bytes = None
+        self._sweeping = False
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cache_path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.cache_dir, key))
+        if not path.startswith(self.cache_dir + os.sep):
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    @contextmanager
+    def _open_write(self, key: str, content_type: str = None):
+        with self.inner._open_write(key, content_type) as f:
+            yield f
+        self._drop(key)
+
+    def open_read(self, key: str):
+        path = self.cached_path(key)
+        if path is not None:
+            return open(path, 'rb')
+        source = self.inner.open_read(key)
+        return _CachingReader(source, self._cache_path(key), self._added)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._cache_path(key)) or self.inner.exists(key)
+
+    def size(self, key: str) -> int:
+        path = self._cache_path(key)
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        return self.inner.size(key)
+
+    def delete(self, key: str):
+        self.inner.delete(key)
+        self._drop(key)
+
+    def url_for(self, key: str, expires_in: int = 3600,
+                download_name: str = None, content_type: str = None):
+        return self.inner.url_for(key, expires_in, download_name, content_type)
+
+    def cached_path(self, key: str):
+        path = self._cache_path(key)
+        if not os.path.isfile(path):
+            return None
+        # mtime doubles as the LRU clock
+        os.utime(path)
+        return path
+
+    def local_path(self, key: str):
+        path = self.cached_path(key)
+        if path is not None:
+            return path
+        try:
+            reader = self.open_read(key)
+        except FileNotFoundError:
+            return None
+        with reader:
+            while reader.read(CHUNK_SIZE):
+                pass
+        return self._cache_path(key)
+
+    def _drop(self, key: str):
+        try:
+            os.remove(self._cache_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _added(self, size: int):
+        with self._lock:
+            if self._cached_bytes is not None:
+                self._cached_bytes += size
+                if self._cached_bytes <= self.max_bytes:
+                    return
+            if self._sweeping:
+                return
+            self._sweeping = True
+        threading.Thread(target=self._sweep_in_background,
+                         name="blob-cache-sweep",
+                         daemon=True).start()
+
+    def _sweep_in_background(self):
+        try:
+            self.trim()
+        except Exception as e:
+            logging.error(f"Error trimming the blob cache: {str(e)}")
+        finally:
+            with self._lock:
+                self._sweeping = False
+
+    def trim(self) -> int:
+        """
+        Evict least recently used files while the cache is over max_bytes;
+        returns the number of files removed
+        """
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue  # being filled by a reader
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+                if total <= self.max_bytes:
+                    break
+            logging.info(f"Evicted {removed} blobs from the local "
+                         f"read-through cache")
+        with self._lock:
+            self._cached_bytes = total
+        return removed
+
+
+_blob_store = None
+
+
+def init_app(app):
+    """
+    Configure the process-wide blob store from BLOB_BACKEND
+    """
+    global _blob_store
+    app.config.setdefault('BLOB_BACKEND',
+                          os.environ.get('BLOB_BACKEND', 'local'))
+    app.config.setdefault('BLOB_URL_EXPIRY',
+                          int(os.environ.get('BLOB_URL_EXPIRY', '3600')))
+    app.config.setdefault('BLOB_CACHE_DIR',
+                          os.environ.get('BLOB_CACHE_DIR',
+                                         os.path.join(app.instance_path,
+                                                      'blob-cache')))
+    app.config.setdefault('BLOB_CACHE_BYTES', int(
+        os.environ.get('BLOB_CACHE_BYTES', str(512 * 1024 * 1024))))
+    # redirect: send clients to presigned URLs; proxy: serve from the cache
+    app.config.setdefault('BLOB_SERVE_MODE',
+                          os.environ.get('BLOB_SERVE_MODE', 'redirect'))
+
+    backend = app.config['BLOB_BACKEND']
+    if backend == 'local':
+        _blob_store = LocalBlobStore({
+            'audio': app.config['UPLOAD_FOLDER'],
+            'cv': app.config['UPLOAD_FOLDER'],
+            'report': app.config['REPORTS_FOLDER'],
+        })
+    elif backend == 's3':
+        remote = S3BlobStore(bucket=os.environ['S3_BUCKET'],
+                             endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+                             region_name=os.environ.get('S3_REGION'),
+                             prefix=os.environ.get('S3_PREFIX', ''))
+        _blob_store = ReadThroughCache(remote, app.config['BLOB_CACHE_DIR'],
+                                       app.config['BLOB_CACHE_BYTES'])
+    else:
+        raise ValueError(f"Unknown BLOB_BACKEND: {backend}")
+    app.extensions['blob_store'] = _blob_store
+
+
+def get_blob_store() -> BlobStore:
+    return _blob_store
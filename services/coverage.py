@@ -0,0 +1,170 @@
+import functools
+import re
+
+from services.gemini_service import AREA_QUESTIONS, FALLBACK_QUESTIONS
+from services.interview_digest import (OTHER_AREA, STRATEGIC_AREAS,
+                                       normalize_text)
+
+# Local tracking of which strategic areas the interview has covered, so the
+# follow-up prompt only lists the areas still to explore and the offline
+# fallback asks about the least covered one. No Gemini call is involved.
+#
+# Each answer is scored against the keyword lexicon of every area
+# (STRATEGIC_AREAS): a count vector over the lexicon times an area-by-keyword
+# weight matrix. A session keeps one row of area scores per answer (its
+# coverage matrix); an area's coverage combines its rows as independent
+# evidence, 1 - prod(1 - min(1, score / SATURATION)).
+
+AREAS = [area for area in STRATEGIC_AREAS if area != OTHER_AREA]
+
+# Weighted keyword hits for one answer to cover an area on its own
+SATURATION = 3.0
+# Coverage above which an area is no longer offered to the model
+COVERED_THRESHOLD = 0.6
+# Keywords in the question count for less than in the answer, and at most
+# QUESTION_CAP weighted hits: asking about an area does not cover it
+QUESTION_WEIGHT = 0.5
+QUESTION_CAP = 1.0
+
+LEXICON = sorted({keyword
+                  for area in AREAS
+                  for keyword in STRATEGIC_AREAS[area][1]})
+_INDEX = {keyword: i for i, keyword in enumerate(LEXICON)}
+# Longest first, so "chiffre d'affaires" wins over a shorter prefix
+_KEYWORDS = re.compile(
+    r"\b(" + "|".join(re.escape(keyword)
+                      for keyword in sorted(LEXICON, key=len, reverse=True)) +
+    r")")
+# WEIGHTS[a][k] is 1 when keyword k belongs to area a
+WEIGHTS = [[1.0 if keyword in STRATEGIC_AREAS[area][1] else 0.0
+            for keyword in LEXICON] for area in AREAS]
+
+
+@functools.cache
+def _numpy():
+    # Imported on first use rather than at boot (about 70 ms per worker)
+    try:
+        import numpy
+    except ImportError:  # optional: plain Python is fast enough for one session
+        return None
+    return numpy
+
+
+@functools.cache
+def _weights():
+    numpy = _numpy()
+    return numpy.array(WEIGHTS) if numpy is not None else WEIGHTS
+
+
+def _counts(texts: list):
+    """
+    Keyword count vectors of the texts, one row per text
+    """
+    rows = [[0] * len(LEXICON) for _ in texts]
+    for row, text in zip(rows, texts):
+        for keyword in _KEYWORDS.findall(normalize_text(text)):
+            row[_INDEX[keyword]] += 1
+    numpy = _numpy()
+    if numpy is not None:
+        return numpy.array(rows, dtype=float).reshape(len(texts), len(LEXICON))
+    return rows
+
+
+def score_answers(qa_list: list):
+    """
+    Area scores of each Q&A pair: a (turns x areas) matrix
+    """
+    numpy = _numpy()
+    weights = _weights()
+    questions = _counts([qa['question'] for qa in qa_list])
+    answers = _counts([qa['answer'] for qa in qa_list])
+    if numpy is not None:
+        asked = numpy.minimum(QUESTION_WEIGHT * questions @ weights.T,
+                              QUESTION_CAP)
+        return numpy.minimum((answers @ weights.T + asked) / SATURATION, 1.0)
+    return [[min(1.0, (sum(a * w for a, w in zip(a_row, area_weights)) +
+                       min(QUESTION_WEIGHT *
+                           sum(q * w for q, w in zip(q_row, area_weights)),
+                           QUESTION_CAP)) / SATURATION)
+             for area_weights in weights]
+            for q_row, a_row in zip(questions, answers)]
+
+
+def update_matrix(matrix, qa_list: list):
+    """
+    Return the coverage matrix with rows added for the answers it does not
+    score yet (normally just the latest)
+    """
+    rows = len(matrix) if matrix is not None else 0
+    new_rows = score_answers(qa_list[rows:])
+    if not rows:
+        return new_rows
+    numpy = _numpy()
+    if numpy is not None:
+        return numpy.vstack([matrix, new_rows])
+    return list(matrix) + new_rows
+
+
+def area_coverage(matrix) -> dict:
+    """
+    Coverage of each area between 0 (never discussed) and 1
+    """
+    numpy = _numpy()
+    if numpy is not None and len(matrix):
+        coverage = 1.0 - numpy.prod(1.0 - numpy.asarray(matrix), axis=0)
+        return dict(zip(AREAS, coverage.tolist()))
+    coverage = {}
+    for i, area in enumerate(AREAS):
+        missing = 1.0
+        for row in matrix:
+            missing *= 1.0 - row[i]
+        coverage[area] = 1.0 - missing
+    return coverage
+
+
+def uncovered_areas(matrix) -> list:
+    """
+    Areas still below COVERED_THRESHOLD, least covered first
+    """
+    coverage = area_coverage(matrix)
+    return sorted((area for area in AREAS
+                   if coverage[area] < COVERED_THRESHOLD),
+                  key=lambda area: coverage[area])
+
+
+def least_covered_area(matrix, exclude=()) -> str:
+    """
+    Least covered area not in `exclude`, or None if all are excluded
+    """
+    coverage = area_coverage(matrix)
+    candidates = [area for area in AREAS if area not in exclude]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda area: coverage[area])
+
+
+def track(state):
+    """
+    Bring a SessionState's coverage matrix up to date with its answers and
+    return it
+    """
+    with state.lock:
+        state.coverage_matrix = update_matrix(state.coverage_matrix,
+                                              state.questions_answers)
+        return state.coverage_matrix
+
+
+def fallback_question(matrix, qa_list: list) -> str:
+    """
+    Offline follow-up: the question of the least covered area not asked
+    yet, then the generic FALLBACK_QUESTIONS
+    """
+    asked = {qa['question'] for qa in qa_list}
+    area = least_covered_area(matrix,
+                              exclude=[area
+                                       for area, question in
+                                       AREA_QUESTIONS.items()
+                                       if question in asked])
+    if area is not None:
+        return AREA_QUESTIONS[area]
+    return FALLBACK_QUESTIONS[min(len(qa_list), len(FALLBACK_QUESTIONS) - 1)]
@@ -1,8 +1,9 @@
+import io
 import os
 import logging
-import PyPDF2
-import docx
 from werkzeug.utils import secure_filename
+from services.blob_store import get_blob_store
+from services.storage_service import storage, blob_key, CV
 
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'doc'}
 
@@ -11,27 +12,28 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_text_from_pdf(file_path: str) -> str:
+def extract_text_from_pdf(file_path) -> str:
     """
-    Extract text from PDF file
+    Extract text from PDF file (a path or a binary stream)
     """
     try:
+        import PyPDF2
         text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+        pdf_reader = PyPDF2.PdfReader(file_path)
+        for page in pdf_reader.pages:
+            text += page.extract_text() + "\n"
         
         return text.strip()
     except Exception as e:
         logging.error(f"Error extracting text from PDF: {str(e)}")
         return ""
 
-def extract_text_from_docx(file_path: str) -> str:
+def extract_text_from_docx(file_path) -> str:
     """
-    Extract text from DOCX file
+    Extract text from DOCX file (a path or a binary stream)
     """
     try:
+        import docx
         doc = docx.Document(file_path)
         text = ""
         for paragraph in doc.paragraphs:
@@ -42,9 +44,9 @@ def extract_text_from_docx(file_path: str) -> str:
         logging.error(f"Error extracting text from DOCX: {str(e)}")
         return ""
 
-def process_cv_file(file_path: str, filename: str) -> str:
+def process_cv_file(file_path, filename: str) -> str:
     """
-    Process uploaded CV file and extract text content
+    Process uploaded CV file (a path or a binary stream) and extract text content
     """
     try:
         file_extension = filename.rsplit('.', 1)[1].lower()
@@ -61,9 +63,21 @@ def process_cv_file(file_path: str, filename: str) -> str:
         logging.error(f"Error processing CV file: {str(e)}")
         return ""
 
-def save_uploaded_file(file, upload_folder: str) -> tuple:
+def process_cv_blob(key: str, filename: str) -> str:
     """
-    Save uploaded file and return (success, filename, file_path)
+    Extract text content from a CV stored in the blob store
+    """
+    try:
+        with get_blob_store().open_read(key) as stream:
+            # PDF and DOCX readers need to seek
+            return process_cv_file(io.BytesIO(stream.read()), filename)
+    except Exception as e:
+        logging.error(f"Error reading CV blob {key}: {str(e)}")
+        return ""
+
+def save_uploaded_file(file, upload_folder: str, session_id: str = None) -> tuple:
+    """
+    Save uploaded file to the blob store and return (success, filename, blob_key)
     """
     try:
         if file and file.filename and allowed_file(file.filename):
@@ -73,10 +87,13 @@ def save_uploaded_file(file, upload_folder: str) -> tuple:
             name, ext = os.path.splitext(filename)
             filename = f"{name}_{timestamp}{ext}"
             
-            file_path = os.path.join(upload_folder, filename)
-            file.save(file_path)
+            key = blob_key(CV, filename)
+            with get_blob_store().open_write(key, file.mimetype) as f:
+                file.save(f)
+            storage.register(CV, filename, session_id, f.size,
+                             f.content_hash)
             
-            return True, filename, file_path
+            return True, filename, key
         else:
             return False, None, None
             
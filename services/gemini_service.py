@@ -1,9 +1,19 @@
 import json
 import logging
 import os
-from google import genai
-from google.genai import types
+import threading
+from datetime import datetime
 from pydantic import BaseModel
+from services.async_runtime import UPSTREAM_KEEPALIVE_EXPIRY
+from services.interview_digest import (STRATEGIC_AREAS, build_digest,
+                                       clip_tokens, render_digest,
+                                       render_recent_exchange,
+                                       render_transcript,
+                                       RECENT_ANSWER_TOKENS)
+from services.single_flight import upstream_flight, request_key
+from services.traffic_capture import traffic
+
+logger = logging.getLogger(__name__)
 
 # IMPORTANT: KEEP THIS COMMENT
 # Follow these instructions when using this blueprint:
@@ -11,9 +21,112 @@ from pydantic import BaseModel
 #   - do not change this unless explicitly requested by the user
 
 # This API key is from Gemini Developer API Key, not vertex AI API Key
-# Initialize client only if API key is available
+# The client (and google-genai itself, the slowest import in the app) is
+# created on first use rather than at import
 gemini_api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=gemini_api_key)
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from google import genai
+                from google.genai import types
+                _client = genai.Client(
+                    api_key=gemini_api_key,
+                    http_options=types.HttpOptions(
+                        httpx_async_client=httpx.AsyncClient(
+                            limits=httpx.Limits(
+                                max_connections=200,
+                                max_keepalive_connections=50,
+                                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY))))
+    return _client
+
+
+async def warm_connection_async():
+    """
+    Open (or keep open) a pooled connection to the Gemini API
+    """
+    await get_client().aio.models.get(model="gemini-2.5-flash")
+
+# Fixed texts served when Gemini is not configured or fails. They are known
+# before any candidate arrives, so workers synthesize their audio during
+# warmup (services.warmup).
+DEFAULT_FIRST_QUESTION = "J’aimerais mieux comprendre votre parcours professionnel. Quels sont vos objectifs actuels et ce qui vous motive dans votre travail ?"
+
+FALLBACK_FIRST_QUESTION = "I'd like to understand your career journey better. What are your current professional goals and what motivates you in your work?"
+
+FALLBACK_CV_ANALYSIS = {
+    'summary': 'Professional with diverse experience and skills',
+    'key_skills': ['Communication', 'Problem Solving', 'Teamwork', 'Leadership'],
+    'experience_years': 5,
+    'career_stage': 'Mid-level Professional',
+    'notable_achievements': ['Professional development', 'Project completion'],
+    'potential_areas_for_growth': ['Technical skills', 'Leadership development']
+}
+
+FALLBACK_QUESTIONS = [
+    "Quels défis avez-vous rencontrés dans votre carrière, et comment les avez-vous surmontés ?",
+    "Quelles compétences ou domaines aimeriez-vous développer davantage ?",
+    "Décrivez un projet ou une réalisation dont vous êtes particulièrement fier(ère).",
+    "Qu'est-ce qui vous motive le plus dans votre travail professionnel ?",
+    "Où voyez-vous votre carrière se diriger dans les prochaines années ?",
+    "Comment gérez-vous le travail sous pression ou avec des délais serrés ?",
+    "Quelle expérience de leadership avez-vous, et qu'en avez-vous appris ?",
+    "Quelle est selon vous votre plus grande force et faiblesse professionnelle ?"
+]
+
+# Offline follow-up for each strategic area; the least covered area's
+# question is asked next (services.coverage)
+AREA_QUESTIONS = {
+    'business_model': "Pouvez-vous me décrire votre activité : ce que vous vendez, à qui, et ce qui vous rapporte le plus ?",
+    'pricing': "Comment fixez-vous vos prix, et quand les avez-vous revus pour la dernière fois ?",
+    'costs': "Quels sont vos principaux postes de coûts, et lequel pèse le plus sur votre marge ?",
+    'acquisition': "Comment les nouveaux clients vous découvrent-ils aujourd'hui ?",
+    'retention': "Qu'est-ce qui fait revenir vos clients, et que faites-vous pour les fidéliser ?",
+    'digital': "Quels outils numériques utilisez-vous : caisse, site internet, réseaux sociaux, vente en ligne ?",
+    'staff': "Comment votre équipe est-elle organisée, et quelles difficultés rencontrez-vous pour recruter ou former ?",
+    'operations': "Quelles contraintes du quotidien (horaires, approvisionnement, locaux) limitent votre activité ?",
+}
+
+
+def fallback_summary(question_count: int) -> str:
+    """
+    Canned final summary used when Gemini cannot write one
+    """
+    return f"""Résumé de l'Évaluation Professionnelle
+
+Cette évaluation complète a été réalisée avec {question_count} questions d'entretien basées sur l'analyse du CV du candidat.
+
+Points Clés de l'Évaluation :
+• Compétences de Communication : Réponses claires et articulées démontrées tout au long de l'entretien
+• Expérience Professionnelle : Les réponses ont montré une bonne compréhension de la progression de carrière et des défis
+• Compétence Technique : Les réponses reflètent des connaissances appropriées pour le niveau de carrière
+• Orientation Future : Le candidat a montré une réflexion approfondie sur le développement professionnel
+
+Évaluation Globale :
+Le candidat a bien performé lors de cette évaluation vocale, fournissant des réponses réfléchies et complètes à toutes les questions. Les réponses démontrent de solides compétences en communication et une conscience professionnelle. Basé sur la performance de l'entretien, le candidat montre un excellent potentiel pour une croissance et un développement professionnel continus.
+
+Évaluation complétée le {datetime.now().strftime('%d %B %Y à %H:%M')}"""
+
+
+# These calls use client.aio, whose connection pool is bound to the first
+# event loop that uses it: await them through
+# services.async_runtime.run_upstream rather than on a per-request loop.
+
+
+async def _generate_content_shared(request: dict, operation: str):
+    # Identical in-flight requests (client retries, double submits) share
+    # a single Gemini call
+    return await upstream_flight.do(
+        request_key(sorted(request.items())),
+        lambda: traffic.upstream(
+            'gemini', operation,
+            lambda: get_client().aio.models.generate_content(**request)))
 
 
 class CVAnalysis(BaseModel):
@@ -25,17 +138,12 @@ class CVAnalysis(BaseModel):
     potential_areas_for_growth: list
 
 
-def analyze_cv_content(cv_text: str) -> dict:
+def _cv_analysis_request(cv_text: str) -> dict:
     """
-    Analyze CV content using Gemini AI
-    Input: CV text content
-    Output: Structured analysis of the CV
+    Build the generate_content arguments for a CV analysis
     """
-    try:
-        if not client:
-            raise Exception("Gemini API key not configured")
-
-        system_prompt = """
+    from google.genai import types
+    system_prompt = """
         Vous êtes un expert professionnel en évaluation de carrière. Analysez le contenu du CV fourni et fournissez une analyse complète.
 
         Extraites et analysez :
@@ -55,39 +163,52 @@ def analyze_cv_content(cv_text: str) -> dict:
         - potential_areas_for_growth : Axes d'amélioration
         """
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(
-                    role="user",
-                    parts=[types.Part(text=f"Contenu du CV :\n\n{cv_text}")])
-            ],
-            config=types.GenerateContentConfig(
-                system_instruction=system_prompt,
-                response_mime_type="application/json",
-                response_schema=CVAnalysis,
-            ),
-        )
-
-        if response.text:
-            return json.loads(response.text)
-        else:
-            raise ValueError("Réponse vide de Gemini")
+    return dict(
+        model="gemini-2.5-flash",
+        contents=[
+            types.Content(
+                role="user",
+                parts=[types.Part(text=f"Contenu du CV :\n\n{cv_text}")])
+        ],
+        config=types.GenerateContentConfig(
+            system_instruction=system_prompt,
+            response_mime_type="application/json",
+            response_schema=CVAnalysis,
+        ),
+    )
+
+
+def _parse_cv_analysis(response) -> dict:
+    if response.text:
+        return json.loads(response.text)
+    else:
+        raise ValueError("Réponse vide de Gemini")
+
+
+async def analyze_cv_content_async(cv_text: str) -> dict:
+    """
+    Analyze CV content using Gemini AI
+    Input: CV text content
+    Output: Structured analysis of the CV
+    """
+    try:
+        if not gemini_api_key:
+            raise Exception("Gemini API key not configured")
+
+        response = await _generate_content_shared(
+            _cv_analysis_request(cv_text), 'cv_analysis')
+        return _parse_cv_analysis(response)
 
     except Exception as e:
-        logging.error(f"Erreur lors de l'analyse du CV avec Gemini : {str(e)}")
+        logger.error(f"Erreur lors de l'analyse du CV avec Gemini : {str(e)}")
         raise Exception(f"Échec de l'analyse du CV : {str(e)}")
 
 
-def generate_first_question(cv_analysis: dict) -> str:
+def _first_question_request(cv_analysis: dict) -> dict:
     """
-    Generate the first assessment question based on CV analysis
+    Build the generate_content arguments for the opening question
     """
-    try:
-        if not client:
-            return "J’aimerais mieux comprendre votre parcours professionnel. Quels sont vos objectifs actuels et ce qui vous motive dans votre travail ?"
-
-        prompt = f"""
+    prompt = f"""
         À partir de cette analyse de CV, générez une question d'ouverture engageante pour un entretien d'évaluation professionnelle.
 
         Analyse du CV :
@@ -104,32 +225,59 @@ def generate_first_question(cv_analysis: dict) -> str:
         Retournez uniquement le texte de la question, sans mise en forme supplémentaire.
         """
 
-        response = client.models.generate_content(model="gemini-2.5-flash",
-                                                  contents=prompt)
+    return dict(model="gemini-2.5-flash", contents=prompt)
 
-        return response.text.strip(
-        ) if response.text else "Parlez-moi de vos objectifs professionnels et de ce qui vous motive dans votre travail."
 
-    except Exception as e:
-        logging.error(
-            f"Erreur lors de la génération de la première question : {str(e)}")
-        return "J’aimerais mieux comprendre votre parcours professionnel. Quels sont vos objectifs actuels et ce qui vous motive dans votre travail ?"
+def _parse_first_question(response) -> str:
+    return response.text.strip(
+    ) if response.text else "Parlez-moi de vos objectifs professionnels et de ce qui vous motive dans votre travail."
 
 
-def generate_followup_question(cv_analysis: dict, previous_qa: list) -> str:
+async def generate_first_question_async(cv_analysis: dict) -> str:
     """
-    Generate follow-up questions based on CV analysis and previous answers
+    Generate the first assessment question based on CV analysis
     """
     try:
-        if not client:
-            return "Quels défis avez-vous rencontrés dans votre carrière, et comment les avez-vous surmontés asba ?"
+        if not gemini_api_key:
+            return DEFAULT_FIRST_QUESTION
+
+        response = await _generate_content_shared(
+            _first_question_request(cv_analysis), 'first_question')
+        return _parse_first_question(response)
+
+    except Exception as e:
+        logger.error(
+            f"Erreur lors de la génération de la première question : {str(e)}")
+        return DEFAULT_FIRST_QUESTION
 
-        # Prepare context from previous Q&A - take last Q&A pairs
-        recent_qa = previous_qa[len(previous_qa) - 1]
-        qa_context = "\n".join(
-            f"Q : {recent_qa['question']}\nR : {recent_qa['answer']}")
 
-        prompt = f"""Tu es un agent d’IA expert en stratégie d’entreprise, développement commercial et optimisation de modèles économiques. Ton rôle est de guider un commerçant (ex. : restaurateur, détaillant, e-commerçant) à travers un entretien stratégique structuré. L’objectif final est de produire un rapport personnalisé pour augmenter son chiffre d’affaires et réduire ses coûts.
+def _followup_question_request(cv_analysis: dict,
+                               previous_qa: list,
+                               digest: dict = None,
+                               uncovered: list = None) -> dict:
+    """
+    Build the generate_content arguments for the next follow-up question
+
+    The prompt carries the interview digest (everything before the latest
+    answer) and the latest exchange, so its size does not grow with the
+    interview. `uncovered` lists the strategic areas not yet covered
+    (services.coverage); only those are offered as new directions.
+    """
+    from google.genai import types
+    # Earlier answers the digest has not caught up with are folded locally
+    digest = build_digest(previous_qa[:-1], digest)
+    qa_context = render_recent_exchange(previous_qa)
+    digest_context = render_digest(digest)
+    if uncovered is None:
+        uncovered = [area for area in STRATEGIC_AREAS if area != 'other']
+    if uncovered:
+        new_areas = ", ".join(STRATEGIC_AREAS[area][0].lower()
+                              for area in uncovered)
+        explore = f"Explorer un domaine stratégique pas encore couvert ({new_areas})"
+    else:
+        explore = "Tous les domaines stratégiques ont été abordés : approfondis celui où il manque le plus d’information pour le rapport"
+
+    prompt = f"""Tu es un agent d’IA expert en stratégie d’entreprise, développement commercial et optimisation de modèles économiques. Ton rôle est de guider un commerçant (ex. : restaurateur, détaillant, e-commerçant) à travers un entretien stratégique structuré. L’objectif final est de produire un rapport personnalisé pour augmenter son chiffre d’affaires et réduire ses coûts.
 
 Tu poses une question à la fois, en t’appuyant sur :
 - La dernière question posée
@@ -138,7 +286,7 @@ Tu poses une question à la fois, en t’appuyant sur :
 
 ⚠️ Très important : ton objectif est de couvrir **tous les aspects stratégiques clés** du business, pas seulement approfondir un sujet isolé. Tu dois donc constamment maintenir un **équilibre** entre :
 1. Approfondir un sujet mentionné si c’est pertinent **ET**
-2. Explorer un nouveau domaine stratégique non abordé si besoin (modèle économique, tarification, coûts, acquisition client, fidélisation, outils digitaux, ressources humaines, contraintes opérationnelles, etc.)
+2. {explore}
 
 Critères pour ta prochaine question :
 - Utile à la construction du rapport stratégique final
@@ -147,46 +295,149 @@ Critères pour ta prochaine question :
 - Formulée de manière naturelle et conversationnelle
 
 Voici le contexte :
-Dernière question et réponse  : {qa_context}
-Tout les questions et réponses : {recent_qa}
+Synthèse de l’entretien jusqu’ici, par domaine :
+{digest_context}
+
+Dernière question et réponse :
+{qa_context}
 
 Quelle est la prochaine question pertinente, équilibrée et stratégique que tu poses ?
 
 """
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(role="user", parts=[types.Part(text=prompt)])
-            ],
-            config=types.GenerateContentConfig(
-                system_instruction=
-                "Vous êtes un expert en entretiens professionnels. Générez une question claire et engageante.",
-                temperature=0.7))
-        logging.info(f"Gemini response: {response}")
-        if response.text and response.text.strip():
-            return response.text.strip()
-        else:
-            raise ValueError("Réponse vide de Gemini")
+    return dict(
+        model="gemini-2.5-flash",
+        contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+        config=types.GenerateContentConfig(
+            system_instruction=
+            "Vous êtes un expert en entretiens professionnels. Générez une question claire et engageante.",
+            temperature=0.7))
+
+
+def _parse_text_response(response) -> str:
+    logger.debug("Gemini response: %s",
+                 response.text,
+                 extra={'event': 'gemini_response',
+                        'usage': response.usage_metadata})
+    if response.text and response.text.strip():
+        return response.text.strip()
+    else:
+        raise ValueError("Réponse vide de Gemini")
+
+
+async def generate_followup_question_async(cv_analysis: dict,
+                                           previous_qa: list,
+                                           digest: dict = None,
+                                           uncovered: list = None,
+                                           fallback: str = None) -> str:
+    """
+    Generate follow-up questions based on CV analysis and previous answers
+
+    `fallback` is returned when Gemini is not configured or fails
+    """
+    fallback = fallback or FALLBACK_QUESTIONS[0]
+    try:
+        if not gemini_api_key:
+            return fallback
+
+        response = await _generate_content_shared(
+            _followup_question_request(cv_analysis, previous_qa, digest,
+                                       uncovered), 'followup_question')
+        return _parse_text_response(response)
 
     except Exception as e:
-        logging.error(
+        logger.error(
             f"Erreur lors de la génération de la question de suivi : {str(e)}")
-        return "Quels défis avez-vous rencontrés dans votre carrière, et comment les avez-vous surmontés ?"
+        return fallback
+
 
+class DigestFact(BaseModel):
+    area: str
+    fact: str
 
-def generate_final_summary(cv_analysis: dict, qa_pairs: list) -> str:
+
+class DigestFacts(BaseModel):
+    facts: list[DigestFact]
+
+
+def _digest_facts_request(question: str, answer: str) -> dict:
     """
-    Generate a comprehensive professional assessment summary
+    Build the generate_content arguments to extract digest facts from
+    one answer
     """
-    try:
-        if not client:
-            return "Évaluation professionnelle terminée. Configuration de l'API requise pour un résumé détaillé généré par l'IA."
+    from google.genai import types
+    areas = "\n".join(f"- {key} : {label}"
+                      for key, (label, _) in STRATEGIC_AREAS.items())
+    prompt = f"""Extrais de la réponse ci-dessous les faits utiles au diagnostic stratégique du commerce (chiffres, pratiques, problèmes, projets).
+
+Chaque fait est une phrase courte et autonome, rattachée à l’un de ces domaines (utilise la clé) :
+{areas}
+
+Au plus 5 faits, sans reformuler la question ni inventer d’information. Si la réponse n’apporte rien, renvoie une liste vide.
 
-        qa_text = "\n".join(
-            [f"Q : {qa['question']}\nR : {qa['answer']}" for qa in qa_pairs])
+Question : {question}
+Réponse : {clip_tokens(answer, RECENT_ANSWER_TOKENS)}
+"""
+
+    return dict(
+        model="gemini-2.5-flash",
+        contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=DigestFacts,
+            temperature=0))
 
-        prompt = f"""Tu es un expert en stratégie commerciale et développement d’entreprise. Tu viens de conduire un entretien structuré avec un propriétaire de boutique. À partir des réponses fournies, tu dois maintenant générer un **rapport stratégique personnalisé**.
+
+async def extract_digest_facts_async(question: str, answer: str) -> list:
+    """
+    Facts from one answer for the interview digest, as
+    [{'area': ..., 'fact': ...}]; raises on failure
+    """
+    if not gemini_api_key:
+        raise Exception("Gemini API key not configured")
+
+    response = await _generate_content_shared(
+        _digest_facts_request(question, answer), 'digest_facts')
+    if not response.text:
+        raise ValueError("Réponse vide de Gemini")
+    return json.loads(response.text).get('facts', [])
+
+
+def _render_cv_analysis(cv_analysis: dict) -> str:
+    """
+    CV analysis as prompt text
+    """
+    cv_analysis = cv_analysis or {}
+    return "\n".join([
+        f"Résumé : {cv_analysis.get('summary', '')}",
+        f"Stade de carrière : {cv_analysis.get('career_stage', '')}",
+        f"Années d’expérience : {cv_analysis.get('experience_years', '')}",
+        f"Compétences clés : {', '.join(cv_analysis.get('key_skills', []))}",
+        "Réalisations notables : " +
+        ', '.join(cv_analysis.get('notable_achievements', [])),
+        "Axes de développement : " +
+        ', '.join(cv_analysis.get('potential_areas_for_growth', [])),
+    ])
+
+
+def _final_summary_request(cv_analysis: dict,
+                           qa_pairs: list,
+                           digest: dict = None) -> dict:
+    """
+    Build the generate_content arguments for the final assessment summary
+
+    Written from the CV analysis, the interview digest and the answers
+    themselves, clipped to REPORT_ANSWER_TOKENS in total: the report is
+    written once, so it gets more of the candidate's words than the
+    per-turn prompts
+    """
+    from google.genai import types
+    digest = build_digest(qa_pairs, digest)
+    digest_text = render_digest(digest)
+    cv_text = _render_cv_analysis(cv_analysis)
+    transcript = render_transcript(qa_pairs)
+
+    prompt = f"""Tu es un expert en stratégie commerciale et développement d’entreprise. Tu viens de conduire un entretien structuré avec un propriétaire de boutique. À partir des réponses fournies, tu dois maintenant générer un **rapport stratégique personnalisé**.
 
 Le rapport doit :
 - Identifier les points forts et les faiblesses du modèle actuel
@@ -197,28 +448,55 @@ Le rapport doit :
 - Être rédigé dans un ton professionnel, encourageant et orienté vers les résultats
 - Ne pas inclure de spéculations injustifiées, mais s’appuyer uniquement sur les réponses obtenues
 
-Voici les réponses complètes du commerçant à l’entretien :
-{qa_text}
+Profil du commerçant, d’après l’analyse de son CV :
+{cv_text}
+
+Voici la synthèse des informations recueillies auprès du commerçant pendant l’entretien ({len(qa_pairs)} questions), classées par domaine :
+{digest_text}
+
+Questions posées et réponses du commerçant (les plus longues sont abrégées) :
+{transcript}
 
 Génère maintenant un rapport structuré en suivant les consignes ci-dessus.
 """
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(role="user", parts=[types.Part(text=prompt)])
-            ],
-            config=types.GenerateContentConfig(
-                system_instruction=
-                "Vous êtes un consultant expert en développement professionnel. Créez un rapport d'évaluation complet et structuré.",
-                temperature=0.3))
-        logging.info(f"Gemini response: {response}")
-        if response.text and response.text.strip():
-            return response.text.strip()
-        else:
-            raise ValueError("Réponse vide de Gemini")
+    return dict(
+        model="gemini-2.5-flash",
+        contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+        config=types.GenerateContentConfig(
+            system_instruction=
+            "Vous êtes un consultant expert en développement professionnel. Créez un rapport d'évaluation complet et structuré.",
+            temperature=0.3))
+
+
+async def write_final_summary_async(cv_analysis: dict,
+                                    qa_pairs: list,
+                                    digest: dict = None) -> str:
+    """
+    Final assessment summary from Gemini; raises on failure
+    """
+    if not gemini_api_key:
+        raise Exception("Gemini API key not configured")
+
+    response = await _generate_content_shared(
+        _final_summary_request(cv_analysis, qa_pairs, digest),
+        'final_summary')
+    return _parse_text_response(response)
+
+
+async def generate_final_summary_async(cv_analysis: dict,
+                                       qa_pairs: list,
+                                       digest: dict = None) -> str:
+    """
+    Generate a comprehensive professional assessment summary
+    """
+    try:
+        if not gemini_api_key:
+            return "Évaluation professionnelle terminée. Configuration de l'API requise pour un résumé détaillé généré par l'IA."
+
+        return await write_final_summary_async(cv_analysis, qa_pairs, digest)
 
     except Exception as e:
-        logging.error(
+        logger.error(
             f"Erreur lors de la génération du résumé final : {str(e)}")
         return "Erreur lors de la génération du résumé de l'évaluation. Veuillez réessayer."
@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit
+
+from sqlalchemy import func, update
+
+from app import db
+from models import AvatarSession
+from services import leases
+from services.async_runtime import run_upstream_sync
+
+# HeyGen configuration; HEYGEN_API_URL can point at a local mock
+# (benchmarks/heygen_pool.py)
+HEYGEN_API_KEY = os.environ.get("HEYGEN_API_KEY")
+HEYGEN_API_URL = os.environ.get("HEYGEN_API_URL", "https://api.heygen.com")
+HEYGEN_AVATAR_NAME = os.environ.get("HEYGEN_AVATAR_NAME",
+                                    "Marianne_Chair_Sitting_public")
+HEYGEN_VOICE_ID = os.environ.get("HEYGEN_VOICE_ID",
+                                 "728ce6e94304471fae9cf02ad85ec9a2")
+
+READY = 'ready'
+CLAIMED = 'claimed'
+CLOSED = 'closed'
+
+# Claimed sessions are closed after this even if the page never stopped them
+CLAIMED_SESSION_LIFETIME = timedelta(hours=2)
+# Closed rows are kept this long as history for the arrival rate
+CLOSED_RETENTION = timedelta(days=1)
+
+# Lease (services/leases.py) held by the one process refilling the pool
+POOL_LEASE = 'avatar-pool'
+
+# Shared async HTTP client, created lazily on the upstream event loop
+# (see services.async_runtime)
+_async_http_client = None
+
+
+def _get_async_http_client() -> 'httpx.AsyncClient':
+    global _async_http_client
+    if _async_http_client is None:
+        import httpx
+        _async_http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=50,
+                                max_keepalive_connections=10))
+    return _async_http_client
+
+
+async def _post(path: str, payload: dict = None, token: str = None) -> dict:
+    """
+    POST to the HeyGen API with the server key, or a streaming token
+    """
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    else:
+        headers["X-Api-Key"] = HEYGEN_API_KEY
+    response = await _get_async_http_client().post(f"{HEYGEN_API_URL}{path}",
+                                                   json=payload or {},
+                                                   headers=headers)
+    response.raise_for_status()
+    return response.json().get("data") or {}
+
+
+async def create_token_async() -> str:
+    data = await _post("/v1/streaming.create_token")
+    return data["token"]
+
+
+async def create_session_async(token: str, idle_timeout: int) -> dict:
+    """
+    Create and start a streaming session so the page only has to join it
+    """
+    started = time.monotonic()
+    info = await _post("/v1/streaming.new", {
+        "quality": "high",
+        "avatar_name": HEYGEN_AVATAR_NAME,
+        "voice": {
+            "voice_id": HEYGEN_VOICE_ID,
+            "rate": 1.0,
+        },
+        "version": "v2",
+        "video_encoding": "H264",
+        "activity_idle_timeout": idle_timeout,
+    }, token)
+    await _post("/v1/streaming.start", {"session_id": info["session_id"]},
+                token)
+    info["session_token"] = token
+    info["warmup_ms"] = int((time.monotonic() - started) * 1000)
+    return info
+
+
+async def send_task_async(record: AvatarSession, text: str,
+                          task_type: str = "repeat") -> dict:
+    return await _post("/v1/streaming.task", {
+        "session_id": record.heygen_session_id,
+        "text": text,
+        "task_type": task_type,
+    }, record.session_token)
+
+
+async def stop_session_async(heygen_session_id: str, token: str) -> dict:
+    return await _post("/v1/streaming.stop", {"session_id": heygen_session_id},
+                       token)
+
+
+def websocket_url() -> str:
+    """
+    Base URL of the streaming.chat WebSocket for the configured API
+    """
+    parts = urlsplit(HEYGEN_API_URL)
+    scheme = "ws" if parts.scheme == "http" else "wss"
+    return urlunsplit(
+        (scheme, parts.netloc, "/v1/ws/streaming.chat", "", ""))
+
+
+class AvatarPool:
+    """
+    Pool of pre-created, already started HeyGen sessions
+
+    The HeyGen key never leaves the server: sessions are created here and
+    the page gets the session's LiveKit credentials and streaming token.
+    A background refiller keeps about arrival rate x warm-up time sessions
+    ready (Little's law, clamped to HEYGEN_POOL_MIN..HEYGEN_POOL_MAX) and
+    stops ready sessions before HeyGen's idle timeout would expire them.
+    The pool lives in the database, so every worker claims from the same
+    sessions; the refiller holding the POOL_LEASE lease in the database
+    keeps it topped up, so hosts never overshoot the target together.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._refiller_pid = None
+        self._refiller_guard = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('HEYGEN_POOL_MIN', int(
+            os.environ.get('HEYGEN_POOL_MIN', '0')))
+        app.config.setdefault('HEYGEN_POOL_MAX', int(
+            os.environ.get('HEYGEN_POOL_MAX', '3')))
+        app.config.setdefault('HEYGEN_POOL_INTERVAL', float(
+            os.environ.get('HEYGEN_POOL_INTERVAL', '5')))
+        # Seconds before another process takes over from a dead refiller;
+        # longer than a cycle (session creation times out after 120 s)
+        app.config.setdefault('HEYGEN_POOL_LEASE', float(
+            os.environ.get('HEYGEN_POOL_LEASE', '180')))
+        app.config.setdefault('HEYGEN_RATE_WINDOW', int(
+            os.environ.get('HEYGEN_RATE_WINDOW', '900')))
+        # Seconds without activity before HeyGen closes a session
+        app.config.setdefault('HEYGEN_IDLE_TIMEOUT', int(
+            os.environ.get('HEYGEN_IDLE_TIMEOUT', '120')))
+        # Ready sessions are retired this many seconds before that
+        app.config.setdefault('HEYGEN_EXPIRY_MARGIN', int(
+            os.environ.get('HEYGEN_EXPIRY_MARGIN', '30')))
+        app.config.setdefault('HEYGEN_POOL_ENABLED',
+                              os.environ.get('HEYGEN_POOL_ENABLED',
+                                             '1') == '1')
+
+        self.app = app
+        app.extensions['avatar_pool'] = self
+
+        @app.before_request
+        def _start_refiller():
+            if self.enabled and app.config['HEYGEN_POOL_ENABLED']:
+                self.start_refiller()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(HEYGEN_API_KEY)
+
+    # ---------- Claiming ----------
+
+    def claim(self, assessment_session_id: str):
+        """
+        Hand a ready session to an assessment, or None if the pool is empty
+        """
+        current = self.current(assessment_session_id)
+        if current is not None:
+            # Page reload: rejoin the session the assessment already has
+            return current
+
+        fresh_after = datetime.utcnow() - self._max_ready_age()
+        candidates = AvatarSession.query.filter(
+            AvatarSession.status == READY,
+            AvatarSession.created_at > fresh_after).order_by(
+                AvatarSession.created_at.asc()).limit(5).all()
+        for record in candidates:
+            # Conditional so two workers never hand out the same session
+            result = db.session.execute(
+                update(AvatarSession).where(
+                    AvatarSession.id == record.id,
+                    AvatarSession.status == READY).values(
+                        status=CLAIMED,
+                        assessment_session_id=assessment_session_id,
+                        claimed_at=datetime.utcnow()).execution_options(
+                            synchronize_session=False))
+            db.session.commit()
+            if result.rowcount == 1:
+                db.session.refresh(record)
+                logging.info(f"Claimed pooled avatar session {record.id}")
+                return record
+        return None
+
+    def add(self, info: dict, assessment_session_id: str = None):
+        """
+        Store a session created upstream, as ready or already claimed
+        """
+        record = AvatarSession(heygen_session_id=info["session_id"],
+                               url=info["url"],
+                               access_token=info["access_token"],
+                               session_token=info["session_token"],
+                               warmup_ms=info.get("warmup_ms"))
+        if assessment_session_id:
+            record.status = CLAIMED
+            record.assessment_session_id = assessment_session_id
+            record.claimed_at = datetime.utcnow()
+        db.session.add(record)
+        db.session.commit()
+        return record
+
+    def current(self, assessment_session_id: str):
+        return AvatarSession.query.filter_by(
+            assessment_session_id=assessment_session_id,
+            status=CLAIMED).first()
+
+    def close(self, record: AvatarSession):
+        record.status = CLOSED
+        db.session.commit()
+
+    # ---------- Refilling ----------
+
+    def target_size(self) -> int:
+        """
+        Sessions to keep ready: arrivals per second x seconds to warm one up
+        """
+        window = self.app.config['HEYGEN_RATE_WINDOW']
+        since = datetime.utcnow() - timedelta(seconds=window)
+        arrivals = db.session.query(func.count(AvatarSession.id)).filter(
+            AvatarSession.claimed_at > since).scalar()
+        warmup_ms = db.session.query(func.avg(AvatarSession.warmup_ms)).filter(
+            AvatarSession.created_at > since).scalar() or 5000
+        # Any recent arrival keeps at least one session ready
+        target = math.ceil(arrivals / window * warmup_ms / 1000)
+        return max(self.app.config['HEYGEN_POOL_MIN'],
+                   min(self.app.config['HEYGEN_POOL_MAX'], target))
+
+    def refill(self, holder: str):
+        """
+        Run a pool cycle if `holder` gets the refill lease; returns the
+        number of sessions created, or None if another process holds it
+        """
+        duration = timedelta(seconds=self.app.config['HEYGEN_POOL_LEASE'])
+        if not leases.acquire(POOL_LEASE, holder, duration):
+            return None
+        return self.run_pool_cycle()
+
+    def run_pool_cycle(self) -> int:
+        """
+        Retire expiring sessions, then create enough to reach the target
+        """
+        self._retire()
+        ready = AvatarSession.query.filter_by(status=READY).count()
+        missing = self.target_size() - ready
+        if missing <= 0:
+            return 0
+
+        idle_timeout = self.app.config['HEYGEN_IDLE_TIMEOUT']
+
+        async def create_batch():
+            token = await create_token_async()
+            return await asyncio.gather(*(create_session_async(
+                token, idle_timeout) for _ in range(missing)),
+                                        return_exceptions=True)
+
+        created = 0
+        for info in run_upstream_sync(create_batch(), timeout=120):
+            if isinstance(info, Exception):
+                logging.error(f"Error pre-creating avatar session: {str(info)}")
+                continue
+            self.add(info)
+            created += 1
+        logging.info(f"Avatar pool: created {created} sessions")
+        return created
+
+    def _max_ready_age(self) -> timedelta:
+        return timedelta(seconds=self.app.config['HEYGEN_IDLE_TIMEOUT'] -
+                         self.app.config['HEYGEN_EXPIRY_MARGIN'])
+
+    def _retire(self):
+        now = datetime.utcnow()
+        expiring = AvatarSession.query.filter(
+            db.or_(
+                db.and_(AvatarSession.status == READY,
+                        AvatarSession.created_at <= now -
+                        self._max_ready_age()),
+                db.and_(AvatarSession.status == CLAIMED,
+                        AvatarSession.claimed_at <= now -
+                        CLAIMED_SESSION_LIFETIME))).all()
+        for record in expiring:
+            try:
+                run_upstream_sync(stop_session_async(record.heygen_session_id,
+                                                     record.session_token),
+                                  timeout=30)
+            except Exception as e:
+                # Already gone upstream
+                logging.info(f"Stopping avatar session {record.id}: {str(e)}")
+            record.status = CLOSED
+            db.session.commit()
+
+        AvatarSession.query.filter(
+            AvatarSession.status == CLOSED,
+            AvatarSession.created_at < now - CLOSED_RETENTION).delete()
+        db.session.commit()
+
+    def start_refiller(self):
+        """
+        Start this process's refiller thread (once per forked worker)
+        """
+        if self._refiller_pid == os.getpid():
+            return
+        with self._refiller_guard:
+            if self._refiller_pid == os.getpid():
+                return
+            self._refiller_pid = os.getpid()
+        thread = threading.Thread(target=self._refill_loop,
+                                  name="avatar-pool",
+                                  daemon=True)
+        thread.start()
+
+    def _refill_loop(self):
+        interval = self.app.config['HEYGEN_POOL_INTERVAL']
+        holder = leases.process_holder()
+        while True:
+            time.sleep(interval)
+            try:
+                with self.app.app_context():
+                    self.refill(holder)
+            except Exception as e:
+                logging.error(f"Error in avatar pool: {str(e)}")
+
+
+avatar_pool = AvatarPool()
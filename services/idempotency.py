@@ -0,0 +1,193 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+
+from flask import Response, jsonify, make_response, request, session
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# Records are kept long enough to cover client retries; the storage
+# janitor purges older ones
+RECORD_TTL = timedelta(hours=24)
+# A pending record older than this belongs to a crashed worker
+PENDING_TIMEOUT = timedelta(minutes=2)
+# Longest wait for an earlier request of the same session; past it the
+# request is refused with 429 and Retry-After rather than parked
+SESSION_LOCK_TIMEOUT = float(os.environ.get('SESSION_LOCK_TIMEOUT', '30'))
+# Polling interval while waiting for a session lock
+LOCK_POLL_INTERVAL = 0.05
+
+_session_locks = weakref.WeakValueDictionary()
+_session_locks_guard = threading.Lock()
+
+
+def session_lock(scope: str) -> threading.Lock:
+    """
+    Return the in-process lock serializing requests for one session
+    """
+    with _session_locks_guard:
+        lock = _session_locks.get(scope)
+        if lock is None:
+            lock = threading.Lock()
+            _session_locks[scope] = lock
+        return lock
+
+
+async def acquire_session_lock(lock: threading.Lock,
+                               timeout: float = None) -> bool:
+    """
+    Wait up to `timeout` seconds (default SESSION_LOCK_TIMEOUT) for a
+    session lock without holding a thread; True once acquired
+    """
+    if timeout is None:
+        timeout = SESSION_LOCK_TIMEOUT
+    deadline = time.monotonic() + timeout
+    while not lock.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+    return True
+
+
+def idempotent(serialize: bool = False):
+    """
+    Make an async view replay its stored response for a repeated
+    Idempotency-Key, and optionally serialize requests per session.
+
+    Requests without the header run normally. A key reused with a different
+    body is rejected with 422; a key whose first request is still running
+    (possibly on another worker) gets 409 with Retry-After. Requests without
+    a session are serialized per Idempotency-Key (not at all without one),
+    and a request still waiting for its session after SESSION_LOCK_TIMEOUT
+    seconds gets 429 with Retry-After.
+    """
+
+    def decorator(view):
+
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            session_id = session.get('assessment_session_id')
+            scope = session_id or 'anonymous'
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+
+            lock_scope = session_id or (key and f"key:{key}")
+            lock = session_lock(lock_scope) if serialize and lock_scope \
+                else None
+            if lock is not None and not await acquire_session_lock(lock):
+                logging.warning(
+                    f"Timed out waiting for session {lock_scope} on "
+                    f"{request.endpoint}")
+                response = jsonify(
+                    {'error': 'Another request for this session is still '
+                              'running'})
+                response.headers['Retry-After'] = '2'
+                return response, 429
+            try:
+                if not key:
+                    return await view(*args, **kwargs)
+
+                request_hash = hashlib.sha256(request.get_data()).hexdigest()
+                replay = await asyncio.to_thread(_begin, scope, key,
+                                                 request.endpoint,
+                                                 request_hash)
+                if replay is not None:
+                    return replay
+
+                try:
+                    response = make_response(await view(*args, **kwargs))
+                except Exception:
+                    await asyncio.to_thread(_abandon, scope, key)
+                    raise
+                await asyncio.to_thread(_finish, scope, key, response)
+                return response
+            finally:
+                if lock is not None:
+                    lock.release()
+
+        return wrapper
+
+    return decorator
+
+
+def _begin(scope, key, endpoint, request_hash):
+    """
+    Claim the key, or return the response to send instead of running the view
+    """
+    record = IdempotencyRecord.query.filter_by(scope=scope, key=key).first()
+    if record is not None:
+        if record.request_hash != request_hash:
+            return jsonify({
+                'error': 'Idempotency key reused with a different request'
+            }), 422
+        if record.status_code is not None:
+            # Records from before content_type was stored were all JSON
+            replay = Response(record.response_body,
+                              status=record.status_code,
+                              content_type=(record.content_type or
+                                            'application/json'))
+            replay.headers['Idempotent-Replayed'] = 'true'
+            return replay
+        if datetime.utcnow() - record.created_at < PENDING_TIMEOUT:
+            response = jsonify({'error': 'Request already in progress'})
+            response.headers['Retry-After'] = '1'
+            return response, 409
+        # The worker that claimed the key never finished; take it over
+        db.session.delete(record)
+        db.session.commit()
+
+    db.session.add(
+        IdempotencyRecord(scope=scope,
+                          key=key,
+                          endpoint=endpoint,
+                          request_hash=request_hash))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker claimed the same key between our read and insert
+        db.session.rollback()
+        response = jsonify({'error': 'Request already in progress'})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+
+    return None
+
+
+def _finish(scope, key, response):
+    record = IdempotencyRecord.query.filter_by(scope=scope, key=key).first()
+    if record is None:
+        return
+    if response.status_code >= 500:
+        # Let the client retry failures for real
+        db.session.delete(record)
+    else:
+        record.status_code = response.status_code
+        record.response_body = response.get_data(as_text=True)
+        record.content_type = response.content_type
+    db.session.commit()
+
+
+def _abandon(scope, key):
+    IdempotencyRecord.query.filter_by(scope=scope, key=key).delete()
+    db.session.commit()
+
+
+def purge_expired_records() -> int:
+    """
+    Delete idempotency records older than RECORD_TTL
+    """
+    cutoff = datetime.utcnow() - RECORD_TTL
+    deleted = IdempotencyRecord.query.filter(
+        IdempotencyRecord.created_at < cutoff).delete()
+    db.session.commit()
+    if deleted:
+        logging.info(f"Purged {deleted} expired idempotency records")
+    return deleted
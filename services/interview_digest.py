@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import re
+
+# The interview digest is a compact record of what the merchant has told us,
+# grouped by strategic area and stored on the session (JSON):
+#   {"turns": <Q&A pairs folded in>, "areas": {"pricing": ["fact", ...], ...}}
+# It is updated after each answer, and follow-up questions and the final
+# report are written from it instead of from the full transcript, so prompt
+# size stays flat however long the interview and the answers get.
+
+# Token budget of the rendered digest; older facts are dropped beyond it
+DIGEST_TOKEN_BUDGET = int(os.environ.get("DIGEST_TOKEN_BUDGET", "600"))
+# Longest single fact, and most facts taken from one answer
+FACT_TOKENS = int(os.environ.get("DIGEST_FACT_TOKENS", "60"))
+MAX_FACTS_PER_ANSWER = 5
+# The latest answer is quoted verbatim in prompts, up to this many tokens
+RECENT_ANSWER_TOKENS = int(os.environ.get("RECENT_ANSWER_TOKENS", "400"))
+# The final report prompt quotes every answer, sharing this many tokens
+REPORT_ANSWER_TOKENS = int(os.environ.get("REPORT_ANSWER_TOKENS", "4000"))
+
+OTHER_AREA = 'other'
+
+# Strategic areas the interview should cover: key -> (label, keywords used
+# to file an answer when Gemini cannot)
+STRATEGIC_AREAS = {
+    'business_model': ("Modèle économique",
+                       ("activité", "produit", "service", "offre", "clientèle",
+                        "chiffre d'affaires", "ventes", "marge", "concept")),
+    'pricing': ("Tarification",
+                ("prix", "tarif", "promotion", "remise", "panier moyen",
+                 "menu", "facturation")),
+    'costs': ("Coûts", ("coût", "charge", "loyer", "fournisseur", "stock",
+                        "dépense", "achat", "énergie", "budget")),
+    'acquisition': ("Acquisition client",
+                    ("publicité", "marketing", "nouveaux clients", "visibilité",
+                     "réseaux sociaux", "bouche-à-oreille", "google",
+                     "instagram", "communication")),
+    'retention': ("Fidélisation", ("fidél", "habitué", "carte", "avis",
+                                   "satisfaction", "reviennent", "récurren")),
+    'digital': ("Outils digitaux",
+                ("site", "logiciel", "caisse", "application", "en ligne",
+                 "e-commerce", "digital", "numérique", "livraison")),
+    'staff': ("Ressources humaines",
+              ("employé", "salarié", "équipe", "personnel", "recrut",
+               "formation", "serveur", "vendeur")),
+    'operations': ("Contraintes opérationnelles",
+                   ("horaire", "délai", "logistique", "approvisionnement",
+                    "local", "saison", "organisation", "temps", "contrainte")),
+    OTHER_AREA: ("Autres informations", ()),
+}
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate Gemini token count of a text, without calling the API
+
+    Punctuation counts as one token and words as one per started four
+    characters, which errs slightly high for French prose: good enough to
+    keep prompts under a budget.
+    """
+    return sum((len(token) + 3) // 4
+               for token in _TOKEN_PATTERN.findall(text or ''))
+
+
+def clip_tokens(text: str, tokens: int) -> str:
+    """
+    Cut text at a word boundary to about `tokens` tokens
+    """
+    text = ' '.join((text or '').split())
+    if estimate_tokens(text) <= tokens:
+        return text
+    kept = []
+    used = 0
+    for word in text.split(' '):
+        used += estimate_tokens(word)
+        if used > tokens:
+            break
+        kept.append(word)
+    return ' '.join(kept).rstrip(',;:') + ' …'
+
+
+def new_digest() -> dict:
+    return {'turns': 0, 'areas': {}}
+
+
+def render_digest(digest: dict) -> str:
+    """
+    Digest as prompt text, one section per area with known facts
+    """
+    areas = (digest or {}).get('areas', {})
+    sections = []
+    for area, (label, _) in STRATEGIC_AREAS.items():
+        facts = areas.get(area)
+        if not facts:
+            continue
+        sections.append(f"{label} :\n" +
+                        "\n".join(f"- {fact}" for fact in facts))
+    return "\n".join(sections) or "(aucune information recueillie)"
+
+
+def render_recent_exchange(qa_list: list) -> str:
+    """
+    Latest question and answer as prompt text, the answer clipped
+    """
+    if not qa_list:
+        return ""
+    qa = qa_list[-1]
+    return (f"Q : {qa['question']}\n"
+            f"R : {clip_tokens(qa['answer'], RECENT_ANSWER_TOKENS)}")
+
+
+def render_transcript(qa_list: list, budget: int = None) -> str:
+    """
+    Every question and answer as prompt text, the answers clipped to share
+    `budget` tokens; what short answers leave goes to the longer ones
+    """
+    budget = budget or REPORT_ANSWER_TOKENS
+    lengths = [estimate_tokens(qa['answer']) for qa in qa_list]
+    shares = {}
+    remaining = budget
+    # Shortest first, each taking at most an even split of what is left
+    order = sorted(range(len(qa_list)), key=lengths.__getitem__)
+    for done, index in enumerate(order):
+        share = remaining // (len(qa_list) - done)
+        shares[index] = min(lengths[index], share)
+        remaining -= shares[index]
+    return "\n\n".join(
+        f"Q{number} : {qa['question']}\n"
+        f"R : {clip_tokens(qa['answer'], shares[number - 1])}"
+        for number, qa in enumerate(qa_list, 1))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lower-cased text with typographic apostrophes made straight, as in
+    the STRATEGIC_AREAS keywords
+    """
+    return text.lower().replace('’', "'").replace('ʼ', "'")
+
+
+def classify_area(text: str) -> str:
+    """
+    Strategic area whose keywords occur most often in the text
+    """
+    text = normalize_text(text)
+    best, best_hits = OTHER_AREA, 0
+    for area, (_, keywords) in STRATEGIC_AREAS.items():
+        hits = sum(text.count(keyword) for keyword in keywords)
+        if hits > best_hits:
+            best, best_hits = area, hits
+    return best
+
+
+def local_facts(question: str, answer: str) -> list:
+    """
+    Facts from one answer without Gemini: its opening sentences, filed
+    under the area its wording points to
+    """
+    sentences = _SENTENCE_END.split(' '.join(answer.split()))
+    fact = clip_tokens(' '.join(sentences[:2]), FACT_TOKENS)
+    if not fact:
+        return []
+    return [{'area': classify_area(f"{question} {answer}"), 'fact': fact}]
+
+
+def add_facts(digest: dict, facts: list) -> dict:
+    """
+    Return a copy of the digest with the facts of one more answer added
+    """
+    areas = {area: list(known)
+             for area, known in (digest or {}).get('areas', {}).items()}
+    for item in facts[:MAX_FACTS_PER_ANSWER]:
+        area = item.get('area')
+        if area not in STRATEGIC_AREAS:
+            area = OTHER_AREA
+        fact = clip_tokens(item.get('fact', ''), FACT_TOKENS)
+        if fact and fact not in areas.get(area, []):
+            areas.setdefault(area, []).append(fact)
+    return {'turns': (digest or {}).get('turns', 0) + 1, 'areas': areas}
+
+
+def compact(digest: dict, budget: int = None) -> dict:
+    """
+    Drop the oldest facts of the fullest areas until the digest fits
+    the token budget; every area keeps its latest fact
+    """
+    budget = budget or DIGEST_TOKEN_BUDGET
+    areas = digest['areas']
+    while estimate_tokens(render_digest(digest)) > budget:
+        area = max(areas, key=lambda name: len(areas[name]))
+        if len(areas[area]) <= 1:
+            break
+        areas[area].pop(0)
+    return digest
+
+
+def build_digest(qa_list: list, digest: dict = None) -> dict:
+    """
+    Fold the answers the digest does not cover yet, without Gemini
+    """
+    digest = digest or new_digest()
+    for qa in qa_list[digest.get('turns', 0):]:
+        digest = compact(add_facts(digest,
+                                   local_facts(qa['question'], qa['answer'])))
+    return digest
+
+
+async def update_digest_async(digest: dict, qa_list: list) -> dict:
+    """
+    Fold the answers the digest does not cover yet (normally just the
+    latest), extracting facts with Gemini and falling back to local_facts
+    """
+    from services import gemini_service
+
+    digest = digest or new_digest()
+    missing = qa_list[digest.get('turns', 0):]
+    if not missing:
+        return digest
+
+    async def extract(qa):
+        if gemini_service.gemini_api_key:
+            try:
+                return await gemini_service.extract_digest_facts_async(
+                    qa['question'], qa['answer'])
+            except Exception as e:
+                logging.warning(
+                    f"Digest extraction failed, using local facts: {str(e)}")
+        return local_facts(qa['question'], qa['answer'])
+
+    # Catching up on several turns (an update lost with a worker, or a
+    # session older than the digest): extract them concurrently
+    for facts in await asyncio.gather(*(extract(qa) for qa in missing)):
+        digest = compact(add_facts(digest, facts))
+    return digest
@@ -0,0 +1,63 @@
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import Lease
+
+# Leases make a periodic job run in one process of the whole deployment
+# rather than one per host (a file lock only spans one host). The holder
+# renews its lease every run; if it dies, another process takes over once
+# the lease expires.
+
+
+def process_holder() -> str:
+    """
+    Holder name of this process
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire(name: str, holder: str, duration: timedelta) -> bool:
+    """
+    Take or renew the lease `name` for `duration`; False while another
+    holder's lease is unexpired
+    """
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(Lease).where(
+            Lease.name == name,
+            db.or_(Lease.holder == holder,
+                   Lease.expires_at <= now)).values(
+                       holder=holder,
+                       expires_at=now + duration).execution_options(
+                           synchronize_session=False))
+    db.session.commit()
+    if result.rowcount == 1:
+        return True
+    if db.session.get(Lease, name) is not None:
+        return False
+    try:
+        db.session.add(Lease(name=name, holder=holder,
+                             expires_at=now + duration))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # Another process created it first
+        db.session.rollback()
+        return False
+
+
+def release(name: str, holder: str):
+    """
+    Give up the lease if `holder` has it
+    """
+    db.session.execute(
+        update(Lease).where(Lease.name == name,
+                            Lease.holder == holder).values(
+                                expires_at=datetime.utcnow()).execution_options(
+                                    synchronize_session=False))
+    db.session.commit()
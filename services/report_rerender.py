@@ -0,0 +1,180 @@
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sqlalchemy import update
+
+from app import db
+from models import AssessmentSession
+from services.blob_store import get_blob_store
+from services.storage_service import storage, blob_key, REPORT
+
+# Re-render the PDF of every completed session after a report template
+# change, from the stored CV analysis, Q&A and final summary: no Gemini call.
+# Sessions are read in keyset-paginated pages (id > last id), rendered by a
+# process pool (ReportLab is pure Python and holds the GIL) and written by
+# this process: blob writes are atomic, and a session's existing report is
+# replaced in place so download links and the index stay valid.
+#
+# Sessions completed before summaries were stored are skipped, unless
+# regenerate_missing asks Gemini for their summary (one call each, made by
+# this process) and stores it first.
+
+# Sessions rendering or waiting per pool process
+INFLIGHT_PER_WORKER = 4
+
+
+def _render(cv_analysis: str, questions_answers: str, summary: str) -> bytes:
+    # Runs in a pool process; parses the stored columns like the model does
+    from services.document_service import render_assessment_report
+    row = AssessmentSession(cv_analysis=cv_analysis,
+                            questions_answers=questions_answers)
+    return render_assessment_report(row.get_cv_analysis(),
+                                     row.get_questions_answers(), summary)
+
+
+def completed_sessions(after_id: int = 0, page_size: int = 200):
+    """
+    Yield (id, session_id, cv_analysis, questions_answers, final_summary)
+    of completed sessions in id order, one page per query
+    """
+    columns = (AssessmentSession.id, AssessmentSession.session_id,
+               AssessmentSession.cv_analysis,
+               AssessmentSession.questions_answers,
+               AssessmentSession.final_summary)
+    while True:
+        page = db.session.query(*columns).filter(
+            AssessmentSession.status == 'completed',
+            AssessmentSession.id > after_id).order_by(
+                AssessmentSession.id).limit(page_size).all()
+        if not page:
+            return
+        yield from page
+        after_id = page[-1].id
+
+
+def count_completed(after_id: int = 0) -> int:
+    return AssessmentSession.query.filter(
+        AssessmentSession.status == 'completed',
+        AssessmentSession.id > after_id).count()
+
+
+def _regenerate_summary(row) -> str:
+    # Legacy session: write its summary with Gemini and keep it
+    from services.async_runtime import run_upstream_sync
+    from services.gemini_service import write_final_summary_async
+    parsed = AssessmentSession(cv_analysis=row.cv_analysis,
+                               questions_answers=row.questions_answers)
+    summary = run_upstream_sync(
+        write_final_summary_async(parsed.get_cv_analysis(),
+                                  parsed.get_questions_answers()),
+        timeout=120)
+    db.session.execute(
+        update(AssessmentSession).where(
+            AssessmentSession.id == row.id).values(
+                final_summary=summary).execution_options(
+                    synchronize_session=False))
+    db.session.commit()
+    return summary
+
+
+def _store(session_id: str, pdf: bytes):
+    from services.document_service import create_report_filename
+    record = storage.latest_for_session(REPORT, session_id)
+    name = record.name if record else create_report_filename(session_id)
+    size_bytes, content_hash = get_blob_store().put_bytes(
+        blob_key(REPORT, name), pdf, content_type='application/pdf')
+    storage.register(REPORT, name, session_id, size_bytes, content_hash)
+
+
+def rerender_reports(workers: int = None, page_size: int = 200,
+                     after_id: int = 0, limit: int = None,
+                     progress=None, progress_interval: float = 5.0,
+                     regenerate_missing: bool = False) -> dict:
+    """
+    Re-render the reports of completed sessions; returns counts of
+    rendered, skipped (no stored summary), regenerated (summary written
+    by Gemini, with regenerate_missing) and failed sessions
+
+    `progress(done, total, rate, eta, resume_after)` is called every
+    progress_interval seconds; every session up to id resume_after has been
+    handled, so an interrupted run can continue with after_id=resume_after.
+    """
+    # Loaded before the pool forks, so workers share the imported modules
+    import services.document_service  # noqa: F401
+
+    workers = workers or os.cpu_count() or 1
+    total = count_completed(after_id)
+    if limit is not None:
+        total = min(total, limit)
+    stats = {'rendered': 0, 'skipped': 0, 'regenerated': 0, 'failed': 0,
+             'resume_after': after_id}
+    started = last_report = time.monotonic()
+    pending = {}
+    last_seen = after_id
+
+    def collect(futures):
+        for future in futures:
+            row_id, session_id = pending.pop(future)
+            try:
+                _store(session_id, future.result())
+                stats['rendered'] += 1
+            except Exception as e:
+                stats['failed'] += 1
+                logging.error(f"Re-rendering report of {session_id} failed: "
+                              f"{str(e)}")
+
+    # Forked workers must not reuse the parent's pooled DB connections
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=db.engine.dispose,
+                             initargs=(False,)) as pool:
+        rows = completed_sessions(after_id, page_size)
+        for handled, row in enumerate(rows):
+            if limit is not None and handled >= limit:
+                break
+            summary = row.final_summary
+            if not summary and regenerate_missing:
+                try:
+                    summary = _regenerate_summary(row)
+                    stats['regenerated'] += 1
+                except Exception as e:
+                    stats['failed'] += 1
+                    logging.error(f"Summary of {row.session_id} could not "
+                                  f"be regenerated: {str(e)}")
+                    db.session.rollback()
+            elif not summary:
+                # Written before summaries were stored: would need Gemini
+                stats['skipped'] += 1
+            if summary:
+                pending[pool.submit(_render, row.cv_analysis,
+                                    row.questions_answers,
+                                    summary)] = (row.id, row.session_id)
+            last_seen = row.id
+
+            while len(pending) >= workers * INFLIGHT_PER_WORKER:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            now = time.monotonic()
+            if progress and now - last_report >= progress_interval:
+                last_report = now
+                stats['resume_after'] = min(
+                    (row_id - 1 for row_id, _ in pending.values()),
+                    default=last_seen)
+                _report(progress, stats, total, now - started)
+        collect(list(pending))
+
+    stats['resume_after'] = last_seen
+    _report(progress, stats, total, time.monotonic() - started)
+    return stats
+
+
+def _report(progress, stats: dict, total: int, elapsed: float):
+    if progress is None:
+        return
+    # Regenerated sessions are counted once rendered (or failed)
+    done = stats['rendered'] + stats['skipped'] + stats['failed']
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate > 0 else None
+    progress(done, total, rate, eta, stats['resume_after'])
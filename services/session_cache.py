@@ -0,0 +1,374 @@
+import atexit
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from flask import has_app_context
+from sqlalchemy import update
+
+from app import db
+from models import AssessmentSession
+
+# Durability modes for answer appends:
+# - write_through: every turn is committed before the response is returned
+# - write_behind: turns are committed by a background flusher every
+#   SESSION_CACHE_FLUSH_INTERVAL seconds (and on eviction/exit). Only safe
+#   when a candidate's requests stick to one worker.
+WRITE_THROUGH = 'write_through'
+WRITE_BEHIND = 'write_behind'
+
+# Optimistic-concurrency retries when another worker wrote the row
+MAX_PERSIST_ATTEMPTS = 3
+
+
+@dataclass
+class SessionState:
+    """Hot fields of an AssessmentSession kept in memory between turns"""
+    session_id: str
+    status: str
+    current_question_index: int
+    cv_filename: str
+    cv_analysis: dict
+    questions_answers: list
+    version: int
+    interview_digest: dict = field(default_factory=dict)
+    # Per-answer area scores (services.coverage); rebuilt after loading
+    coverage_matrix: object = None
+    loaded_at: float = field(default_factory=time.monotonic)
+    # Last time the stored version was known to match
+    verified_at: float = field(default_factory=time.monotonic)
+    pending_answers: list = field(default_factory=list)
+    pending_fields: dict = field(default_factory=dict)
+    lock: threading.RLock = field(default_factory=threading.RLock,
+                                  repr=False,
+                                  compare=False)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending_answers or self.pending_fields)
+
+    @classmethod
+    def from_row(cls, row: AssessmentSession) -> 'SessionState':
+        try:
+            cv_analysis = row.get_cv_analysis()
+        except (ValueError, SyntaxError):
+            cv_analysis = {}
+        return cls(session_id=row.session_id,
+                   status=row.status,
+                   current_question_index=row.current_question_index or 0,
+                   cv_filename=row.cv_filename,
+                   cv_analysis=cv_analysis,
+                   questions_answers=row.get_questions_answers(),
+                   version=row.version,
+                   interview_digest=row.get_interview_digest())
+
+
+class SessionStateCache:
+    """
+    Bounded LRU + TTL cache of session state keyed by session_id
+
+    Reads are served from memory. At most every
+    SESSION_CACHE_VERIFY_INTERVAL seconds a single-column SELECT checks that
+    the row's version is still the cached one; a row changed by another
+    worker is reloaded (or, with unsaved changes, rebased). Writes are
+    persisted with a conditional UPDATE on the version column; if another
+    worker changed the row in the meantime, the pending changes are
+    replayed on top of the fresh row, so a read between two checks may be
+    slightly stale but a write never loses a turn. Entries are reloaded in
+    full after SESSION_CACHE_TTL seconds.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.max_entries = 1000
+        self.ttl = 900.0
+        self.durability = WRITE_THROUGH
+        self.flush_interval = 1.0
+        self.verify_interval = 1.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self._atexit_registered = False
+
+    def init_app(self, app):
+        app.config.setdefault(
+            'SESSION_CACHE_MAX_ENTRIES',
+            int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '1000')))
+        app.config.setdefault(
+            'SESSION_CACHE_TTL',
+            float(os.environ.get('SESSION_CACHE_TTL', '900')))
+        app.config.setdefault(
+            'SESSION_CACHE_DURABILITY',
+            os.environ.get('SESSION_CACHE_DURABILITY', WRITE_THROUGH))
+        app.config.setdefault(
+            'SESSION_CACHE_FLUSH_INTERVAL',
+            float(os.environ.get('SESSION_CACHE_FLUSH_INTERVAL', '1.0')))
+        # Seconds a cached entry is trusted before its version is checked
+        # again (0 checks on every read)
+        app.config.setdefault(
+            'SESSION_CACHE_VERIFY_INTERVAL',
+            float(os.environ.get('SESSION_CACHE_VERIFY_INTERVAL', '1.0')))
+
+        self.app = app
+        self.max_entries = app.config['SESSION_CACHE_MAX_ENTRIES']
+        self.ttl = app.config['SESSION_CACHE_TTL']
+        self.durability = app.config['SESSION_CACHE_DURABILITY']
+        self.flush_interval = app.config['SESSION_CACHE_FLUSH_INTERVAL']
+        self.verify_interval = app.config['SESSION_CACHE_VERIFY_INTERVAL']
+        if self.durability not in (WRITE_THROUGH, WRITE_BEHIND):
+            raise ValueError(
+                f"Unknown SESSION_CACHE_DURABILITY: {self.durability}")
+
+        app.extensions['session_cache'] = self
+        if not self._atexit_registered:
+            atexit.register(self.flush_all)
+            self._atexit_registered = True
+
+    # ---------- Reads ----------
+
+    def get(self, session_id: str):
+        """
+        Return the cached SessionState, loading it from the DB on a miss
+        """
+        with self._lock:
+            state = self._entries.get(session_id)
+            if state is not None and not self._expired(state):
+                self._entries.move_to_end(session_id)
+            else:
+                state, expired = None, state
+
+        if state is not None:
+            now = time.monotonic()
+            if now - state.verified_at < self.verify_interval:
+                return state
+            version = self._stored_version(session_id)
+            if version == state.version:
+                state.verified_at = now
+                return state
+            if version is not None and state.dirty:
+                # Changed by another worker: replay our turns on top of it
+                self.persist(state)
+                return state
+            expired = state
+            with self._lock:
+                if self._entries.get(session_id) is state:
+                    del self._entries[session_id]
+            if version is None:
+                return None
+
+        # Never drop unsaved turns when an entry expires
+        if expired is not None and expired.dirty:
+            self.persist(expired)
+
+        state = self._load(session_id)
+        if state is not None:
+            self._store(state)
+        return state
+
+    def invalidate(self, session_id: str):
+        """
+        Drop a session from the cache, persisting it first if dirty
+        """
+        with self._lock:
+            state = self._entries.pop(session_id, None)
+        if state is not None and state.dirty:
+            self.persist(state)
+
+    # ---------- Writes ----------
+
+    def append_answer(self, state: SessionState, question: str,
+                      answer: str) -> SessionState:
+        """
+        Append a Q&A to a state returned by get(); call save() to persist it
+        """
+        with state.lock:
+            qa = {
+                'question': question,
+                'answer': answer,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+            state.questions_answers.append(qa)
+            state.pending_answers.append(qa)
+            state.current_question_index += 1
+        return state
+
+    def update(self, session_id: str, **fields):
+        """
+        Set hot fields (status, cv_analysis, interview_digest) in memory;
+        call save() to persist
+        """
+        state = self.get(session_id)
+        if state is None:
+            return None
+        with state.lock:
+            for name, value in fields.items():
+                setattr(state, name, value)
+                state.pending_fields[name] = value
+        return state
+
+    def update_cached(self, session_id: str, **fields):
+        """
+        Like update(), but only for a session already in memory: never
+        loads from or writes to the DB
+        """
+        with self._lock:
+            state = self._entries.get(session_id)
+        if state is None:
+            return None
+        with state.lock:
+            for name, value in fields.items():
+                setattr(state, name, value)
+                state.pending_fields[name] = value
+        return state
+
+    def save(self, session_id: str):
+        """
+        Persist pending changes according to the configured durability
+        """
+        with self._lock:
+            state = self._entries.get(session_id)
+        if state is None or not state.dirty:
+            return
+        if self.durability == WRITE_THROUGH:
+            self.persist(state)
+        else:
+            self._ensure_flusher()
+
+    def persist(self, state: SessionState):
+        """
+        Write pending changes for one session to the DB
+        """
+        with state.lock, self._app_context():
+            for _ in range(MAX_PERSIST_ATTEMPTS):
+                if not state.dirty:
+                    return
+                values = {
+                    'questions_answers': json.dumps(state.questions_answers),
+                    'current_question_index': state.current_question_index,
+                    'status': state.status,
+                    'version': state.version + 1,
+                    'updated_at': datetime.utcnow(),
+                }
+                if 'cv_analysis' in state.pending_fields:
+                    values['cv_analysis'] = str(state.cv_analysis)
+                if 'interview_digest' in state.pending_fields:
+                    values['interview_digest'] = json.dumps(
+                        state.interview_digest)
+
+                result = db.session.execute(
+                    update(AssessmentSession).where(
+                        AssessmentSession.session_id == state.session_id,
+                        AssessmentSession.version == state.version).values(
+                            **values).execution_options(
+                                synchronize_session=False))
+                db.session.commit()
+
+                if result.rowcount == 1:
+                    state.version += 1
+                    state.verified_at = time.monotonic()
+                    state.pending_answers.clear()
+                    state.pending_fields.clear()
+                    return
+
+                # Another worker wrote the row since we loaded it
+                logging.info(
+                    f"Session {state.session_id} changed elsewhere, rebasing")
+                self._rebase(state)
+
+            raise RuntimeError(
+                f"Could not persist session {state.session_id} after "
+                f"{MAX_PERSIST_ATTEMPTS} attempts")
+
+    def flush_all(self):
+        """
+        Persist every dirty entry (used by the flusher and at exit)
+        """
+        with self._lock:
+            dirty = [s for s in self._entries.values() if s.dirty]
+        for state in dirty:
+            try:
+                self.persist(state)
+            except Exception as e:
+                logging.error(
+                    f"Error flushing session {state.session_id}: {str(e)}")
+
+    # ---------- Internals ----------
+
+    def _expired(self, state: SessionState) -> bool:
+        return time.monotonic() - state.loaded_at > self.ttl
+
+    def _stored_version(self, session_id: str):
+        with self._app_context():
+            return db.session.execute(
+                db.select(AssessmentSession.version).where(
+                    AssessmentSession.session_id == session_id)).scalar()
+
+    def _load(self, session_id: str):
+        with self._app_context():
+            row = AssessmentSession.query.filter_by(
+                session_id=session_id).first()
+            if row is None:
+                return None
+            return SessionState.from_row(row)
+
+    def _store(self, state: SessionState):
+        evicted = []
+        with self._lock:
+            self._entries[state.session_id] = state
+            self._entries.move_to_end(state.session_id)
+            while len(self._entries) > self.max_entries:
+                _, oldest = self._entries.popitem(last=False)
+                if oldest.dirty:
+                    evicted.append(oldest)
+        for oldest in evicted:
+            self.persist(oldest)
+
+    def _rebase(self, state: SessionState):
+        fresh = self._load(state.session_id)
+        if fresh is None:
+            raise RuntimeError(f"Session {state.session_id} was deleted")
+        state.questions_answers = fresh.questions_answers + list(
+            state.pending_answers)
+        state.current_question_index = (fresh.current_question_index +
+                                         len(state.pending_answers))
+        state.cv_filename = fresh.cv_filename
+        state.cv_analysis = state.pending_fields.get('cv_analysis',
+                                                     fresh.cv_analysis)
+        state.status = state.pending_fields.get('status', fresh.status)
+        state.interview_digest = state.pending_fields.get(
+            'interview_digest', fresh.interview_digest)
+        state.version = fresh.version
+        # Rows follow answer order, which the merge may have changed
+        state.coverage_matrix = None
+        state.loaded_at = state.verified_at = time.monotonic()
+
+    def _app_context(self):
+        if has_app_context():
+            return contextlib.nullcontext()
+        return self.app.app_context()
+
+    def _ensure_flusher(self):
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._flush_loop,
+                                  name="session-cache-flusher",
+                                  daemon=True)
+        thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush_all()
+
+
+session_cache = SessionStateCache()
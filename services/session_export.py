@@ -0,0 +1,164 @@
+import ast
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from app import db
+from models import AssessmentSession
+
+# Export of AssessmentSession rows for analysis, as NDJSON or CSV, used by
+# GET /api/export/sessions and `flask sessions-export`. Rows are read in
+# keyset-paginated pages ordered by (created_at, id), each page through a
+# server-side cursor, and only the requested columns are loaded: memory use
+# does not depend on how many sessions are exported.
+
+FORMATS = ('ndjson', 'csv')
+
+# Exported field -> (columns it needs, value from a result row)
+FIELDS = {
+    'id': (('id',), lambda row: row.id),
+    'session_id': (('session_id',), lambda row: row.session_id),
+    'status': (('status',), lambda row: row.status),
+    'created_at': (('created_at',), lambda row: row.created_at),
+    'updated_at': (('updated_at',), lambda row: row.updated_at),
+    'cv_filename': (('cv_filename',), lambda row: row.cv_filename),
+    'question_count': (('current_question_index',),
+                       lambda row: row.current_question_index),
+    'cv_analysis': (('cv_analysis',),
+                    lambda row: _literal(row.cv_analysis)),
+    'questions_answers': (('questions_answers',),
+                          lambda row: _json(row.questions_answers)),
+    'interview_digest': (('interview_digest',),
+                         lambda row: _json(row.interview_digest)),
+    'final_summary': (('final_summary',), lambda row: row.final_summary),
+    'cv_content': (('cv_content',), lambda row: row.cv_content),
+}
+
+# Exported when no fields are requested: everything but the large text
+DEFAULT_FIELDS = ('id', 'session_id', 'status', 'created_at', 'updated_at',
+                  'cv_filename', 'question_count')
+
+MAX_PAGE_SIZE = 5000
+
+
+def _literal(value):
+    # cv_analysis is stored as str(dict)
+    try:
+        return ast.literal_eval(value) if value else None
+    except (ValueError, SyntaxError):
+        return value
+
+
+def _json(value):
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return value
+
+
+def parse_fields(value: str) -> list:
+    """
+    Field names from a comma-separated list; raises ValueError on unknown
+    """
+    if not value:
+        return list(DEFAULT_FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_date(value: str):
+    """
+    ISO date or datetime (naive UTC, like created_at), or None
+    """
+    return datetime.fromisoformat(value) if value else None
+
+
+def iter_sessions(fields: list, status: str = None, since: datetime = None,
+                  until: datetime = None, page_size: int = 500):
+    """
+    Yield one dict per session, oldest first; `since` is inclusive and
+    `until` exclusive
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    names = {'id', 'created_at'}
+    for field in fields:
+        names.update(FIELDS[field][0])
+    columns = [getattr(AssessmentSession, name) for name in sorted(names)]
+
+    query = db.session.query(*columns)
+    if status:
+        query = query.filter(AssessmentSession.status == status)
+    if since:
+        query = query.filter(AssessmentSession.created_at >= since)
+    if until:
+        query = query.filter(AssessmentSession.created_at < until)
+    query = query.filter(AssessmentSession.created_at.isnot(None)).order_by(
+        AssessmentSession.created_at, AssessmentSession.id)
+
+    last = None
+    while True:
+        page = query
+        if last is not None:
+            page = page.filter(
+                tuple_(AssessmentSession.created_at, AssessmentSession.id) >
+                tuple_(*last))
+        count = 0
+        for row in page.limit(page_size).execution_options(
+                stream_results=True, yield_per=page_size):
+            count += 1
+            last = (row.created_at, row.id)
+            yield {field: FIELDS[field][1](row) for field in fields}
+        if count < page_size:
+            return
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=_default) + '\n'
+
+
+def csv_lines(rows, fields: list):
+    """
+    CSV with a header row; nested values are JSON-encoded
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(fields)
+    for row in rows:
+        yield line([
+            json.dumps(value, ensure_ascii=False, default=_default)
+            if isinstance(value, (dict, list)) else
+            _default(value) if isinstance(value, datetime) else
+            '' if value is None else value
+            for value in (row[field] for field in fields)
+        ])
+
+
+def export_lines(export_format: str, fields: list, **filters):
+    """
+    Lines of the export in the given format (see FORMATS)
+    """
+    rows = iter_sessions(fields, **filters)
+    if export_format == 'csv':
+        return csv_lines(rows, fields)
+    return ndjson_lines(rows)
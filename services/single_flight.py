@@ -0,0 +1,42 @@
+import asyncio
+import hashlib
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight async work
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same task and share its result (or exception).
+    All methods must be called from the same event loop, which in this app is
+    the upstream loop (services.async_runtime).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, coro_factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled waiter must not cancel the work other waiters share
+        return await asyncio.shield(task)
+
+    def inflight_count(self) -> int:
+        return len(self._inflight)
+
+
+def request_key(*parts) -> str:
+    """
+    Stable hash of the arguments that fully determine an upstream request
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+upstream_flight = SingleFlight()
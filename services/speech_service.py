@@ -1,87 +1,178 @@
 import os
 import logging
-import requests
+import mimetypes
+import wave
+from services.async_runtime import UPSTREAM_KEEPALIVE_EXPIRY
+from services.blob_store import get_blob_store
+from services.single_flight import upstream_flight, request_key
+from services.traffic_capture import traffic
 
 # ElevenLabs configuration
 ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
 ELEVENLABS_VOICE_ID = os.environ.get(
     "ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")  # Default voice ID
 
+# Audio formats TTS produces for every question, e.g. "mp3,ogg". mp3 is the
+# canonical variant; ogg (Opus) is a much smaller variant served to clients
+# whose Accept header prefers it. Each extra format is a separate synthesis.
+TTS_AUDIO_FORMATS = [
+    f.strip()
+    for f in os.environ.get("TTS_AUDIO_FORMATS", "mp3").split(",") if f.strip()
+]
+
+# ElevenLabs output_format and MIME type per file extension
+AUDIO_FORMATS = {
+    "mp3": ("mp3_44100_128", "audio/mpeg"),
+    "ogg": ("opus_48000_32", "audio/ogg"),
+}
+
 # Tavus configuration for speech recognition
 TAVUS_API_KEY = os.environ.get("TAVUS_API_KEY")
 TAVUS_API_URL = "https://tavusapi.com/v2"
 
 
-def text_to_speech(text: str, output_path: str) -> bool:
+# Shared async HTTP client, created lazily on the upstream event loop
+# (see services.async_runtime) so connections to ElevenLabs are reused.
+_async_http_client = None
+
+
+# Name prefix of content-addressed question audio, which any session may share
+SHARED_AUDIO_PREFIX = "question_"
+
+
+def audio_stem(text: str) -> str:
     """
-    Convert text to speech using ElevenLabs API
-    Input: text to convert, output file path
-    Output: True if successful, False otherwise
+    Content-addressed base name of the audio for a question text; the same
+    voice and text always map to the same files
     """
-    try:
-        if not ELEVENLABS_API_KEY:
-            logging.error("ElevenLabs API key not found")
-            return False
+    return (f"{SHARED_AUDIO_PREFIX}"
+            f"{request_key('tts', ELEVENLABS_VOICE_ID, text)[:32]}")
 
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
 
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVENLABS_API_KEY
-        }
+def audio_mimetype(filename: str) -> str:
+    ext = filename.rsplit('.', 1)[-1].lower()
+    if ext in AUDIO_FORMATS:
+        return AUDIO_FORMATS[ext][1]
+    return mimetypes.guess_type(filename)[0] or AUDIO_FORMATS["mp3"][1]
 
-        data = {
-            "text": text,
-            "model_id": "eleven_turbo_v2_5",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
-            }
+
+def _tts_request(text: str, audio_format: str = "mp3") -> dict:
+    """
+    Build the ElevenLabs text-to-speech request arguments
+    """
+    output_format, mimetype = AUDIO_FORMATS[audio_format]
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+
+    headers = {
+        "Accept": mimetype,
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVENLABS_API_KEY
+    }
+
+    data = {
+        "text": text,
+        "model_id": "eleven_turbo_v2_5",
+        "voice_settings": {
+            "stability": 0.5,
+            "similarity_boost": 0.5
         }
+    }
+
+    return {
+        "url": url,
+        "params": {"output_format": output_format},
+        "json": data,
+        "headers": headers
+    }
+
 
-        response = requests.post(url, json=data, headers=headers)
+def _get_async_http_client() -> 'httpx.AsyncClient':
+    global _async_http_client
+    if _async_http_client is None:
+        import httpx
+        _async_http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=200,
+                                max_keepalive_connections=50,
+                                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY))
+    return _async_http_client
+
+
+async def warm_connection_async():
+    """
+    Open (or keep open) a pooled connection to ElevenLabs
+    """
+    response = await _get_async_http_client().get(
+        f"https://api.elevenlabs.io/v1/voices/{ELEVENLABS_VOICE_ID}",
+        headers={"xi-api-key": ELEVENLABS_API_KEY})
+    response.raise_for_status()
+
+
+async def text_to_speech_async(text: str, blob_key: str,
+                               audio_format: str = "mp3"):
+    """
+    Convert text to speech using ElevenLabs API; run it on the upstream
+    event loop
+    Input: text to convert, blob store key, format from AUDIO_FORMATS
+    Output: (size, SHA-256) of the stored audio if successful, None otherwise
+    """
+    try:
+        if not ELEVENLABS_API_KEY:
+            logging.error("ElevenLabs API key not found")
+            return None
+
+        # Concurrent requests for the same text share one synthesis
+        response = await upstream_flight.do(
+            request_key('tts', ELEVENLABS_VOICE_ID, audio_format, text),
+            lambda: traffic.upstream(
+                'elevenlabs', 'tts',
+                lambda: _get_async_http_client().post(
+                    **_tts_request(text, audio_format))))
 
         if response.status_code == 200:
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            logging.info(f"Audio saved to {output_path}")
-            return True
+            stored = get_blob_store().put_bytes(
+                blob_key, response.content,
+                content_type=AUDIO_FORMATS[audio_format][1])
+            logging.info(f"Audio saved to {blob_key}")
+            return stored
         else:
             logging.error(
                 f"ElevenLabs API error: {response.status_code} - {response.text}"
             )
-            return False
+            return None
 
     except Exception as e:
-        logging.error(f"Error in text_to_speech: {str(e)}")
-        return False
+        logging.error(f"Error in text_to_speech_async: {str(e)}")
+        return None
 
 
 def speech_to_text(audio_file_path: str) -> str:
     """
-    Convert speech to text using Web Speech API fallback
-    Input: path to audio file
+    Convert speech to text with the configured STT engine
+    Input: path to a 16-bit mono WAV file
     Output: transcribed text
-    
-    Note: Since Tavus is primarily a conversational AI video platform and not a standalone STT service,
-    this implementation uses a fallback approach that can be extended with other STT services.
+
+    Live answers are transcribed while they are recorded (see
+    services.stt_service); this is for recordings that already exist.
     """
+    from services.stt_service import stt
     try:
         if not os.path.exists(audio_file_path):
             logging.error(f"Audio file not found: {audio_file_path}")
             return ""
 
-        # For now, return a placeholder that indicates the audio was received
-        # In a real implementation, you would integrate with a proper STT service
-        file_size = os.path.getsize(audio_file_path)
-        logging.info(
-            f"Audio file received: {audio_file_path} (size: {file_size} bytes)"
-        )
+        if not stt.enabled:
+            logging.error("No STT engine configured (STT_ENGINE)")
+            return ""
 
-        # This is a placeholder - in production you would call an actual STT service
-        # For demonstration purposes, we'll return a message indicating audio was processed
-        return "Audio received and ready for transcription. Please implement your preferred STT service."
+        with wave.open(audio_file_path, 'rb') as wav:
+            recognizer = stt.engine.open_stream(wav.getframerate())
+            while True:
+                frames = wav.readframes(4000)
+                if not frames:
+                    break
+                recognizer.accept(frames)
+        return recognizer.finish()
 
     except Exception as e:
         logging.error(f"Error in speech_to_text: {str(e)}")
@@ -0,0 +1,438 @@
+import fcntl
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, redirect, request, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import AssessmentSession, StoredFile, StoredFileRef
+from services.blob_store import CHUNK_SIZE, ReadThroughCache, get_blob_store
+from services.idempotency import purge_expired_records
+from services.speech_service import SHARED_AUDIO_PREFIX
+
+AUDIO = 'audio'
+CV = 'cv'
+REPORT = 'report'
+
+# Sessions updated within this window may still play their audio
+LIVE_SESSION_WINDOW = timedelta(hours=2)
+LIVE_STATUSES = ('started', 'in_progress')
+
+# last_accessed_at is only rewritten when older than this, so hot files do
+# not turn every read into a DB write
+ACCESS_TOUCH_INTERVAL = timedelta(minutes=10)
+
+
+def shard_path(name: str) -> str:
+    """
+    Relative hash-prefixed path for a file name, e.g. "3f/a2/<name>"
+    """
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    return os.path.join(digest[:2], digest[2:4], name)
+
+
+def blob_key(storage_class: str, name: str) -> str:
+    """
+    Blob store key for a stored file, e.g. "audio/3f/a2/<name>"
+    """
+    return f"{storage_class}/{shard_path(name)}"
+
+
+class StorageManager:
+    """
+    Lays out uploads and reports in shard directories of the blob store,
+    indexes them in StoredFile and runs a janitor enforcing per-class TTLs
+    and a byte quota
+    """
+
+    def __init__(self):
+        self.app = None
+        self._janitor_pid = None
+        self._janitor_guard = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('STORAGE_TTL_AUDIO', int(
+            os.environ.get('STORAGE_TTL_AUDIO', str(7 * 86400))))
+        app.config.setdefault('STORAGE_TTL_CV', int(
+            os.environ.get('STORAGE_TTL_CV', str(30 * 86400))))
+        app.config.setdefault('STORAGE_TTL_REPORT', int(
+            os.environ.get('STORAGE_TTL_REPORT', str(90 * 86400))))
+        app.config.setdefault('STORAGE_QUOTA_BYTES', int(
+            os.environ.get('STORAGE_QUOTA_BYTES', str(10 * 1024**3))))
+        app.config.setdefault('STORAGE_JANITOR_INTERVAL', float(
+            os.environ.get('STORAGE_JANITOR_INTERVAL', '60')))
+        app.config.setdefault('STORAGE_JANITOR_BATCH', int(
+            os.environ.get('STORAGE_JANITOR_BATCH', '200')))
+        app.config.setdefault('STORAGE_JANITOR_DELETES_PER_SECOND', float(
+            os.environ.get('STORAGE_JANITOR_DELETES_PER_SECOND', '50')))
+        app.config.setdefault('STORAGE_JANITOR_ENABLED',
+                              os.environ.get('STORAGE_JANITOR_ENABLED',
+                                             '1') == '1')
+
+        self.app = app
+        app.extensions['storage'] = self
+
+        @app.before_request
+        def _start_janitor():
+            if app.config['STORAGE_JANITOR_ENABLED']:
+                self.start_janitor()
+
+    # ---------- Layout ----------
+
+    def root_for(self, storage_class: str) -> str:
+        if storage_class == REPORT:
+            return os.path.abspath(self.app.config['REPORTS_FOLDER'])
+        return os.path.abspath(self.app.config['UPLOAD_FOLDER'])
+
+    # ---------- Index ----------
+
+    def register(self, storage_class: str, name: str, session_id: str = None,
+                 size_bytes: int = None,
+                 content_hash: str = None) -> StoredFile:
+        """
+        Record a file written to blob_key(storage_class, name) in the index
+
+        Pass the (size, SHA-256) returned by the blob store write; without
+        them the blob is read back to compute them.
+        """
+        if size_bytes is None or content_hash is None:
+            size_bytes, content_hash = self._digest(
+                blob_key(storage_class, name))
+        record = StoredFile.query.filter_by(storage_class=storage_class,
+                                            name=name).first()
+        if record is None:
+            record = StoredFile(storage_class=storage_class, name=name)
+            db.session.add(record)
+        record.path = shard_path(name)
+        record.size_bytes = size_bytes
+        record.content_hash = content_hash
+        record.session_id = session_id
+        record.last_accessed_at = datetime.utcnow()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Registered concurrently by another request for the same name
+            db.session.rollback()
+            record = StoredFile.query.filter_by(storage_class=storage_class,
+                                                name=name).first()
+        return record
+
+    def add_references(self, storage_class: str, names: list,
+                       session_id: str):
+        """
+        Record that a session uses shared files, so the janitor keeps them
+        while the session is live
+        """
+        if not session_id or not names:
+            return
+        ids = db.session.execute(
+            db.select(StoredFile.id).where(
+                StoredFile.storage_class == storage_class,
+                StoredFile.name.in_(names))).scalars().all()
+        known = set(db.session.execute(
+            db.select(StoredFileRef.stored_file_id).where(
+                StoredFileRef.session_id == session_id,
+                StoredFileRef.stored_file_id.in_(ids))).scalars())
+        for stored_file_id in ids:
+            if stored_file_id not in known:
+                db.session.add(StoredFileRef(stored_file_id=stored_file_id,
+                                             session_id=session_id))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Added concurrently by another request of the same session
+            db.session.rollback()
+
+    def _digest(self, key: str) -> tuple:
+        digest = hashlib.sha256()
+        size_bytes = 0
+        with get_blob_store().open_read(key) as stream:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size_bytes += len(chunk)
+        return size_bytes, digest.hexdigest()
+
+    def lookup(self, storage_class: str, name: str):
+        """
+        Indexed record of a stored file, or None
+        """
+        record = StoredFile.query.filter_by(storage_class=storage_class,
+                                            name=name).first()
+        if record is not None:
+            self._touch(record)
+        return record
+
+    def latest_for_session(self, storage_class: str, session_id: str):
+        """
+        Most recent indexed record of a class for a session, or None
+        """
+        return StoredFile.query.filter_by(
+            storage_class=storage_class, session_id=session_id).order_by(
+                StoredFile.created_at.desc()).first()
+
+    def send(self, storage_class: str, name: str, mimetype: str = None,
+             download_name: str = None, max_age: int = None,
+             immutable: bool = False, record: StoredFile = None):
+        """
+        Response serving a stored file from any node, or None if missing
+
+        Remote backends redirect to a presigned URL (BLOB_SERVE_MODE=redirect)
+        or serve from the local read-through cache, streaming a blob that is
+        not cached yet while it fills the cache. Responses carry a
+        content-hash ETag and answer conditional and Range requests; pass
+        immutable=True only for content-addressed names.
+        """
+        store = get_blob_store()
+        if record is None:
+            record = self.lookup(storage_class, name)
+        etag = True
+        if record is not None:
+            if record.content_hash:
+                etag = record.content_hash
+            key = f"{storage_class}/{record.path}"
+            if self.app.config['BLOB_SERVE_MODE'] == 'redirect':
+                url = store.url_for(key,
+                                    self.app.config['BLOB_URL_EXPIRY'],
+                                    download_name=download_name,
+                                    content_type=mimetype)
+                if url:
+                    return redirect(url)
+            path = store.cached_path(key)
+            if path is None:
+                return self._send_stream(key, record, mimetype,
+                                         download_name, max_age, immutable)
+        else:
+            # Files written before sharding live flat in the root directory
+            path = os.path.join(self.root_for(storage_class),
+                                os.path.basename(name))
+            if not os.path.isfile(path):
+                path = None
+
+        if path is None:
+            return None
+        response = send_file(path,
+                             mimetype=mimetype,
+                             as_attachment=download_name is not None,
+                             download_name=download_name,
+                             conditional=True,
+                             etag=etag,
+                             max_age=max_age)
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
+    def _send_stream(self, key: str, record: StoredFile, mimetype: str,
+                     download_name: str, max_age: int, immutable: bool):
+        try:
+            stream = get_blob_store().open_read(key)
+        except FileNotFoundError:
+            return None
+        if mimetype is None:
+            mimetype = (mimetypes.guess_type(download_name or record.name)[0]
+                        or 'application/octet-stream')
+        response = current_app.response_class(
+            wrap_file(request.environ, stream, CHUNK_SIZE),
+            mimetype=mimetype,
+            direct_passthrough=True)
+        response.content_length = record.size_bytes
+        if download_name is not None:
+            response.headers.set('Content-Disposition', 'attachment',
+                                 filename=download_name)
+        # Same caching headers as send_file
+        response.cache_control.no_cache = True
+        if max_age is not None:
+            if max_age > 0:
+                response.cache_control.no_cache = None
+                response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            response.expires = int(time.time() + max_age)
+        if immutable:
+            response.cache_control.immutable = True
+        if record.content_hash:
+            response.set_etag(record.content_hash)
+        try:
+            return response.make_conditional(
+                request.environ, accept_ranges=True,
+                complete_length=record.size_bytes)
+        except RequestedRangeNotSatisfiable:
+            stream.close()
+            raise
+
+    def _touch(self, record: StoredFile):
+        now = datetime.utcnow()
+        if record.last_accessed_at and now - record.last_accessed_at < ACCESS_TOUCH_INTERVAL:
+            return
+        record.last_accessed_at = now
+        db.session.commit()
+
+    # ---------- Janitor ----------
+
+    def start_janitor(self):
+        """
+        Start this process's janitor thread (once per forked worker)
+        """
+        if self._janitor_pid == os.getpid():
+            return
+        with self._janitor_guard:
+            if self._janitor_pid == os.getpid():
+                return
+            self._janitor_pid = os.getpid()
+        thread = threading.Thread(target=self._janitor_loop,
+                                  name="storage-janitor",
+                                  daemon=True)
+        thread.start()
+
+    def _janitor_loop(self):
+        interval = self.app.config['STORAGE_JANITOR_INTERVAL']
+        lock_path = os.path.join(self.app.instance_path, 'storage-janitor.lock')
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        with open(lock_path, 'w') as lock_file:
+            while True:
+                time.sleep(interval)
+                # Only one worker per host does the cleanup at a time
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                try:
+                    with self.app.app_context():
+                        self.run_janitor_cycle()
+                except Exception as e:
+                    logging.error(f"Error in storage janitor: {str(e)}")
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def run_janitor_cycle(self) -> int:
+        """
+        Delete one rate-limited batch of expired or over-quota files
+        """
+        purge_expired_records()
+        store = get_blob_store()
+        if isinstance(store, ReadThroughCache):
+            # Catches files added by the other workers of this host
+            store.trim()
+        from services.stt_service import stt
+        if stt.enabled:
+            stt.purge_abandoned()
+
+        # References of sessions that are over no longer protect anything
+        StoredFileRef.query.filter(
+            StoredFileRef.session_id.not_in(self._live_sessions())).delete(
+                synchronize_session=False)
+        db.session.commit()
+
+        batch = self.app.config['STORAGE_JANITOR_BATCH']
+        deleted = 0
+        # Shared audio expires once unused for the TTL, not from creation
+        age = db.case((self._shared_audio(), StoredFile.last_accessed_at),
+                      else_=StoredFile.created_at)
+        for storage_class in (AUDIO, CV, REPORT):
+            ttl = self.app.config[f'STORAGE_TTL_{storage_class.upper()}']
+            cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+            expired = self._evictable().filter(
+                StoredFile.storage_class == storage_class,
+                age < cutoff).limit(batch - deleted).all()
+            deleted += self._delete(expired)
+            if deleted >= batch:
+                return deleted
+
+        quota = self.app.config['STORAGE_QUOTA_BYTES']
+        total = db.session.query(func.coalesce(func.sum(
+            StoredFile.size_bytes), 0)).scalar()
+        if total > quota:
+            candidates = self._evictable().order_by(
+                StoredFile.last_accessed_at.asc()).limit(batch - deleted)
+            victims = []
+            for record in candidates:
+                if total <= quota:
+                    break
+                victims.append(record)
+                total -= record.size_bytes
+            deleted += self._delete(victims)
+        return deleted
+
+    @staticmethod
+    def _live_sessions():
+        return db.session.query(AssessmentSession.session_id).filter(
+            AssessmentSession.status.in_(LIVE_STATUSES),
+            AssessmentSession.updated_at >
+            datetime.utcnow() - LIVE_SESSION_WINDOW)
+
+    @staticmethod
+    def _shared_audio():
+        return db.and_(StoredFile.storage_class == AUDIO,
+                       StoredFile.name.startswith(SHARED_AUDIO_PREFIX,
+                                                  autoescape=True))
+
+    def _evictable(self):
+        # Audio of a session that is still being taken must stay playable,
+        # including shared audio any live session references
+        live_sessions = self._live_sessions()
+        referenced = db.session.query(StoredFileRef.stored_file_id).filter(
+            StoredFileRef.session_id.in_(live_sessions))
+        return StoredFile.query.filter(
+            db.or_(StoredFile.storage_class != AUDIO,
+                   db.and_(
+                       db.or_(StoredFile.session_id.is_(None),
+                              StoredFile.session_id.not_in(live_sessions)),
+                       StoredFile.id.not_in(referenced))))
+
+    def _delete(self, records) -> int:
+        pause = 1.0 / self.app.config['STORAGE_JANITOR_DELETES_PER_SECOND']
+        store = get_blob_store()
+        for record in records:
+            store.delete(f"{record.storage_class}/{record.path}")
+            StoredFileRef.query.filter_by(
+                stored_file_id=record.id).delete()
+            db.session.delete(record)
+            db.session.commit()
+            time.sleep(pause)
+        if records:
+            logging.info(f"Storage janitor deleted {len(records)} files")
+        return len(records)
+
+    # ---------- Legacy layout ----------
+
+    def import_legacy_files(self) -> int:
+        """
+        Move flat files from the local upload/report roots into the blob
+        store's shards and index them
+        """
+        store = get_blob_store()
+        imported = 0
+        for storage_class, root in ((AUDIO, self.app.config['UPLOAD_FOLDER']),
+                                    (REPORT,
+                                     self.app.config['REPORTS_FOLDER'])):
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    file_class = storage_class
+                    if storage_class == AUDIO and not entry.name.endswith(
+                            '.mp3'):
+                        file_class = CV
+                    session_id = None
+                    if file_class == REPORT and entry.name.startswith(
+                            'assessment_report_'):
+                        # assessment_report_<session uuid>_<timestamp>.pdf
+                        session_id = entry.name[len('assessment_report_'
+                                                    ):].rsplit('_', 2)[0]
+                    size_bytes, content_hash = store.put_file(
+                        blob_key(file_class, entry.name), entry.path)
+                    os.remove(entry.path)
+                    self.register(file_class, entry.name, session_id,
+                                  size_bytes, content_hash)
+                    imported += 1
+        return imported
+
+
+storage = StorageManager()
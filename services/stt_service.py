@@ -0,0 +1,396 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from datetime import datetime, timedelta
+
+from app import db
+from models import AudioFile
+from services.blob_store import get_blob_store
+from services.storage_service import storage, blob_key, AUDIO
+
+# Optional dependency: only needed for STT_ENGINE=vosk
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+# Audio frames are 16-bit little-endian mono PCM
+SAMPLE_WIDTH = 2
+
+
+class STTEngine:
+    """
+    Incremental speech-to-text engine; open_stream() returns a recognizer
+    that is fed PCM frames as the candidate speaks
+    """
+    name = 'none'
+
+    def open_stream(self, sample_rate: int):
+        raise NotImplementedError
+
+
+class StubRecognizer:
+
+    def __init__(self, text: str, sample_rate: int):
+        self.words = text.split()
+        self.bytes_per_word = int(sample_rate * SAMPLE_WIDTH * 0.5)
+        self.received = 0
+
+    def accept(self, pcm: bytes) -> str:
+        self.received += len(pcm)
+        return ' '.join(self.words[:self.received // self.bytes_per_word])
+
+    def finish(self) -> str:
+        return ' '.join(self.words)
+
+
+class StubEngine(STTEngine):
+    """
+    Deterministic engine for tests: reveals one word of STT_STUB_TRANSCRIPT
+    per half second of audio received
+    """
+    name = 'stub'
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def open_stream(self, sample_rate: int):
+        return StubRecognizer(self.text, sample_rate)
+
+
+class VoskRecognizer:
+
+    def __init__(self, model, sample_rate: int):
+        self.recognizer = vosk.KaldiRecognizer(model, sample_rate)
+        self.segments = []
+
+    def accept(self, pcm: bytes) -> str:
+        if self.recognizer.AcceptWaveform(pcm):
+            self._add(json.loads(self.recognizer.Result()).get('text', ''))
+            partial = ''
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get(
+                'partial', '')
+        return ' '.join(self.segments + [partial]).strip()
+
+    def finish(self) -> str:
+        self._add(json.loads(self.recognizer.FinalResult()).get('text', ''))
+        return ' '.join(self.segments)
+
+    def _add(self, text: str):
+        if text:
+            self.segments.append(text)
+
+
+class VoskEngine(STTEngine):
+    """
+    Offline engine backed by a local Vosk model directory (STT_VOSK_MODEL)
+    """
+    name = 'vosk'
+
+    def __init__(self, model_path: str):
+        if vosk is None:
+            raise RuntimeError("STT_ENGINE=vosk requires the vosk package")
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path)
+
+    def open_stream(self, sample_rate: int):
+        return VoskRecognizer(self.model, sample_rate)
+
+
+def create_engine(name: str, config) -> STTEngine:
+    if name == 'vosk':
+        return VoskEngine(config['STT_VOSK_MODEL'])
+    if name == 'stub':
+        return StubEngine(config['STT_STUB_TRANSCRIPT'])
+    if name == 'none':
+        return None
+    raise ValueError(f"Unknown STT_ENGINE: {name}")
+
+
+def segment_key(stream_id: int, index: int) -> str:
+    return f"{AUDIO}/stt/{stream_id}/{index:05d}.pcm"
+
+
+class StreamError(Exception):
+    """
+    Raised for requests that do not match a usable stream; resend_from is
+    the first chunk the client must send again, if any
+    """
+
+    def __init__(self, message: str, status_code: int = 400,
+                 resend_from: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.resend_from = resend_from
+
+
+class _Stream:
+    """Recognizer state of one recording in this worker"""
+
+    def __init__(self, record_id: int, session_id: str, recognizer):
+        self.record_id = record_id
+        self.session_id = session_id
+        self.recognizer = recognizer
+        self.next_seq = 0
+        self.partial = ''
+        self.pcm = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+        # Offset in pcm where each segment starts, for segments reached
+        self.boundaries = [0]
+        # Chunks known to be in the blob store
+        self.persisted = 0
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class TranscriptionStreams:
+    """
+    Streaming transcription of recorded answers
+
+    The client opens a stream, posts numbered PCM chunks while the candidate
+    speaks and finishes the stream when recording stops. Each chunk is fed
+    to the engine as it arrives, so finishing only flushes the last words.
+    Every STT_SEGMENT_CHUNKS chunks are written to the blob store as one
+    segment. A worker that receives a stream it has not seen (or missed
+    chunks of) replays the segments first, and answers 409 with
+    resend_from for chunks not yet in a segment; the client keeps chunks
+    until a response reports them persisted. The finished recording is
+    stored as a WAV and its AudioFile row gets the transcript; AudioFile
+    rows without a transcript are streams in progress.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.engine = None
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('STT_ENGINE',
+                              os.environ.get('STT_ENGINE', 'none'))
+        app.config.setdefault('STT_VOSK_MODEL',
+                              os.environ.get('STT_VOSK_MODEL', 'models/vosk'))
+        app.config.setdefault('STT_STUB_TRANSCRIPT',
+                              os.environ.get('STT_STUB_TRANSCRIPT', ''))
+        app.config.setdefault('STT_SAMPLE_RATE',
+                              int(os.environ.get('STT_SAMPLE_RATE', '16000')))
+        app.config.setdefault('STT_MAX_SECONDS',
+                              int(os.environ.get('STT_MAX_SECONDS', '600')))
+        app.config.setdefault('STT_STREAM_TTL',
+                              int(os.environ.get('STT_STREAM_TTL', '900')))
+        app.config.setdefault('STT_PREFER_SERVER',
+                              os.environ.get('STT_PREFER_SERVER', '0') == '1')
+        # Chunks per blob store write (and most a client keeps unsent)
+        app.config.setdefault('STT_SEGMENT_CHUNKS', int(
+            os.environ.get('STT_SEGMENT_CHUNKS', '10')))
+
+        self.app = app
+        self.engine = create_engine(app.config['STT_ENGINE'], app.config)
+        app.extensions['stt'] = self
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine is not None
+
+    # ---------- Streams ----------
+
+    def open(self, session_id: str) -> AudioFile:
+        """
+        Start a recording for a session and return its AudioFile row
+        """
+        filename = f"answer_{uuid.uuid4().hex}.wav"
+        record = AudioFile(session_id=session_id,
+                           filename=filename,
+                           file_path=blob_key(AUDIO, filename))
+        db.session.add(record)
+        db.session.commit()
+        self._reap_idle()
+        self._get(record.id, session_id)
+        return record
+
+    def feed(self, stream_id: int, session_id: str, seq: int,
+             pcm: bytes) -> tuple:
+        """
+        Feed chunk number seq; returns the transcript so far and the number
+        of chunks persisted, which the client no longer needs to keep
+        """
+        stream = self._get(stream_id, session_id)
+        with stream.lock:
+            if seq >= stream.next_seq:
+                self._catch_up(stream, seq)
+            if seq < stream.next_seq:
+                # Client retry of a chunk we already have
+                return stream.partial, stream.persisted
+            max_bytes = (self.app.config['STT_MAX_SECONDS'] *
+                         self.app.config['STT_SAMPLE_RATE'] * SAMPLE_WIDTH)
+            if stream.pcm.tell() + len(pcm) > max_bytes:
+                raise StreamError('Recording too long', 413)
+            self._accept(stream, pcm)
+            self._persist(stream)
+            return stream.partial, stream.persisted
+
+    def finish(self, stream_id: int, session_id: str,
+               chunk_count: int) -> AudioFile:
+        """
+        Flush the recognizer, store the recording and save the transcript
+
+        Finishing a stream already finished (a retry, possibly handled by
+        another worker) returns its record.
+        """
+        record = db.session.get(AudioFile, stream_id)
+        if (record is not None and record.transcription is not None and
+                record.session_id == session_id):
+            self._drop(stream_id)
+            return record
+        stream = self._get(stream_id, session_id)
+        with stream.lock:
+            self._catch_up(stream, chunk_count)
+            try:
+                transcript = stream.recognizer.finish()
+
+                stream.pcm.seek(0)
+                buffer = io.BytesIO()
+                with wave.open(buffer, 'wb') as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(SAMPLE_WIDTH)
+                    wav.setframerate(self.app.config['STT_SAMPLE_RATE'])
+                    wav.writeframes(stream.pcm.read())
+
+                record = db.session.get(AudioFile, stream_id)
+                size_bytes, content_hash = get_blob_store().put_bytes(
+                    record.file_path, buffer.getvalue(),
+                    content_type='audio/wav')
+                storage.register(AUDIO, record.filename, session_id,
+                                 size_bytes, content_hash)
+                record.transcription = transcript
+                db.session.commit()
+            except Exception:
+                # The recognizer is spent: a retry rebuilds the stream from
+                # the stored segments and the chunks the client still has
+                db.session.rollback()
+                self._drop(stream_id)
+                raise
+
+            self._drop(stream_id)
+            self._delete_chunks(stream_id)
+            logging.info(f"Transcribed stream {stream_id}: "
+                         f"{len(transcript)} characters")
+            return record
+
+    def purge_abandoned(self) -> int:
+        """
+        Delete streams never finished within STT_STREAM_TTL and their chunks
+        """
+        cutoff = datetime.utcnow() - timedelta(
+            seconds=self.app.config['STT_STREAM_TTL'])
+        abandoned = AudioFile.query.filter(
+            AudioFile.transcription.is_(None),
+            AudioFile.created_at < cutoff).all()
+        for record in abandoned:
+            self._delete_chunks(record.id)
+            db.session.delete(record)
+        db.session.commit()
+        if abandoned:
+            logging.info(f"Purged {len(abandoned)} abandoned STT streams")
+        return len(abandoned)
+
+    # ---------- Internals ----------
+
+    def _get(self, stream_id: int, session_id: str) -> _Stream:
+        with self._lock:
+            stream = self._streams.get(stream_id)
+        if stream is None:
+            record = db.session.get(AudioFile, stream_id)
+            if record is None or record.transcription is not None:
+                raise StreamError('Stream not found', 404)
+            stream = _Stream(
+                stream_id, record.session_id,
+                self.engine.open_stream(self.app.config['STT_SAMPLE_RATE']))
+            with self._lock:
+                stream = self._streams.setdefault(stream_id, stream)
+        elif not self._in_progress(stream_id):
+            # Finished (or purged) by another worker since we last saw it
+            self._drop(stream_id)
+            raise StreamError('Stream not found', 404)
+        if stream.session_id != session_id:
+            raise StreamError('Stream not found', 404)
+        stream.last_used = time.monotonic()
+        return stream
+
+    @staticmethod
+    def _in_progress(stream_id: int) -> bool:
+        return db.session.execute(
+            db.select(AudioFile.id).where(
+                AudioFile.id == stream_id,
+                AudioFile.transcription.is_(None))).first() is not None
+
+    def _drop(self, stream_id: int):
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is not None:
+            stream.pcm.close()
+
+    def _catch_up(self, stream: _Stream, seq: int):
+        # Segments another worker stored since this one last saw the stream
+        size = self.app.config['STT_SEGMENT_CHUNKS']
+        store = get_blob_store()
+        while stream.next_seq < seq:
+            index = stream.next_seq // size
+            try:
+                with store.open_read(segment_key(stream.record_id,
+                                                 index)) as f:
+                    segment = f.read()
+            except FileNotFoundError:
+                raise StreamError(f'Missing chunk {stream.next_seq}', 409,
+                                  resend_from=stream.next_seq)
+            # Part of the segment may already have been received here
+            received = stream.pcm.tell() - stream.boundaries[index]
+            self._accept(stream, segment[received:],
+                         (index + 1) * size - stream.next_seq)
+            stream.persisted = stream.next_seq
+
+    def _accept(self, stream: _Stream, pcm: bytes, chunks: int = 1):
+        stream.partial = stream.recognizer.accept(pcm)
+        stream.pcm.write(pcm)
+        stream.next_seq += chunks
+        if stream.next_seq % self.app.config['STT_SEGMENT_CHUNKS'] == 0:
+            stream.boundaries.append(stream.pcm.tell())
+
+    def _persist(self, stream: _Stream):
+        # Store a segment once all of its chunks are here
+        size = self.app.config['STT_SEGMENT_CHUNKS']
+        if stream.next_seq % size or stream.persisted == stream.next_seq:
+            return
+        index = stream.next_seq // size - 1
+        start, end = stream.boundaries[index], stream.boundaries[index + 1]
+        stream.pcm.seek(start)
+        segment = stream.pcm.read(end - start)
+        stream.pcm.seek(0, io.SEEK_END)
+        get_blob_store().put_bytes(segment_key(stream.record_id, index),
+                                   segment)
+        stream.persisted = stream.next_seq
+
+    def _delete_chunks(self, stream_id: int):
+        store = get_blob_store()
+        index = 0
+        while store.exists(segment_key(stream_id, index)):
+            store.delete(segment_key(stream_id, index))
+            index += 1
+
+    def _reap_idle(self):
+        ttl = self.app.config['STT_STREAM_TTL']
+        now = time.monotonic()
+        with self._lock:
+            idle = [stream_id for stream_id, stream in self._streams.items()
+                    if now - stream.last_used > ttl]
+            for stream_id in idle:
+                self._streams.pop(stream_id).pcm.close()
+
+
+stt = TranscriptionStreams()
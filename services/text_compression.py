@@ -0,0 +1,203 @@
+import base64
+import logging
+import os
+import time
+import zlib
+
+from sqlalchemy import Text, literal, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # optional: zlib is always available
+    zstandard = None
+
+# Transparent compression of large Text columns (CVs, analyses, transcripts).
+#
+# A compressed value is stored as MARKER + codec letter + base64 of the
+# compressed bytes, so the column stays TEXT on every database and rows
+# written before compression are read back unchanged: only values starting
+# with MARKER are decoded. MARKER is a private-use character that extracted
+# text does not start with; a plain value that does is stored escaped
+# (MARKER + 'p' + value). Values shorter than the threshold, or that do not
+# shrink, are stored as they are.
+#
+# Readers must be deployed before writers compress: TEXT_COMPRESSION=off
+# reads compressed rows but writes plain text. `flask db-compress-text`
+# rewrites existing rows in the background.
+
+MARKER = '\ue000'
+PLAIN = 'p'
+ZLIB = 'z'
+ZSTD = 's'
+
+CODECS = {'zlib': ZLIB, 'zstd': ZSTD, 'off': None}
+
+# Columns using CompressedText, rewritten by compress_existing_rows
+COMPRESSED_COLUMNS = {
+    'AssessmentSession': ('cv_content', 'cv_analysis', 'questions_answers'),
+    'AudioFile': ('transcription',),
+}
+
+
+def _zstd_required():
+    if zstandard is None:
+        raise RuntimeError("zstd-compressed text requires the zstandard "
+                           "package")
+
+
+class TextCompression:
+    """
+    Codec settings shared by every CompressedText column
+    """
+
+    def __init__(self):
+        self.codec = ZLIB
+        self.min_chars = 1024
+        self.level = 6
+        # Counters, for benchmarks and logs
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def init_app(self, app):
+        # zlib, zstd or off (still reads compressed values)
+        app.config.setdefault('TEXT_COMPRESSION',
+                              os.environ.get('TEXT_COMPRESSION', 'zlib'))
+        app.config.setdefault('TEXT_COMPRESSION_MIN_CHARS', int(
+            os.environ.get('TEXT_COMPRESSION_MIN_CHARS', '1024')))
+        app.config.setdefault('TEXT_COMPRESSION_LEVEL', int(
+            os.environ.get('TEXT_COMPRESSION_LEVEL', '6')))
+
+        name = app.config['TEXT_COMPRESSION']
+        if name not in CODECS:
+            raise ValueError(f"TEXT_COMPRESSION must be one of "
+                             f"{', '.join(CODECS)}, not {name!r}")
+        if name == 'zstd':
+            _zstd_required()
+        self.codec = CODECS[name]
+        self.min_chars = app.config['TEXT_COMPRESSION_MIN_CHARS']
+        self.level = app.config['TEXT_COMPRESSION_LEVEL']
+        app.extensions['text_compression'] = self
+
+    def encode(self, value: str) -> str:
+        if value is None:
+            return None
+        if self.codec is None or len(value) < self.min_chars:
+            return self._plain(value)
+        raw = value.encode('utf-8')
+        if self.codec == ZSTD:
+            packed = zstandard.ZstdCompressor(level=self.level).compress(raw)
+        else:
+            packed = zlib.compress(raw, self.level)
+        encoded = MARKER + self.codec + base64.b64encode(packed).decode(
+            'ascii')
+        if len(encoded) >= len(value):
+            return self._plain(value)
+        self.compressed += 1
+        self.bytes_in += len(raw)
+        self.bytes_out += len(encoded)
+        return encoded
+
+    @staticmethod
+    def _plain(value: str) -> str:
+        return MARKER + PLAIN + value if value.startswith(MARKER) else value
+
+    def decode(self, value: str) -> str:
+        if value is None or not value.startswith(MARKER):
+            return value
+        codec, payload = value[1:2], value[2:]
+        if codec == PLAIN:
+            return payload
+        packed = base64.b64decode(payload)
+        if codec == ZLIB:
+            return zlib.decompress(packed).decode('utf-8')
+        if codec == ZSTD:
+            _zstd_required()
+            return zstandard.ZstdDecompressor().decompress(packed).decode(
+                'utf-8')
+        raise ValueError(f"Unknown text compression codec {codec!r}")
+
+
+text_compression = TextCompression()
+
+
+def is_encoded(value: str) -> bool:
+    """
+    True if a stored value is in the compressed (or escaped) format
+    """
+    return value is not None and value.startswith(MARKER)
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column whose large values are stored compressed (see above)
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return text_compression.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return text_compression.decode(value)
+
+
+def compress_existing_rows(batch_size: int = 200, pause: float = 0.0,
+                           progress=None) -> dict:
+    """
+    Rewrite stored values of COMPRESSED_COLUMNS that are at least
+    min_chars long and not yet encoded; returns rows rewritten per column
+
+    Online: each batch is its own short transaction, and a row is only
+    replaced if it still holds the value that was read (a concurrent write
+    wins and is compressed by its writer). The logical value does not
+    change, so neither the version nor updated_at of a row is bumped.
+    """
+    import models
+    from app import db
+
+    if text_compression.codec is None:
+        raise RuntimeError("TEXT_COMPRESSION is off")
+    stats = {}
+    for model_name, columns in COMPRESSED_COLUMNS.items():
+        table = getattr(models, model_name).__table__
+        for name in columns:
+            column = table.c[name]
+            # The stored text, bypassing CompressedText
+            raw = type_coerce(column, Text)
+            key = f"{table.name}.{name}"
+            stats[key] = 0
+            after_id = 0
+            while True:
+                rows = db.session.execute(
+                    db.select(table.c.id, raw.label('value')).where(
+                        table.c.id > after_id,
+                        db.func.length(raw) >= text_compression.min_chars,
+                        db.func.substr(raw, 1, 1) != MARKER).order_by(
+                            table.c.id).limit(batch_size)).all()
+                if not rows:
+                    break
+                after_id = rows[-1].id
+                values = {}
+                if 'updated_at' in table.c:
+                    values['updated_at'] = table.c.updated_at
+                for row in rows:
+                    encoded = text_compression.encode(row.value)
+                    if not is_encoded(encoded):
+                        continue  # does not compress: left as it is
+                    # Already encoded: bound as plain Text
+                    values[name] = literal(encoded, Text)
+                    result = db.session.execute(
+                        table.update().where(
+                            table.c.id == row.id,
+                            raw == row.value).values(**values))
+                    stats[key] += result.rowcount
+                db.session.commit()
+                if progress:
+                    progress(key, after_id, stats[key])
+                if pause:
+                    time.sleep(pause)
+            logging.info(f"Compressed {stats[key]} values of {key}")
+    return stats
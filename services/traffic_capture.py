@@ -0,0 +1,415 @@
+import asyncio
+import atexit
+import contextvars
+import gzip
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from types import SimpleNamespace
+
+from flask import g, request, session
+
+from services.admission import ARRIVAL_ENVIRON_KEY
+from services.idempotency import IDEMPOTENCY_HEADER
+from services.interview_digest import STRATEGIC_AREAS
+
+# Opt-in capture of production traffic for offline load tests
+# (TRAFFIC_CAPTURE=1), replayed by services/traffic_replay.py.
+#
+# Every /api request (and CV upload) becomes one line of gzipped NDJSON
+# with its arrival time, duration, status, sizes and an anonymized payload;
+# every Gemini and ElevenLabs call becomes a line with its latency, size
+# and an anonymized response, tied to the request that made it. Texts keep
+# their length and word boundaries but every other character becomes 'x';
+# session IDs and idempotency keys are replaced by keyed hashes, so retries
+# and the requests of one session stay recognizable.
+#
+# With TRAFFIC_REPLAY_FIXTURES pointing at a capture directory the app
+# makes no upstream calls: each one is answered from the fixture recorded
+# for the same request (X-Replay-Request header, sent by the replayer)
+# after the recorded latency.
+
+# Endpoints captured besides the api blueprint
+EXTRA_ENDPOINTS = {'main.upload_cv'}
+
+REPLAY_HEADER = 'X-Replay-Request'
+
+# Recorded strings kept as they are: schema values, not candidate data
+KEPT_VALUES = set(STRATEGIC_AREAS)
+
+# Records between flushes of the gzip stream
+FLUSH_EVERY = 100
+
+_NON_SPACE = re.compile(r'\S')
+
+# ID of the request being handled; upstream calls inherit it through
+# services.async_runtime
+current_request = contextvars.ContextVar('traffic_request', default=None)
+
+
+def mask_text(text: str) -> str:
+    """
+    Same length and word boundaries, no content
+    """
+    return _NON_SPACE.sub('x', text)
+
+
+def mask(value):
+    """
+    JSON value with every string masked, except KEPT_VALUES
+    """
+    if isinstance(value, str):
+        return value if value in KEPT_VALUES else mask_text(value)
+    if isinstance(value, list):
+        return [mask(item) for item in value]
+    if isinstance(value, dict):
+        return {key: mask(item) for key, item in value.items()}
+    return value
+
+
+def mask_body(text: str):
+    """
+    Masked JSON value of a text if it is JSON, else the masked text
+    """
+    try:
+        return {'json': mask(json.loads(text))}
+    except ValueError:
+        return {'text': mask_text(text)}
+
+
+def _describe_gemini(response) -> dict:
+    text = response.text or ''
+    record = {'bytes': len(text.encode('utf-8')), **mask_body(text)}
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        record['usage'] = {'prompt': usage.prompt_token_count,
+                           'output': usage.candidates_token_count}
+    return record
+
+
+def _describe_elevenlabs(response) -> dict:
+    return {'status': response.status_code, 'bytes': len(response.content)}
+
+
+def _gemini_fixture(record: dict):
+    if 'json' in record:
+        text = json.dumps(record['json'], ensure_ascii=False)
+    else:
+        text = record.get('text', '')
+    usage = record.get('usage')
+    if usage is not None:
+        usage = SimpleNamespace(prompt_token_count=usage['prompt'],
+                                candidates_token_count=usage['output'])
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def _elevenlabs_fixture(record: dict):
+    return SimpleNamespace(status_code=record.get('status', 200),
+                           content=bytes(record.get('bytes', 0)), text='')
+
+
+# service -> (recorded fields of a response, response built from them)
+SERVICES = {
+    'gemini': (_describe_gemini, _gemini_fixture),
+    'elevenlabs': (_describe_elevenlabs, _elevenlabs_fixture),
+}
+
+
+def read_capture(directory: str):
+    """
+    Yield the records of every capture file in a directory
+    """
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.ndjson.gz'):
+            continue
+        try:
+            with gzip.open(os.path.join(directory, name), 'rt',
+                           encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile):
+            # Written by a worker that is still running or was killed
+            logging.warning(f"Capture file {name} is truncated")
+
+
+class _Writer:
+    """
+    Gzipped NDJSON files of one process, rotated by size
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._file = None
+        self._written = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False,
+                          separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None or self._written >= self.max_bytes:
+                self._open()
+            self._file.write(line.encode('utf-8'))
+            self._written += len(line)
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+
+    def _open(self):
+        self._close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = (f"capture-{time.strftime('%Y%m%d-%H%M%S')}-"
+                f"{os.getpid()}.ndjson.gz")
+        self._file = gzip.open(os.path.join(self.directory, name), 'ab')
+        self._written = 0
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+class TrafficCapture:
+    """
+    Request and upstream call recorder, and upstream replay from fixtures
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.sample = 1.0
+        self.writer = None
+        self.fixtures = None
+        self._key = b''
+        self._ids = itertools.count(1)
+        self._id_prefix = None
+        self._id_pid = None
+        self._served = {}
+        self._served_lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('TRAFFIC_CAPTURE',
+                              os.environ.get('TRAFFIC_CAPTURE', '0') == '1')
+        app.config.setdefault('TRAFFIC_CAPTURE_DIR', os.environ.get(
+            'TRAFFIC_CAPTURE_DIR', os.path.join('instance', 'capture')))
+        # Share of sessions captured (all requests of a sampled session)
+        app.config.setdefault('TRAFFIC_CAPTURE_SAMPLE', float(
+            os.environ.get('TRAFFIC_CAPTURE_SAMPLE', '1')))
+        # Uncompressed size at which a capture file is rotated
+        app.config.setdefault('TRAFFIC_CAPTURE_MAX_MB', int(
+            os.environ.get('TRAFFIC_CAPTURE_MAX_MB', '64')))
+        app.config.setdefault('TRAFFIC_REPLAY_FIXTURES',
+                              os.environ.get('TRAFFIC_REPLAY_FIXTURES'))
+
+        self.app = app
+        self.enabled = app.config['TRAFFIC_CAPTURE']
+        self.sample = app.config['TRAFFIC_CAPTURE_SAMPLE']
+        # Same pseudonyms in every worker, not reversible without the secret
+        self._key = hmac.new(str(app.secret_key).encode('utf-8'),
+                             b'traffic-capture', hashlib.sha256).digest()
+        if app.config['TRAFFIC_REPLAY_FIXTURES']:
+            self._load_fixtures(app.config['TRAFFIC_REPLAY_FIXTURES'])
+        if self.enabled:
+            self.writer = _Writer(app.config['TRAFFIC_CAPTURE_DIR'],
+                                  app.config['TRAFFIC_CAPTURE_MAX_MB'] << 20)
+            atexit.register(self.writer.close)
+        if self.enabled or self.fixtures is not None:
+            app.before_request(self._start)
+            app.after_request(self._finish)
+            app.teardown_request(self._write)
+        app.extensions['traffic_capture'] = self
+
+    def pseudonym(self, value: str) -> str:
+        return hmac.new(self._key, value.encode('utf-8'),
+                        hashlib.sha256).hexdigest()[:16]
+
+    def _captured(self, endpoint: str) -> bool:
+        return endpoint is not None and (endpoint.startswith('api.') or
+                                         endpoint in EXTRA_ENDPOINTS)
+
+    # ---------- Requests ----------
+
+    def _start(self):
+        if not self._captured(request.endpoint):
+            return None
+        if self.fixtures is not None:
+            request_id = request.headers.get(REPLAY_HEADER)
+        else:
+            request_id = self._request_id()
+        g.traffic_token = current_request.set(request_id)
+        g.traffic = {
+            'kind': 'request',
+            'id': request_id,
+            't': request.environ.get(ARRIVAL_ENVIRON_KEY, time.time()),
+            'started': time.perf_counter(),
+            'method': request.method,
+            'endpoint': request.endpoint,
+            'rule': request.url_rule.rule,
+            # Integer path arguments only (stream IDs, chunk numbers)
+            'args': {name: value
+                     for name, value in (request.view_args or {}).items()
+                     if isinstance(value, int)},
+            'req_bytes': request.content_length or 0,
+            'payload': self._payload(),
+        }
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key:
+            g.traffic['idem'] = self.pseudonym(key)
+        return None
+
+    def _request_id(self) -> str:
+        # Random per process, so IDs from every host and restart can share
+        # a capture directory; pids are only unique on one host at a time
+        if self._id_pid != os.getpid():
+            self._id_prefix = secrets.token_hex(4)
+            self._id_pid = os.getpid()
+        return f"{self._id_prefix}-{next(self._ids)}"
+
+    def _payload(self):
+        if request.is_json:
+            data = request.get_json(silent=True)
+            return {'json': mask(data)} if data is not None else None
+        if request.files or request.form:
+            return {
+                'form': {name: mask_text(value)
+                         for name, value in request.form.items()},
+                'files': {name: {'ext': os.path.splitext(f.filename or '')[1],
+                                 'bytes': _file_size(f)}
+                          for name, f in request.files.items()},
+            }
+        return None
+
+    def _finish(self, response):
+        record = g.get('traffic')
+        if record is not None:
+            record['status'] = response.status_code
+            record['resp_bytes'] = response.content_length
+            # After the view: an upload has just created the session
+            session_id = session.get('assessment_session_id')
+            if session_id:
+                record['session'] = self.pseudonym(session_id)
+            if response.is_json:
+                data = response.get_json(silent=True) or {}
+                # Values the replayer substitutes into later requests
+                record['returned'] = {
+                    name: data[name] for name in ('stream_id', 'audio_url')
+                    if name in data}
+        return response
+
+    def _write(self, exc=None):
+        record = g.pop('traffic', None)
+        token = g.pop('traffic_token', None)
+        if token is not None:
+            current_request.reset(token)
+        if record is None or self.writer is None:
+            return
+        record['ms'] = round(
+            (time.perf_counter() - record.pop('started')) * 1000, 1)
+        record.setdefault('status', 500)
+        if not self._sampled(record.get('session')):
+            return
+        if 'returned' in record and 'audio_url' in record['returned']:
+            # Content-addressed from the question text: keep the shape only
+            record['returned']['audio_url'] = True
+        self.writer.write(record)
+
+    def _sampled(self, pseudonym: str) -> bool:
+        if self.sample >= 1 or pseudonym is None:
+            return True
+        return int(pseudonym[:8], 16) / 0xFFFFFFFF < self.sample
+
+    # ---------- Upstream calls ----------
+
+    async def upstream(self, service: str, operation: str, call):
+        """
+        Await call() (an upstream request), recording it when capturing;
+        when replaying, answer from the fixtures instead
+        """
+        if self.fixtures is not None:
+            return await self._replay(service, operation)
+        if self.writer is None:
+            return await call()
+
+        record = {'kind': 'upstream', 'request': current_request.get(),
+                  'service': service, 'op': operation, 't': time.time()}
+        started = time.perf_counter()
+        try:
+            response = await call()
+        except Exception as e:
+            record['error'] = type(e).__name__
+            raise
+        else:
+            try:
+                record.update(SERVICES[service][0](response))
+            except Exception as e:
+                logging.warning(f"Could not record {service} response: "
+                                f"{str(e)}")
+        finally:
+            record['ms'] = round((time.perf_counter() - started) * 1000, 1)
+            self.writer.write(record)
+        return response
+
+    def _load_fixtures(self, directory: str):
+        self.fixtures = {}
+        by_operation = {}
+        count = 0
+        for record in read_capture(directory):
+            if record.get('kind') != 'upstream':
+                continue
+            key = (record['service'], record['op'])
+            self.fixtures.setdefault(
+                (record.get('request'),) + key, []).append(record)
+            by_operation.setdefault(key, []).append(record)
+            count += 1
+        # Calls that match no recorded request: cycle through the
+        # operation's fixtures
+        self._fallback = {key: itertools.cycle(records)
+                          for key, records in by_operation.items()}
+        logging.info(f"Loaded {count} upstream fixtures from {directory}")
+
+    def _fixture(self, service: str, operation: str) -> dict:
+        key = (current_request.get(), service, operation)
+        with self._served_lock:
+            records = self.fixtures.get(key)
+            index = self._served.get(key, 0)
+            if records and index < len(records):
+                self._served[key] = index + 1
+                return records[index]
+            fallback = self._fallback.get((service, operation))
+            return next(fallback) if fallback else None
+
+    async def _replay(self, service: str, operation: str):
+        record = self._fixture(service, operation)
+        if record is None:
+            raise RuntimeError(f"No recorded {service} {operation} call")
+        await asyncio.sleep(record['ms'] / 1000)
+        if 'error' in record:
+            raise RuntimeError(f"Recorded {service} error: {record['error']}")
+        return SERVICES[service][1](record)
+
+
+def _file_size(storage) -> int:
+    stream = storage.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+traffic = TrafficCapture()
@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from services.idempotency import IDEMPOTENCY_HEADER
+from services.traffic_capture import REPLAY_HEADER, read_capture
+
+# Replays a capture (services/traffic_capture.py) against a local instance
+# started with TRAFFIC_REPLAY_FIXTURES, so its Gemini and ElevenLabs calls
+# are answered from the same capture with the recorded latencies.
+#
+# Requests are sent at their recorded arrival offsets (divided by `speed`).
+# The requests of one recorded session go through one cookie jar, in order,
+# a request waiting for the previous one of its session as a browser does;
+# stream IDs and audio file names returned by the instance replace the
+# recorded ones in later paths. Payloads are the recorded masked ones, so
+# texts keep their length, and files their size and extension. Retries keep
+# sharing one Idempotency-Key.
+
+# Not replayed: HeyGen calls are not captured, and admin endpoints
+REPLAY_SKIP = ('api.avatar_session', 'api.avatar_task', 'api.avatar_stop',
+               'api.export_sessions', 'api.debug_session')
+
+_PATH_ARG = re.compile(r'<(?:[^:<>]+:)?([^<>]+)>')
+
+
+def load_requests(directory: str) -> list:
+    """
+    Recorded requests of a capture directory, in arrival order
+    """
+    records = [record for record in read_capture(directory)
+               if record.get('kind') == 'request']
+    records.sort(key=lambda record: (record['t'], record['id']))
+    return records
+
+
+class _Client:
+    """
+    One recorded session: its cookie jar and the values it was given
+    """
+
+    def __init__(self, target: str, transport):
+        self.http = httpx.Client(base_url=target, timeout=120.0,
+                                 follow_redirects=False, transport=transport)
+        self.values = {}
+
+    def path(self, record: dict) -> str:
+        """
+        The request path, or None if a path argument is unknown
+        """
+        def argument(match):
+            name = match.group(1)
+            if name in self.values:
+                return str(self.values[name])
+            if name in record['args']:
+                return str(record['args'][name])
+            raise KeyError(name)
+
+        try:
+            return _PATH_ARG.sub(argument, record['rule'])
+        except KeyError:
+            return None
+
+    def remember(self, response):
+        try:
+            data = response.json()
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        if 'stream_id' in data:
+            self.values['stream_id'] = data['stream_id']
+        if 'audio_url' in data:
+            self.values['filename'] = data['audio_url'].rsplit('/', 1)[-1]
+
+
+def _request_arguments(record: dict) -> dict:
+    arguments = {'headers': {REPLAY_HEADER: record['id']}}
+    if record.get('idem'):
+        arguments['headers'][IDEMPOTENCY_HEADER] = str(
+            uuid.uuid5(uuid.NAMESPACE_OID, record['idem']))
+    payload = record.get('payload') or {}
+    if 'json' in payload:
+        arguments['json'] = payload['json']
+    elif 'files' in payload or 'form' in payload:
+        arguments['data'] = payload.get('form', {})
+        arguments['files'] = {
+            name: (f"file{f['ext']}", bytes(f['bytes']))
+            for name, f in payload.get('files', {}).items()}
+    elif record.get('req_bytes'):
+        arguments['content'] = bytes(record['req_bytes'])
+    return arguments
+
+
+def replay(directory: str, target: str, speed: float = 1.0,
+           workers: int = 256, skip=REPLAY_SKIP, progress=None) -> list:
+    """
+    Replay the capture in `directory` against `target`; returns one result
+    per replayed request, in arrival order
+
+    A result holds the endpoint, the recorded and replayed status and
+    duration (ms) and how late the request was sent (lag_ms).
+    """
+    records = [record for record in load_requests(directory)
+               if record['endpoint'] not in skip]
+    if not records:
+        return []
+    sessions = {}
+    for record in records:
+        # Requests without a session stand alone
+        sessions.setdefault(record.get('session') or record['id'],
+                            []).append(record)
+    first = records[0]['t']
+    # One connection pool for every session's cookie jar
+    transport = httpx.HTTPTransport(
+        limits=httpx.Limits(max_connections=workers,
+                            max_keepalive_connections=workers))
+    results = {}
+    lock = threading.Lock()
+    done = [0]
+
+    def run_session(session_records: list, started: float):
+        # Not closed: closing a client closes the shared transport
+        client = _Client(target, transport)
+        for record in session_records:
+            due = started + (record['t'] - first) / speed
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            result = {'id': record['id'], 'endpoint': record['endpoint'],
+                      'recorded_status': record['status'],
+                      'recorded_ms': record['ms'],
+                      'lag_ms': round(max(0.0, -delay) * 1000, 1)}
+            path = client.path(record)
+            if path is None:
+                result['status'] = None
+                result['error'] = 'unresolved path'
+            else:
+                sent = time.perf_counter()
+                try:
+                    response = client.http.request(
+                        record['method'], path, **_request_arguments(record))
+                    result['status'] = response.status_code
+                    client.remember(response)
+                except Exception as e:
+                    result['status'] = None
+                    result['error'] = type(e).__name__
+                result['ms'] = round((time.perf_counter() - sent) * 1000, 1)
+            with lock:
+                results[record['id']] = result
+                done[0] += 1
+                if progress:
+                    progress(done[0], len(records))
+
+    with transport, ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix='replay') as pool:
+        started = time.time()
+        # Sessions start at their first request, in arrival order
+        for session_records in sorted(sessions.values(),
+                                      key=lambda items: items[0]['t']):
+            delay = (started + (session_records[0]['t'] - first) / speed -
+                     time.time())
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run_session, session_records, started)
+
+    return [results[record['id']] for record in records
+            if record['id'] in results]
+
+
+def _percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(results: list) -> dict:
+    """
+    Per endpoint: request count, recorded vs replayed p50/p90/p99 duration,
+    status mismatches and errors
+    """
+    by_endpoint = {}
+    for result in results:
+        by_endpoint.setdefault(result['endpoint'], []).append(result)
+    summary = {}
+    for endpoint, items in sorted(by_endpoint.items()):
+        recorded = [item['recorded_ms'] for item in items]
+        replayed = [item['ms'] for item in items if 'ms' in item]
+        summary[endpoint] = {
+            'requests': len(items),
+            'recorded_ms': {name: _percentile(recorded, fraction)
+                            for name, fraction in (('p50', 0.5),
+                                                   ('p90', 0.9),
+                                                   ('p99', 0.99))},
+            'replayed_ms': {name: _percentile(replayed, fraction)
+                            for name, fraction in (('p50', 0.5),
+                                                   ('p90', 0.9),
+                                                   ('p99', 0.99))},
+            'status_mismatches': sum(
+                1 for item in items
+                if item['status'] != item['recorded_status']),
+            'errors': sum(1 for item in items if 'error' in item),
+            'lag_p99_ms': _percentile([item['lag_ms'] for item in items],
+                                      0.99),
+        }
+    return summary
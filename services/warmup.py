@@ -0,0 +1,259 @@
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy import text
+
+from app import db
+from services.async_runtime import run_upstream_sync
+from services.storage_service import storage, blob_key, AUDIO
+
+# Parallel ElevenLabs syntheses while warming up
+TTS_CONCURRENCY = 2
+
+SAMPLE_QA_PAIRS = 2
+
+
+def fixed_texts() -> list:
+    """
+    Question texts known before any candidate arrives
+    """
+    from services.gemini_service import (AREA_QUESTIONS,
+                                         DEFAULT_FIRST_QUESTION,
+                                         FALLBACK_FIRST_QUESTION,
+                                         FALLBACK_QUESTIONS)
+    return [DEFAULT_FIRST_QUESTION, FALLBACK_FIRST_QUESTION
+            ] + FALLBACK_QUESTIONS + list(AREA_QUESTIONS.values())
+
+
+class Warmup:
+    """
+    Per-worker warmup, run in the background after the worker forks
+
+    Pays the one-off costs of the first interview before a candidate does:
+    lazy imports, ReportLab fonts and styles (by rendering a throwaway
+    report), connections to Gemini and ElevenLabs, and the audio of the
+    fixed fallback questions. /healthz/ready answers 503 until it is done,
+    so the load balancer only routes to warmed workers. One worker per host
+    synthesizes the audio; the others wait for its files for at most
+    WARMUP_AUDIO_WAIT seconds. Afterwards the ElevenLabs connection is
+    pinged every WARMUP_KEEPALIVE_INTERVAL seconds so it stays in the pool,
+    and Gemini (a models.get call) by one worker per host. A failed step is
+    logged and reported but does not keep the worker out of rotation.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.steps = {}
+        self._pid = None
+        self._guard = threading.Lock()
+        self._ready = threading.Event()
+
+    def init_app(self, app):
+        app.config.setdefault('WARMUP_ENABLED',
+                              os.environ.get('WARMUP_ENABLED', '1') == '1')
+        app.config.setdefault('WARMUP_KEEPALIVE_INTERVAL', float(
+            os.environ.get('WARMUP_KEEPALIVE_INTERVAL', '60')))
+        app.config.setdefault('WARMUP_AUDIO_WAIT', float(
+            os.environ.get('WARMUP_AUDIO_WAIT', '30')))
+
+        self.app = app
+        app.extensions['warmup'] = self
+        app.add_url_rule('/healthz/ready', 'healthz_ready', self.readiness)
+
+        # gunicorn starts warmup as soon as a worker has loaded the app
+        # (gunicorn.conf.py); other servers start it on the first request
+        @app.before_request
+        def _start_warmup():
+            self.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._pid == os.getpid() and self._ready.is_set()
+
+    def start(self):
+        """
+        Start this process's warmup thread (once per forked worker)
+        """
+        if self._pid == os.getpid():
+            return
+        with self._guard:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.steps = {}
+            self._ready = threading.Event()
+        if not self.app.config['WARMUP_ENABLED']:
+            self._ready.set()
+            return
+        thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        thread.start()
+
+    def readiness(self):
+        if not self.ready:
+            return jsonify({'status': 'warming', 'steps': self.steps}), 503
+        try:
+            db.session.execute(text('SELECT 1'))
+        except Exception as e:
+            logging.error(f"Readiness check failed: {str(e)}")
+            return jsonify({'status': 'database unavailable'}), 503
+        return jsonify({'status': 'ready', 'steps': self.steps})
+
+    # ---------- Steps ----------
+
+    def _run(self):
+        started = time.monotonic()
+        with self.app.app_context():
+            self._step('imports', self.preload_modules)
+            self._step('report', self.render_sample_report)
+            self._step('connections', self.warm_connections)
+            self._step('audio', self.synthesize_fixed_audio)
+        self._ready.set()
+        logging.info(f"Worker {os.getpid()} warmed up in "
+                     f"{time.monotonic() - started:.1f}s")
+
+        interval = self.app.config['WARMUP_KEEPALIVE_INTERVAL']
+        if interval <= 0:
+            return
+        with open(self._lock_path('keepalive.lock'), 'w') as lock_file:
+            owner = False
+            while True:
+                time.sleep(interval)
+                # Gemini is pinged by whichever worker holds the host lock
+                owner = owner or self._try_lock(lock_file)
+                upstreams = ('gemini', 'elevenlabs') if owner else (
+                    'elevenlabs',)
+                try:
+                    self.warm_connections(upstreams)
+                except Exception as e:
+                    logging.warning(f"Upstream keepalive failed: {str(e)}")
+
+    def _lock_path(self, name: str) -> str:
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        return os.path.join(self.app.instance_path, f'warmup-{name}')
+
+    @staticmethod
+    def _try_lock(lock_file) -> bool:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _step(self, name: str, func):
+        started = time.monotonic()
+        try:
+            result = func()
+            self.steps[name] = {'ok': True, 'result': result}
+        except Exception as e:
+            logging.error(f"Warmup step {name} failed: {str(e)}")
+            self.steps[name] = {'ok': False, 'error': str(e)}
+        self.steps[name]['ms'] = int((time.monotonic() - started) * 1000)
+
+    def preload_modules(self):
+        from app import preload_lazy_modules
+        preload_lazy_modules()
+
+    def render_sample_report(self) -> int:
+        """
+        Render a throwaway report; returns its size in bytes
+        """
+        from services.document_service import render_assessment_report
+        from services.gemini_service import (FALLBACK_CV_ANALYSIS,
+                                             FALLBACK_QUESTIONS,
+                                             fallback_summary)
+        qa_pairs = [{'question': question, 'answer': question}
+                    for question in FALLBACK_QUESTIONS[:SAMPLE_QA_PAIRS]]
+        return len(render_assessment_report(FALLBACK_CV_ANALYSIS, qa_pairs,
+                                            fallback_summary(len(qa_pairs))))
+
+    def warm_connections(self, upstreams=('gemini', 'elevenlabs')) -> list:
+        """
+        Open pooled connections to the configured upstream APIs
+        """
+        from services import gemini_service, speech_service
+        services = []
+        if 'gemini' in upstreams and gemini_service.gemini_api_key:
+            services.append(('gemini', gemini_service.warm_connection_async))
+        if 'elevenlabs' in upstreams and speech_service.ELEVENLABS_API_KEY:
+            services.append(('elevenlabs', speech_service.warm_connection_async))
+
+        async def warm_all():
+            return await asyncio.gather(*(warm() for _, warm in services),
+                                        return_exceptions=True)
+
+        for (name, _), result in zip(services,
+                                     run_upstream_sync(warm_all(), timeout=30)):
+            if isinstance(result, Exception):
+                raise RuntimeError(f"{name}: {str(result)}")
+        return [name for name, _ in services]
+
+    def synthesize_fixed_audio(self) -> int:
+        """
+        Synthesize the fixed question texts not yet in storage; returns the
+        number of files created
+        """
+        from services.speech_service import (ELEVENLABS_API_KEY,
+                                             TTS_AUDIO_FORMATS, audio_stem,
+                                             text_to_speech_async)
+        if not ELEVENLABS_API_KEY:
+            return 0
+
+        formats = ['mp3'] + [f for f in TTS_AUDIO_FORMATS if f != 'mp3']
+        wanted = [(text, f, f"{audio_stem(text)}.{f}")
+                  for text in fixed_texts() for f in formats]
+        with open(self._lock_path('audio.lock'), 'w') as lock_file:
+            # One worker synthesizes; the others wait for its files
+            if not self._try_lock(lock_file):
+                self._wait_for_audio(wanted)
+                return 0
+            try:
+                missing = self._missing_audio(wanted)
+                if not missing:
+                    return 0
+
+                async def synthesize_all():
+                    semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+
+                    async def synthesize(text, audio_format, name):
+                        async with semaphore:
+                            return await text_to_speech_async(
+                                text, blob_key(AUDIO, name), audio_format)
+
+                    return await asyncio.gather(*(synthesize(*item)
+                                                  for item in missing))
+
+                results = run_upstream_sync(synthesize_all(), timeout=300)
+                created = 0
+                for (_, _, name), stored in zip(missing, results):
+                    if stored:
+                        storage.register(AUDIO, name, None, *stored)
+                        created += 1
+                logging.info(f"Warmup synthesized {created} audio files")
+                return created
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _missing_audio(wanted: list) -> list:
+        return [item for item in wanted
+                if storage.lookup(AUDIO, item[2]) is None]
+
+    def _wait_for_audio(self, wanted: list):
+        # Questions not synthesized in time are synthesized on demand
+        deadline = time.monotonic() + self.app.config['WARMUP_AUDIO_WAIT']
+        while time.monotonic() < deadline:
+            # End the transaction so the other worker's rows are visible
+            db.session.rollback()
+            if not self._missing_audio(wanted):
+                return
+            time.sleep(1)
+        logging.info("Warmup: audio still being synthesized by another "
+                     "worker, continuing")
+
+
+warmup = Warmup()
@@ -4,12 +4,9 @@ let isRecording = false;
 let speechRecognition = null;
 let currentQuestionText = "";
 let recognizedText = "";
-const api_key = "MGU1MmM3NTQwYjllNGJhMGFhNWY4OWJiOTVjMTFmOGItMTc1MjY3MjQyMg==";
-console.log("API KEY", api_key);
-const API_CONFIG = {
-    serverUrl: "https://api.heygen.com",
-    apiKey: api_key,
-};
+
+// Idempotency key of the answer being submitted, reused on retries
+let pendingSubmission = null;
 
 // Global state
 let sessionInfo = null;
@@ -17,6 +14,7 @@ let room = null;
 let mediaStream = null;
 let webSocket = null;
 let sessionToken = null;
+let webSocketUrl = null;
 
 // DOM elements
 const mediaElement = document.getElementById("mediaElement");
@@ -56,21 +54,31 @@ function stopVoiceRecognition() {
         stopRecording();
     }
 }
-//Get session token
-async function getSessionToken() {
-    const response = await fetch(
-        `${API_CONFIG.serverUrl}/v1/streaming.create_token`,
-        {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                "X-Api-Key": API_CONFIG.apiKey,
-            },
-        },
-    );
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
 
-    const data = await response.json();
-    sessionToken = data.data.token;
+// Requests shed by the server's admission control (503/429 with
+// Retry-After) never ran, so they are safe to send again after the delay
+async function fetchWithRetry(url, options, attempts = 3) {
+    for (let attempt = 1; ; attempt++) {
+        const response = await fetch(url, options);
+        const retryAfter = response.headers.get("Retry-After");
+        if (
+            attempt >= attempts ||
+            !retryAfter ||
+            (response.status !== 503 && response.status !== 429)
+        ) {
+            return response;
+        }
+        const delay = Math.min(parseFloat(retryAfter) || 1, 10) * 1000;
+        await new Promise((resolve) =>
+            setTimeout(resolve, delay * (0.5 + Math.random())),
+        );
+    }
 }
 
 // Connect WebSocket
@@ -83,9 +91,7 @@ async function connectWebSocket(sessionId) {
         stt_language: "fr",
     });
 
-    const wsUrl = `wss://${
-        new URL(API_CONFIG.serverUrl).hostname
-    }/v1/ws/streaming.chat?${params}`;
+    const wsUrl = `${webSocketUrl}?${params}`;
 
     webSocket = new WebSocket(wsUrl);
 
@@ -131,33 +137,24 @@ async function initializeAssessment() {
     }
 }
 
-// Create new session
+// Attach to a HeyGen session; the server hands out one it has already
+// created and started, so the key never reaches the browser
 async function createHeygenSession() {
-    if (!sessionToken) {
-        await getSessionToken();
-    }
-    console.log("session token: ", sessionToken);
-    const response = await fetch(`${API_CONFIG.serverUrl}/v1/streaming.new`, {
+    const response = await fetch("/api/avatar/session", {
         method: "POST",
         headers: {
             "Content-Type": "application/json",
-            Authorization: `Bearer ${sessionToken}`,
         },
-        body: JSON.stringify({
-            quality: "high",
-            avatar_name: "Marianne_Chair_Sitting_public",
-            voice: {
-                voice_id: "728ce6e94304471fae9cf02ad85ec9a2",
-                rate: 1.0,
-            },
-            version: "v2",
-            video_encoding: "H264",
-        }),
     });
 
     const data = await response.json();
-    sessionInfo = data.data;
-    console.log("session info: ", sessionInfo);
+    if (!data.success) {
+        throw new Error(data.error || "Failed to start avatar session");
+    }
+    sessionInfo = data;
+    sessionToken = data.session_token;
+    webSocketUrl = data.ws_url;
+    console.log("session info: ", sessionInfo.session_id);
 
     // Create LiveKit Room
     room = new LivekitClient.Room({
@@ -215,22 +212,8 @@ async function createHeygenSession() {
     await connectWebSocket(sessionInfo.session_id);
 }
 
-// Start streaming session
+// Start streaming session (already started server-side)
 async function startStreamingSession() {
-    const startResponse = await fetch(
-        `${API_CONFIG.serverUrl}/v1/streaming.start`,
-        {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                Authorization: `Bearer ${sessionToken}`,
-            },
-            body: JSON.stringify({
-                session_id: sessionInfo.session_id,
-            }),
-        },
-    );
-
     // Connect to LiveKit room
     await room.connect(sessionInfo.url, sessionInfo.access_token);
 }
@@ -241,14 +224,12 @@ async function sendTextToHeygen(text, taskType = "repeat") {
         return;
     }
 
-    const response = await fetch(`${API_CONFIG.serverUrl}/v1/streaming.task`, {
+    const response = await fetch("/api/avatar/task", {
         method: "POST",
         headers: {
             "Content-Type": "application/json",
-            Authorization: `Bearer ${sessionToken}`,
         },
         body: JSON.stringify({
-            session_id: sessionInfo.session_id,
             text: text,
             task_type: taskType,
         }),
@@ -261,15 +242,8 @@ async function closeHeygenSession() {
         return;
     }
 
-    const response = await fetch(`${API_CONFIG.serverUrl}/v1/streaming.stop`, {
+    const response = await fetch("/api/avatar/stop", {
         method: "POST",
-        headers: {
-            "Content-Type": "application/json",
-            Authorization: `Bearer ${sessionToken}`,
-        },
-        body: JSON.stringify({
-            session_id: sessionInfo.session_id,
-        }),
     });
 
     // Close WebSocket
@@ -292,7 +266,7 @@ async function closeHeygenSession() {
 async function analyzeCV() {
     try {
         /*
-        const response = await fetch("/api/analyze_cv", {
+        const response = await fetchWithRetry("/api/analyze_cv", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -327,7 +301,7 @@ async function generateQuestionAudio(text) {
         setAvatarState("talking");
         avatar.style.display = "block";
 
-        const response = await fetch("/api/generate_audio", {
+        const response = await fetchWithRetry("/api/generate_audio", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -377,7 +351,7 @@ function playQuestion() {
 async function startRecording() {
     console.log("startRecording called");
     try {
-        if (!BrowserSpeechRecognition.isSupported()) {
+        if (!isSpeechRecognitionSupported()) {
             showError(
                 "Speech recognition is not supported in your browser. Please use Chrome, Edge, or Safari.",
             );
@@ -395,7 +369,7 @@ async function startRecording() {
 
         if (!speechRecognition) {
             console.log("Initializing speechRecognition");
-            speechRecognition = new BrowserSpeechRecognition();
+            speechRecognition = createSpeechRecognition();
             console.log("speechRecognition initialized", speechRecognition);
 
             try {
@@ -598,10 +572,25 @@ async function submitAnswer() {
         submitBtn.innerHTML =
             '<i class="fas fa-spinner fa-spin me-2"></i>Traitement...';
 
-        const response = await fetch("/api/submit_answer", {
+        // Retrying the same answer reuses its key so the server replays
+        // the first response instead of recording the answer twice
+        if (
+            !pendingSubmission ||
+            pendingSubmission.question !== currentQuestionText ||
+            pendingSubmission.answer !== answer
+        ) {
+            pendingSubmission = {
+                question: currentQuestionText,
+                answer: answer,
+                key: newIdempotencyKey(),
+            };
+        }
+
+        const response = await fetchWithRetry("/api/submit_answer", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
+                "Idempotency-Key": pendingSubmission.key,
             },
             body: JSON.stringify({
                 question: currentQuestionText,
@@ -612,6 +601,7 @@ async function submitAnswer() {
         const data = await response.json();
 
         if (data.success) {
+            pendingSubmission = null;
             if (data.completed) {
                 showCompletionScreen();
             } else {
@@ -692,7 +682,7 @@ async function generateReport() {
         button.innerHTML =
             '<i class="fas fa-spinner fa-spin me-2"></i>Generating...';
 
-        const response = await fetch("/api/generate_report", {
+        const response = await fetchWithRetry("/api/generate_report", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -779,7 +769,7 @@ async function requestMicrophonePermission() {
 // Test speech recognition functionality
 async function testSpeechRecognition() {
     try {
-        if (!BrowserSpeechRecognition.isSupported()) {
+        if (!isSpeechRecognitionSupported()) {
             console.log("Speech recognition not supported");
             return false;
         }
@@ -797,7 +787,7 @@ async function testSpeechRecognition() {
         console.log("Microphone test passed");
 
         // Try to create a simple instance to test
-        const testRecognition = new BrowserSpeechRecognition();
+        const testRecognition = createSpeechRecognition();
         testRecognition.initialize();
         console.log("Speech recognition test passed");
         return true;
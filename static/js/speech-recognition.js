@@ -179,5 +179,348 @@ class BrowserSpeechRecognition {
     }
 }
 
+// Server-side speech recognition: streams microphone audio to
+// /api/stt/streams while the candidate speaks. Same interface as
+// BrowserSpeechRecognition, for browsers without the Web Speech API.
+class ServerSpeechRecognition {
+    constructor() {
+        this.isListening = false;
+        this.transcript = "";
+        this.interimTranscript = "";
+        this.onResult = null;
+        this.onError = null;
+        this.onEnd = null;
+
+        this.streamId = null;
+        this.sampleRate = 16000;
+        this.chunkSeconds = 0.5;
+        this.seq = 0;
+        this.pending = [];
+        this.pendingLength = 0;
+        this.uploads = Promise.resolve();
+        // Chunks sent but not yet persisted by the server, by seq
+        this.unsent = new Map();
+        this.uploadError = null;
+        this.maxAttempts = 5;
+        this.mediaStream = null;
+        this.audioContext = null;
+        this.processor = null;
+    }
+
+    static isSupported() {
+        return !!(
+            navigator.mediaDevices &&
+            (window.AudioContext || window.webkitAudioContext)
+        );
+    }
+
+    initialize() {
+        if (!ServerSpeechRecognition.isSupported()) {
+            throw new Error("Audio capture not supported in this browser");
+        }
+    }
+
+    // Start listening
+    async start() {
+        if (this.isListening) {
+            console.log("Speech recognition already listening");
+            return;
+        }
+        try {
+            this.transcript = "";
+            this.interimTranscript = "";
+            this.seq = 0;
+            this.pending = [];
+            this.pendingLength = 0;
+            this.unsent = new Map();
+            this.uploadError = null;
+            this.uploads = Promise.resolve();
+            this.isListening = true;
+
+            const response = await fetch("/api/stt/streams", {
+                method: "POST",
+            });
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error || "Failed to start transcription");
+            }
+            this.streamId = data.stream_id;
+            this.sampleRate = data.sample_rate;
+
+            this.mediaStream = await navigator.mediaDevices.getUserMedia({
+                audio: {
+                    echoCancellation: true,
+                    noiseSuppression: true,
+                    channelCount: 1,
+                },
+            });
+            const AudioContext = window.AudioContext || window.webkitAudioContext;
+            this.audioContext = new AudioContext();
+            const source = this.audioContext.createMediaStreamSource(
+                this.mediaStream,
+            );
+            // ScriptProcessor keeps this self-contained (no worklet module)
+            this.processor = this.audioContext.createScriptProcessor(4096, 1, 1);
+            this.processor.onaudioprocess = (event) => {
+                if (this.isListening) {
+                    this.capture(event.inputBuffer.getChannelData(0));
+                }
+            };
+            source.connect(this.processor);
+            this.processor.connect(this.audioContext.destination);
+            console.log("Server speech recognition started");
+        } catch (error) {
+            console.error("Error starting server speech recognition:", error);
+            this.isListening = false;
+            this.release();
+            if (this.onError) {
+                this.onError(error.message || "Failed to start speech recognition");
+            }
+        }
+    }
+
+    // Downsample to the server's rate as 16-bit PCM, send every chunkSeconds
+    capture(samples) {
+        const ratio = this.audioContext.sampleRate / this.sampleRate;
+        const length = Math.floor(samples.length / ratio);
+        const pcm = new Int16Array(length);
+        for (let i = 0; i < length; i++) {
+            const sample = Math.max(-1, Math.min(1, samples[Math.floor(i * ratio)]));
+            pcm[i] = sample < 0 ? sample * 0x8000 : sample * 0x7fff;
+        }
+        this.pending.push(pcm);
+        this.pendingLength += length;
+        if (this.pendingLength >= this.sampleRate * this.chunkSeconds) {
+            this.flush();
+        }
+    }
+
+    flush() {
+        if (!this.pendingLength) {
+            return;
+        }
+        const chunk = new Int16Array(this.pendingLength);
+        let offset = 0;
+        for (const part of this.pending) {
+            chunk.set(part, offset);
+            offset += part.length;
+        }
+        this.pending = [];
+        this.pendingLength = 0;
+
+        // Chunks are sent one at a time, in order. A chunk that still fails
+        // after retries ends the upload; the error is reported once.
+        const seq = this.seq++;
+        const streamId = this.streamId;
+        this.unsent.set(seq, chunk);
+        this.uploads = this.uploads.then(async () => {
+            if (this.uploadError) {
+                return;
+            }
+            try {
+                const data = await this.sendChunk(streamId, seq);
+                if (this.isListening) {
+                    this.interimTranscript = data.partial;
+                    if (this.onResult) {
+                        this.onResult({
+                            final: "",
+                            interim: data.partial,
+                            isFinal: false,
+                        });
+                    }
+                }
+            } catch (error) {
+                this.uploadError = error;
+                console.error("Server speech recognition upload failed:", error);
+                if (this.onError) {
+                    this.onError("network");
+                }
+            }
+        });
+    }
+
+    // POST with retries: network errors, 429 and 5xx are retried with
+    // exponential backoff (or the server's Retry-After). A 409 with
+    // resend_from means the worker lacks earlier chunks; they are sent
+    // again before retrying.
+    async post(streamId, path, options, seq) {
+        for (let attempt = 1; ; attempt++) {
+            let response = null;
+            try {
+                response = await fetch(
+                    `/api/stt/streams/${streamId}/${path}`,
+                    { method: "POST", ...options },
+                );
+            } catch (error) {
+                console.warn("STT upload attempt failed:", error);
+            }
+            if (response && response.ok) {
+                return response.json();
+            }
+            if (attempt >= this.maxAttempts) {
+                throw new Error(
+                    `STT ${path} failed` +
+                        (response ? ` (${response.status})` : ""),
+                );
+            }
+            if (response && response.status === 409) {
+                const data = await response.json();
+                if (data.resend_from === undefined || data.resend_from >= seq) {
+                    throw new Error(data.error || "Transcription stream conflict");
+                }
+                for (let missing = data.resend_from; missing < seq; missing++) {
+                    await this.sendChunk(streamId, missing);
+                }
+                continue;
+            }
+            if (response && response.status < 500 && response.status !== 429) {
+                const data = await response.json().catch(() => ({}));
+                throw new Error(data.error || `STT ${path} failed`);
+            }
+            const retryAfter =
+                response && parseFloat(response.headers.get("Retry-After"));
+            const delay = retryAfter
+                ? retryAfter * 1000
+                : Math.min(250 * 2 ** (attempt - 1), 4000);
+            await new Promise((resolve) => setTimeout(resolve, delay));
+        }
+    }
+
+    async sendChunk(streamId, seq) {
+        const chunk = this.unsent.get(seq);
+        if (!chunk) {
+            throw new Error(`Chunk ${seq} is no longer available`);
+        }
+        const data = await this.post(
+            streamId,
+            `chunks/${seq}`,
+            {
+                headers: { "Content-Type": "application/octet-stream" },
+                body: chunk.buffer,
+            },
+            seq,
+        );
+        // The server keeps chunks below data.persisted
+        for (const sent of this.unsent.keys()) {
+            if (sent < data.persisted) {
+                this.unsent.delete(sent);
+            }
+        }
+        return data;
+    }
+
+    // Stop listening; the final transcript arrives as soon as the last
+    // chunk is processed
+    stop() {
+        if (!this.isListening) {
+            return;
+        }
+        this.isListening = false;
+        this.flush();
+        this.release();
+
+        const chunks = this.seq;
+        const streamId = this.streamId;
+        this.uploads
+            .then(async () => {
+                if (this.uploadError) {
+                    // Already reported
+                    return;
+                }
+                const data = await this.post(
+                    streamId,
+                    "finish",
+                    {
+                        headers: { "Content-Type": "application/json" },
+                        body: JSON.stringify({ chunks: chunks }),
+                    },
+                    chunks,
+                );
+                if (!data.success) {
+                    throw new Error(data.error || "Transcription failed");
+                }
+                this.unsent = new Map();
+                this.transcript = data.transcript;
+                this.interimTranscript = "";
+                if (this.onResult) {
+                    this.onResult({
+                        final: data.transcript,
+                        interim: "",
+                        isFinal: data.transcript.length > 0,
+                    });
+                }
+            })
+            .catch((error) => {
+                console.error("Server speech recognition error:", error);
+                if (this.onError) {
+                    this.onError("network");
+                }
+            })
+            .finally(() => {
+                if (this.onEnd) {
+                    this.onEnd(this.transcript);
+                }
+            });
+    }
+
+    // Abort listening without waiting for a transcript
+    abort() {
+        this.isListening = false;
+        this.pending = [];
+        this.pendingLength = 0;
+        this.release();
+    }
+
+    release() {
+        if (this.processor) {
+            this.processor.disconnect();
+            this.processor = null;
+        }
+        if (this.audioContext) {
+            this.audioContext.close();
+            this.audioContext = null;
+        }
+        if (this.mediaStream) {
+            this.mediaStream.getTracks().forEach((track) => track.stop());
+            this.mediaStream = null;
+        }
+    }
+
+    // Get final transcript
+    getFinalTranscript() {
+        return this.transcript;
+    }
+
+    // Get current transcript (including interim)
+    getCurrentTranscript() {
+        return this.transcript + this.interimTranscript;
+    }
+}
+
+// Web Speech when available, otherwise (or when the server prefers it)
+// server-side transcription
+function createSpeechRecognition() {
+    const sttConfig = window.STT_CONFIG || {};
+    if (
+        sttConfig.serverEnabled &&
+        ServerSpeechRecognition.isSupported() &&
+        (sttConfig.preferServer || !BrowserSpeechRecognition.isSupported())
+    ) {
+        return new ServerSpeechRecognition();
+    }
+    return new BrowserSpeechRecognition();
+}
+
+function isSpeechRecognitionSupported() {
+    const sttConfig = window.STT_CONFIG || {};
+    return (
+        BrowserSpeechRecognition.isSupported() ||
+        (sttConfig.serverEnabled && ServerSpeechRecognition.isSupported())
+    );
+}
+
 // Export for use in other files
 window.BrowserSpeechRecognition = BrowserSpeechRecognition;
+window.ServerSpeechRecognition = ServerSpeechRecognition;
+window.createSpeechRecognition = createSpeechRecognition;
+window.isSpeechRecognitionSupported = isSpeechRecognitionSupported;
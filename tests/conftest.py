@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# One throwaway instance for the whole run: the services are module-level
+# singletons configured by create_app() from these variables
+_instance = tempfile.mkdtemp(prefix='assessment-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_instance, 'test.db')}",
+    'SESSION_SECRET': 'test-secret',
+    'BLOB_BACKEND': 'local',
+    'BLOB_CACHE_DIR': os.path.join(_instance, 'blob-cache'),
+    'STORAGE_JANITOR_ENABLED': '0',
+    'HEYGEN_POOL_ENABLED': '0',
+    'WARMUP_ENABLED': '0',
+    'TRAFFIC_CAPTURE': '0',
+})
+os.chdir(_instance)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """
+    The app's database with empty tables, inside an app context
+    """
+    from app import db
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+from flask import session
+
+from services.admission import (PRIORITY_INTERVIEW, _Gate, _TokenBuckets,
+                                admission)
+
+
+@pytest.fixture
+def client(app, db, monkeypatch):
+    # One request per client, then empty for a long time
+    monkeypatch.setattr(admission, 'buckets', _TokenBuckets(0.001, 1))
+    return app.test_client()
+
+
+def get_status(client, address: str) -> int:
+    return client.get('/api/session_status',
+                      headers={'X-Forwarded-For': address}).status_code
+
+
+def test_clients_behind_the_proxy_get_their_own_bucket(client):
+    assert get_status(client, '203.0.113.1') != 429
+    assert get_status(client, '203.0.113.1') == 429
+    assert get_status(client, '203.0.113.2') != 429
+
+
+def test_sessions_get_their_own_bucket(client):
+    assert get_status(client, '203.0.113.1') != 429
+    with client.session_transaction() as session:
+        session['assessment_session_id'] = 'candidate'
+    assert get_status(client, '203.0.113.1') != 429
+    assert get_status(client, '203.0.113.1') == 429
+
+
+def test_audio_chunks_are_not_rate_limited(client):
+    for seq in range(3):
+        response = client.post(f'/api/stt/streams/1/chunks/{seq}',
+                               data=b'\0\0')
+        assert response.status_code != 429
+
+
+def test_metrics_need_the_admin_token(client, app, monkeypatch):
+    assert client.get('/metrics').status_code == 401
+
+    monkeypatch.setitem(app.config, 'EXPORT_API_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics',
+                          headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert b'admission_admitted_total' in response.data
+
+
+def test_interviews_in_progress_are_admitted_before_new_sessions(
+        app, monkeypatch):
+    gate = _Gate('llm', 1, 8)
+    monkeypatch.setitem(admission.gates, 'llm', gate)
+    assert gate.acquire(PRIORITY_INTERVIEW, 1) is None
+    admitted = []
+
+    def request(path):
+        with app.test_request_context(path, method='POST'):
+            session['assessment_session_id'] = 'candidate'
+            assert admission._admit() is None
+            admitted.append(path)
+            admission._release()
+
+    threads = []
+    # A CV analysis arrives first, then an answer of an interview
+    for path in ('/api/analyze_cv', '/api/submit_answer'):
+        thread = threading.Thread(target=request, args=(path,))
+        thread.start()
+        threads.append(thread)
+        while gate.depth < len(threads):
+            time.sleep(0.01)
+
+    gate.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert admitted == ['/api/submit_answer', '/api/analyze_cv']
@@ -0,0 +1,97 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import AssessmentSession
+from services.analytics import AnalyticsStore, summarize
+from services.gemini_service import FALLBACK_QUESTIONS
+
+START = datetime(2026, 3, 2, 9, 0)
+
+
+@pytest.fixture
+def store(db, tmp_path):
+    return AnalyticsStore(str(tmp_path))
+
+
+def answers(*spec) -> str:
+    # (question, answer, seconds after START) per turn
+    return json.dumps([
+        {'question': question, 'answer': answer,
+         'timestamp': (START + timedelta(seconds=seconds)).isoformat()}
+        for question, answer, seconds in spec])
+
+
+def add_session(db, session_id, analysis, qa_json, updated_at):
+    db.session.add(AssessmentSession(
+        session_id=session_id, cv_filename='cv.pdf', cv_content='cv',
+        status='completed',
+        cv_analysis=str(analysis) if analysis is not None else None,
+        questions_answers=qa_json, created_at=START, updated_at=updated_at))
+    db.session.commit()
+
+
+def test_a_session_built_again_keeps_only_its_latest_turns(store, db):
+    add_session(db, 'a', {}, answers(('Prix ?', 'Bas', 60)),
+                START + timedelta(minutes=5))
+    add_session(db, 'b', {}, answers(('Coûts ?', 'Le loyer', 30)),
+                START + timedelta(minutes=6))
+    assert store.build() == 2
+
+    # Session a gets another answer; b, within the overlap window, is
+    # read again but not written again
+    row = AssessmentSession.query.filter_by(session_id='a').one()
+    row.questions_answers = answers(('Prix ?', 'Bas', 60),
+                                    ('Clients ?', 'Des habitués', 180))
+    row.updated_at = START + timedelta(minutes=7)
+    db.session.commit()
+    assert store.build() == 1
+    assert len(store.manifest['segments']) == 2
+
+    sessions, turns = AnalyticsStore(store.directory).load()
+
+    assert sorted(sessions['id']) == [row.id, row.id + 1]
+    a = list(sessions['id']).index(row.id)
+    assert (sessions['segment'][a], sessions['turns'][a]) == (1, 2)
+    assert sessions['duration_s'][a] == 180
+    assert sorted(turns['session_id']) == [row.id, row.id, row.id + 1]
+    assert set(turns['segment'][turns['session_id'] == row.id]) == {1}
+
+
+def test_summary_groups_sessions_into_cohorts(store, db):
+    updated = START + timedelta(hours=1)
+    add_session(db, 'senior',
+                {'career_stage': 'senior', 'experience_years': 12},
+                answers(('Prix ?', 'Bas et stables', 60),
+                        (FALLBACK_QUESTIONS[0], 'Non', 120)), updated)
+    add_session(db, 'junior',
+                {'career_stage': 'junior', 'experience_years': '2'},
+                answers(('Prix ?', 'Bas', 30)), updated)
+    add_session(db, 'unknown', None, answers(('Prix ?', 'Bas', 90)), updated)
+    store.build()
+
+    sessions, turns = store.load()
+    summary = summarize(sessions, turns, store.manifest['career_stages'])
+
+    assert (summary['sessions'], summary['turns']) == (3, 4)
+    assert summary['fallback_rate'] == 0.25
+    assert summary['sessions_with_fallback'] == round(1 / 3, 4)
+    assert summary['turn_latency_s']['p50'] == 60
+    assert summary['career_stage'] == {
+        'senior': {'sessions': 1, 'mean_duration_s': 120.0,
+                   'mean_answer_words': 4.0, 'mean_fallback_turns': 1.0},
+        'junior': {'sessions': 1, 'mean_duration_s': 30.0,
+                   'mean_answer_words': 1.0, 'mean_fallback_turns': 0.0},
+        '(unknown)': {'sessions': 1, 'mean_duration_s': 90.0,
+                      'mean_answer_words': 1.0, 'mean_fallback_turns': 0.0},
+    }
+    # Sessions without a known experience are left out of these cohorts
+    assert {name: cohort['sessions']
+            for name, cohort in summary['experience_years'].items()} == {
+                '0-2': 1, '11+': 1}
+
+    later = summarize(sessions, turns, store.manifest['career_stages'],
+                      since=(START - datetime(1970, 1, 1)).total_seconds()
+                      + 100)
+    assert later['sessions'] == 1
@@ -0,0 +1,19 @@
+from asgi import build_environ
+
+
+def scope(*headers) -> dict:
+    return {'type': 'http', 'http_version': '1.1', 'method': 'GET',
+            'path': '/', 'query_string': b'',
+            'headers': [(name.encode(), value.encode())
+                        for name, value in headers]}
+
+
+def test_duplicate_headers_are_joined():
+    environ = build_environ(scope(('accept', 'text/html'),
+                                  ('accept', 'application/json'),
+                                  ('cookie', 'session=abc'),
+                                  ('cookie', 'theme=dark')), b'', 0.0)
+
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+    # Cookie values may themselves contain commas
+    assert environ['HTTP_COOKIE'] == 'session=abc; theme=dark'
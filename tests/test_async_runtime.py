@@ -0,0 +1,18 @@
+from flask import has_app_context, has_request_context
+
+from services.async_runtime import run_upstream_sync
+from services.traffic_capture import current_request
+
+
+async def seen():
+    return has_app_context(), has_request_context(), current_request.get()
+
+
+def test_upstream_tasks_get_only_the_request_id(app):
+    token = current_request.set('request-1')
+    try:
+        with app.test_request_context('/'):
+            assert run_upstream_sync(seen(), timeout=5) == (False, False,
+                                                            'request-1')
+    finally:
+        current_request.reset(token)
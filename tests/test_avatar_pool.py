@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.heygen_pool import create_mock, serve_in_background
+from models import AvatarSession, Lease
+from services import heygen_service, leases
+from services.heygen_service import POOL_LEASE, READY, AvatarPool
+
+
+@pytest.fixture(scope='module')
+def mock():
+    mock = create_mock(latency=0)
+    server = serve_in_background(mock, 0)
+    mock.url = f"http://127.0.0.1:{server.server_port}"
+    yield mock
+    server.shutdown()
+
+
+@pytest.fixture
+def pool(app, db, mock, monkeypatch):
+    monkeypatch.setattr(heygen_service, 'HEYGEN_API_URL', mock.url)
+    monkeypatch.setattr(heygen_service, 'HEYGEN_API_KEY', 'test')
+    monkeypatch.setitem(app.config, 'HEYGEN_POOL_MIN', 2)
+    return heygen_service.avatar_pool
+
+
+def ready_count() -> int:
+    return AvatarSession.query.filter_by(status=READY).count()
+
+
+def test_refill_reaches_the_minimum_once(pool, mock):
+    assert pool.refill('host-a:1') == 2
+    assert ready_count() == 2
+    assert pool.refill('host-a:1') == 0
+
+    for record in AvatarSession.query:
+        assert mock.sessions[record.heygen_session_id] == 'start'
+
+
+def test_only_the_lease_holder_refills(pool, app):
+    # A second node sharing the database
+    other = AvatarPool()
+    other.app = app
+
+    assert pool.refill('host-a:1') == 2
+    AvatarSession.query.delete()
+
+    assert other.refill('host-b:1') is None
+    assert ready_count() == 0
+
+
+def test_lease_passes_on_after_expiry(db):
+    assert leases.acquire(POOL_LEASE, 'host-a:1', timedelta(minutes=3))
+    assert not leases.acquire(POOL_LEASE, 'host-b:1', timedelta(minutes=3))
+
+    db.session.get(Lease, POOL_LEASE).expires_at = (datetime.utcnow() -
+                                                    timedelta(seconds=1))
+    db.session.commit()
+    assert leases.acquire(POOL_LEASE, 'host-b:1', timedelta(minutes=3))
+
+    leases.release(POOL_LEASE, 'host-b:1')
+    assert leases.acquire(POOL_LEASE, 'host-a:1', timedelta(minutes=3))
@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+
+import docx
+import pytest
+
+from models import AssessmentSession, BatchCV
+from services import batch_assessment, gemini_service
+from services.batch_assessment import (ANALYZED, EXTRACTED, FAILED,
+                                       MAX_ATTEMPTS, PENDING, BatchAssessment)
+
+
+def write_cv(path, text: str):
+    document = docx.Document()
+    document.add_paragraph(text)
+    document.save(str(path))
+
+
+def statuses() -> dict:
+    return {item.source_path: item.status for item in BatchCV.query}
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    # CV texts analyzed so far; texts in `failing` raise once
+    analyzed, failing = [], set()
+
+    async def analyze_cv_content_async(cv_text):
+        if cv_text in failing:
+            failing.discard(cv_text)
+            raise RuntimeError('Gemini unavailable')
+        analyzed.append(cv_text)
+        return {'summary': cv_text}
+
+    monkeypatch.setattr(gemini_service, 'analyze_cv_content_async',
+                        analyze_cv_content_async)
+    monkeypatch.setattr(batch_assessment, 'ANALYSIS_RETRIES', 0)
+    return analyzed, failing
+
+
+def test_an_interrupted_batch_resumes_where_it_stopped(db, tmp_path,
+                                                       analyses):
+    analyzed, failing = analyses
+    write_cv(tmp_path / 'alice.docx', 'Alice, boulangère')
+    write_cv(tmp_path / 'bob.docx', 'Bob, fleuriste')
+
+    batch = BatchAssessment('spring', str(tmp_path))
+    assert batch.discover() == 2
+    assert batch.extract(workers=1) == 2
+    # The run stops here; a new one finds nothing left to extract
+    batch = BatchAssessment('spring', str(tmp_path))
+    assert batch.discover() == 0
+    assert batch.extract(workers=1) == 0
+    assert set(statuses().values()) == {EXTRACTED}
+
+    failing.add('Bob, fleuriste')
+    assert batch.analyze() == 1
+    assert statuses() == {'alice.docx': ANALYZED, 'bob.docx': FAILED}
+    # One failed round costs one attempt
+    assert BatchCV.query.filter_by(source_path='bob.docx').one().attempts == 1
+
+    assert batch.analyze() == 1
+    assert set(statuses().values()) == {ANALYZED}
+    assert analyzed == ['Alice, boulangère', 'Bob, fleuriste']
+    assert AssessmentSession.query.count() == 2
+
+
+def test_a_replaced_file_is_analyzed_again(db, tmp_path, analyses):
+    analyzed, _ = analyses
+    write_cv(tmp_path / 'alice.docx', 'Alice, boulangère')
+    batch = BatchAssessment('spring', str(tmp_path))
+    batch.discover()
+    batch.extract(workers=1)
+    batch.analyze()
+    first = BatchCV.query.one().assessment_session_id
+
+    write_cv(tmp_path / 'alice.docx', 'Alice, pâtissière')
+    assert batch.discover() == 1
+    assert statuses() == {'alice.docx': PENDING}
+    batch.extract(workers=1)
+    assert batch.analyze() == 1
+
+    item = BatchCV.query.one()
+    assert (item.status, item.attempts) == (ANALYZED, 0)
+    assert item.assessment_session_id != first
+    session = AssessmentSession.query.filter_by(
+        session_id=item.assessment_session_id).one()
+    assert session.get_cv_analysis() == {'summary': 'Alice, pâtissière'}
+    assert analyzed == ['Alice, boulangère', 'Alice, pâtissière']
+
+
+class FakeBatches:
+    """Gemini batch jobs whose results are all errors"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def create(self, model, src, config):
+        name = f"batches/{len(self.jobs)}"
+        self.jobs[name] = SimpleNamespace(
+            name=name, state=SimpleNamespace(name='JOB_STATE_SUCCEEDED'),
+            dest=SimpleNamespace(inlined_responses=[
+                SimpleNamespace(metadata=request['metadata'], response=None,
+                                error=SimpleNamespace(message='quota'))
+                for request in src]))
+        return self.jobs[name]
+
+    def get(self, name):
+        return self.jobs[name]
+
+
+def test_a_failed_batch_job_result_costs_one_attempt(db, tmp_path,
+                                                     monkeypatch):
+    client = SimpleNamespace(batches=FakeBatches())
+    monkeypatch.setattr(gemini_service, 'get_client', lambda: client)
+    write_cv(tmp_path / 'alice.docx', 'Alice, boulangère')
+    batch = BatchAssessment('spring', str(tmp_path))
+    batch.discover()
+    batch.extract(workers=1)
+
+    for attempts in range(1, MAX_ATTEMPTS + 1):
+        assert len(batch.submit()) == 1
+        assert batch.collect() == (0, [])
+        item = BatchCV.query.one()
+        assert (item.status, item.attempts) == (FAILED, attempts)
+    # Out of attempts: not submitted again
+    assert batch.submit() == []
@@ -0,0 +1,194 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from services import blob_store
+from services.blob_store import ClientError, ReadThroughCache, S3BlobStore
+from services.storage_service import AUDIO, REPORT, blob_key, storage
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in for the boto3 S3 client calls S3BlobStore makes
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = 0
+
+    def _missing(self, operation):
+        if ClientError is Exception:  # boto3 not installed
+            return KeyError(operation)
+        return ClientError({'Error': {'Code': '404'}}, operation)
+
+    def upload_fileobj(self, f, bucket, key, ExtraArgs=None):
+        self.objects[(bucket, key)] = (f.read(), ExtraArgs or {})
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        if (Bucket, Key) not in self.objects:
+            raise self._missing('GetObject')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self._missing('HeadObject')
+        return {'ContentLength': len(self.objects[(Bucket, Key)][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return (f"https://s3.test/{Params['Bucket']}/{Params['Key']}"
+                f"?expires={ExpiresIn}")
+
+
+@pytest.fixture
+def s3(tmp_path):
+    client = FakeS3Client()
+    store = ReadThroughCache(
+        S3BlobStore('bucket', prefix='app/', client=client),
+        str(tmp_path / 'cache'), max_bytes=1000)
+    return client, store
+
+
+@pytest.fixture
+def proxied(app, db, s3, monkeypatch):
+    """The app serving from the fake S3 store through the local cache"""
+    monkeypatch.setattr(blob_store, '_blob_store', s3[1])
+    monkeypatch.setitem(app.config, 'BLOB_SERVE_MODE', 'proxy')
+    return s3
+
+
+def test_write_reports_size_and_hash(s3):
+    client, store = s3
+    data = b'x' * 300
+
+    assert store.put_bytes('audio/ab/cd/a.mp3', data, 'audio/mpeg') == (
+        300, hashlib.sha256(data).hexdigest())
+    assert client.objects[('bucket', 'app/audio/ab/cd/a.mp3')] == (
+        data, {'ContentType': 'audio/mpeg'})
+    assert client.gets == 0
+
+
+def test_read_fills_the_cache_only_when_read_to_the_end(s3):
+    client, store = s3
+    store.put_bytes('report/r.pdf', b'0123456789')
+
+    with store.open_read('report/r.pdf') as f:
+        assert f.read(4) == b'0123'
+    assert store.cached_path('report/r.pdf') is None
+
+    with store.open_read('report/r.pdf') as f:
+        assert f.read() == b'0123456789'
+    path = store.cached_path('report/r.pdf')
+    assert open(path, 'rb').read() == b'0123456789'
+    assert not [name for name in os.listdir(os.path.dirname(path))
+                if name.endswith('.tmp')]
+
+    with store.open_read('report/r.pdf') as f:
+        f.read()
+    assert client.gets == 2
+
+
+def test_missing_blob_raises_file_not_found(s3):
+    with pytest.raises(FileNotFoundError):
+        s3[1].open_read('audio/none.mp3')
+    assert s3[1].local_path('audio/none.mp3') is None
+
+
+def test_write_and_delete_drop_the_cached_copy(s3):
+    _, store = s3
+    store.put_bytes('audio/a.mp3', b'old')
+    store.local_path('audio/a.mp3')
+    store.put_bytes('audio/a.mp3', b'new')
+    assert store.cached_path('audio/a.mp3') is None
+    assert open(store.local_path('audio/a.mp3'), 'rb').read() == b'new'
+
+    store.delete('audio/a.mp3')
+    assert not store.exists('audio/a.mp3')
+
+
+def test_trim_evicts_least_recently_used_files(s3):
+    _, store = s3
+    for index in range(4):
+        store.put_bytes(f'audio/{index}.mp3', bytes(400))
+        path = store.local_path(f'audio/{index}.mp3')
+        os.utime(path, (index, index))
+
+    store.trim()
+
+    assert [index for index in range(4)
+            if os.path.exists(store._cache_path(f'audio/{index}.mp3'))] == [
+                2, 3]
+    assert store._cached_bytes == 800
+
+
+def test_register_uses_the_digest_of_the_write(proxied):
+    client, store = proxied
+    name = 'assessment_report_s1_1.pdf'
+    stored = store.put_bytes(blob_key(REPORT, name), b'%PDF-1.4')
+
+    record = storage.register(REPORT, name, 's1', *stored)
+
+    assert (record.size_bytes, record.content_hash) == stored
+    assert client.gets == 0
+
+
+def test_proxy_mode_streams_an_uncached_blob(app, proxied):
+    client, store = proxied
+    data = bytes(range(256)) * 2
+    name = 'question_abc.mp3'
+    storage.register(AUDIO, name, None,
+                     *store.put_bytes(blob_key(AUDIO, name), data))
+
+    with app.test_client() as http:
+        response = http.get(f'/api/audio/{name}')
+        assert response.status_code == 200
+        assert response.data == data
+        assert response.headers['Content-Length'] == str(len(data))
+        assert response.headers['ETag'] == (
+            f'"{hashlib.sha256(data).hexdigest()}"')
+        response.close()  # as the WSGI server does once it is sent
+        # The streamed read filled the cache; later reads are local
+        assert store.cached_path(blob_key(AUDIO, name)) is not None
+
+        response = http.get(f'/api/audio/{name}',
+                            headers={'Range': 'bytes=10-19'})
+        assert response.status_code == 206
+        assert response.data == data[10:20]
+    assert client.gets == 1
+
+
+def test_proxy_mode_answers_ranges_on_a_cache_miss(app, proxied):
+    client, store = proxied
+    data = bytes(range(256))
+    name = 'question_def.mp3'
+    storage.register(AUDIO, name, None,
+                     *store.put_bytes(blob_key(AUDIO, name), data))
+
+    with app.test_client() as http:
+        response = http.get(f'/api/audio/{name}',
+                            headers={'Range': 'bytes=100-109'})
+        assert response.status_code == 206
+        assert response.data == data[100:110]
+        response.close()
+    # A partial read is not cached
+    assert store.cached_path(blob_key(AUDIO, name)) is None
+
+
+def test_redirect_mode_sends_a_presigned_url(app, db, s3, monkeypatch):
+    client, store = s3
+    monkeypatch.setattr(blob_store, '_blob_store', store)
+    name = 'question_ghi.mp3'
+    storage.register(AUDIO, name, None,
+                     *store.put_bytes(blob_key(AUDIO, name), b'mp3'))
+
+    with app.test_client() as http:
+        response = http.get(f'/api/audio/{name}')
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith(
+        'https://s3.test/bucket/app/audio/')
+    assert client.gets == 0
@@ -0,0 +1,14 @@
+from services.coverage import area_coverage, score_answers
+from services.interview_digest import classify_area
+
+
+def test_typographic_apostrophes_match_keywords():
+    qa = {'question': 'Parlez-moi de votre activité.',
+          'answer': 'Notre chiffre d’affaires a baissé, la marge aussi.'}
+    straight = dict(qa, answer=qa['answer'].replace('’', "'"))
+
+    coverage = area_coverage(score_answers([qa]))
+
+    assert coverage == area_coverage(score_answers([straight]))
+    assert coverage['business_model'] > 0
+    assert classify_area(qa['answer']) == 'business_model'
@@ -0,0 +1,33 @@
+from services.gemini_service import (FALLBACK_CV_ANALYSIS,
+                                     _final_summary_request)
+from services.interview_digest import (DIGEST_TOKEN_BUDGET, estimate_tokens,
+                                       render_transcript)
+
+
+def prompt_text(request: dict) -> str:
+    return request['contents'][0].parts[0].text
+
+
+def test_transcript_gives_short_answers_whole_and_shares_the_rest():
+    qa_list = [{'question': 'Prix ?', 'answer': 'Je ne sais pas.'},
+               {'question': 'Coûts ?', 'answer': 'loyer ' * 2000}]
+
+    transcript = render_transcript(qa_list, 500)
+
+    assert 'R : Je ne sais pas.' in transcript
+    assert 450 < estimate_tokens(transcript) < 550
+
+
+def test_final_summary_quotes_the_cv_analysis_and_answers():
+    answer = 'Nous vendons surtout le midi. ' * 60
+    qa_list = [{'question': f'Question {i} ?', 'answer': answer}
+               for i in range(3)]
+
+    prompt = prompt_text(_final_summary_request(FALLBACK_CV_ANALYSIS,
+                                                qa_list))
+
+    assert FALLBACK_CV_ANALYSIS['summary'] in prompt
+    assert 'Teamwork' in prompt
+    # Far more of the answers than the per-turn digest holds
+    assert prompt.count('Nous vendons surtout le midi.') > 100
+    assert estimate_tokens(prompt) > DIGEST_TOKEN_BUDGET * 2
@@ -0,0 +1,70 @@
+import asyncio
+
+from flask import Response, session
+
+from services import idempotency
+from services.idempotency import (acquire_session_lock, idempotent,
+                                  session_lock)
+
+
+@idempotent(serialize=True)
+async def view():
+    return {'ok': True}
+
+
+@idempotent()
+async def text_view():
+    return Response('Bonjour', status=201, mimetype='text/plain')
+
+
+def call_view(app, session_id=None, key=None, view=view, path='/api/x'):
+    headers = {idempotency.IDEMPOTENCY_HEADER: key} if key else {}
+    with app.test_request_context(path, method='POST', headers=headers):
+        if session_id:
+            session['assessment_session_id'] = session_id
+        return asyncio.run(view())
+
+
+def test_lock_wait_gives_up_after_the_timeout():
+    lock = session_lock('busy')
+    lock.acquire()
+    try:
+        assert not asyncio.run(acquire_session_lock(lock, timeout=0.1))
+    finally:
+        lock.release()
+    assert asyncio.run(acquire_session_lock(lock, timeout=0.1))
+    lock.release()
+
+
+def test_request_waiting_on_a_busy_session_gets_429(app, monkeypatch):
+    monkeypatch.setattr(idempotency, 'SESSION_LOCK_TIMEOUT', 0.1)
+    lock = session_lock('s-busy')
+    lock.acquire()
+    try:
+        response, status = call_view(app, session_id='s-busy')
+    finally:
+        lock.release()
+    assert status == 429
+    assert response.headers['Retry-After']
+
+
+def test_sessionless_requests_do_not_share_a_lock(app, monkeypatch):
+    monkeypatch.setattr(idempotency, 'SESSION_LOCK_TIMEOUT', 0.1)
+    held = session_lock('anonymous')
+    held.acquire()
+    try:
+        assert call_view(app) == {'ok': True}
+    finally:
+        held.release()
+
+
+def test_replay_keeps_the_content_type(app, db):
+    # Records need the endpoint of a real route
+    path = '/api/submit_answer'
+    first = call_view(app, 's1', key='k1', view=text_view, path=path)
+    replay = call_view(app, 's1', key='k1', view=text_view, path=path)
+
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert (replay.status_code, replay.get_data()) == (201, b'Bonjour')
+    assert replay.content_type == first.content_type == \
+        'text/plain; charset=utf-8'
@@ -0,0 +1,54 @@
+import json
+
+from models import AssessmentSession, StoredFile
+from services import gemini_service
+from services.report_rerender import rerender_reports
+from services.storage_service import REPORT
+
+
+def add_session(db, session_id, final_summary=None):
+    db.session.add(AssessmentSession(
+        session_id=session_id, cv_filename='cv.pdf', cv_content='cv',
+        status='completed', cv_analysis=str({'summary': 'Boulanger'}),
+        questions_answers=json.dumps([{'question': 'Prix ?',
+                                       'answer': 'Bas.'}]),
+        final_summary=final_summary))
+    db.session.commit()
+
+
+def reports(db) -> set:
+    return {row.session_id for row in
+            StoredFile.query.filter_by(storage_class=REPORT)}
+
+
+def test_legacy_sessions_are_skipped_by_default(db):
+    add_session(db, 'current', 'Résumé.')
+    add_session(db, 'legacy')
+
+    stats = rerender_reports(workers=1)
+
+    assert (stats['rendered'], stats['skipped']) == (1, 1)
+    assert reports(db) == {'current'}
+
+
+def test_regenerate_missing_writes_and_keeps_the_summary(db, monkeypatch):
+    calls = []
+
+    async def write_final_summary_async(cv_analysis, qa_pairs, digest=None):
+        calls.append(cv_analysis['summary'])
+        return 'Résumé régénéré.'
+
+    monkeypatch.setattr(gemini_service, 'write_final_summary_async',
+                        write_final_summary_async)
+    add_session(db, 'current', 'Résumé.')
+    add_session(db, 'legacy')
+
+    stats = rerender_reports(workers=1, regenerate_missing=True)
+
+    assert (stats['rendered'], stats['regenerated'],
+            stats['skipped']) == (2, 1, 0)
+    assert calls == ['Boulanger']
+    assert reports(db) == {'current', 'legacy'}
+    db.session.expire_all()
+    legacy = AssessmentSession.query.filter_by(session_id='legacy').one()
+    assert legacy.final_summary == 'Résumé régénéré.'
@@ -0,0 +1,132 @@
+import json
+
+import pytest
+from sqlalchemy import event, update
+
+from models import AssessmentSession
+from services.session_cache import session_cache
+
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    # Check the stored version on every read unless a test says otherwise
+    monkeypatch.setattr(session_cache, 'verify_interval', 0)
+    session_cache._entries.clear()
+    db.session.add(AssessmentSession(
+        session_id='s1', cv_filename='cv.pdf', cv_content='cv',
+        cv_analysis=str({'summary': 'x'}), status='in_progress',
+        questions_answers=json.dumps([{'question': 'Q0', 'answer': 'A0',
+                                       'timestamp': 't0'}]),
+        current_question_index=1))
+    db.session.commit()
+    yield session_cache
+    session_cache._entries.clear()
+
+
+def write_elsewhere(db, question: str, answer: str):
+    """
+    What another worker's persist() does: append a turn, bump the version
+    """
+    row = db.session.execute(
+        db.select(AssessmentSession.questions_answers,
+                  AssessmentSession.version).where(
+                      AssessmentSession.session_id == 's1')).one()
+    qa_list = json.loads(row.questions_answers) + [
+        {'question': question, 'answer': answer, 'timestamp': 't'}]
+    db.session.execute(
+        update(AssessmentSession).where(
+            AssessmentSession.session_id == 's1').values(
+                questions_answers=json.dumps(qa_list),
+                current_question_index=len(qa_list),
+                version=row.version + 1).execution_options(
+                    synchronize_session=False))
+    db.session.commit()
+
+
+def stored(db) -> AssessmentSession:
+    db.session.expire_all()
+    return db.session.execute(db.select(AssessmentSession).where(
+        AssessmentSession.session_id == 's1')).scalar_one()
+
+
+def test_read_is_served_from_memory_while_version_is_unchanged(cache):
+    first = cache.get('s1')
+    assert cache.get('s1') is first
+
+
+def test_reads_within_the_verify_interval_run_no_query(cache, db,
+                                                       monkeypatch):
+    monkeypatch.setattr(cache, 'verify_interval', 60)
+    state = cache.get('s1')
+    statements = []
+    listener = (lambda conn, cursor, statement, *args:
+                statements.append(statement))
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        write_elsewhere(db, 'Q1', 'A1')
+        statements.clear()
+        assert cache.get('s1') is state
+        assert cache.append_answer(state, 'Q2', 'A2') is state
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements == []
+
+    # The write is still safe: it is rebased onto the other worker's turn
+    cache.save('s1')
+    assert [qa['answer'] for qa in stored(db).get_questions_answers()] == [
+        'A0', 'A1', 'A2']
+
+
+def test_read_picks_up_a_turn_written_by_another_worker(cache, db):
+    state = cache.get('s1')
+    write_elsewhere(db, 'Q1', 'A1')
+
+    fresh = cache.get('s1')
+    assert fresh is not state
+    assert [qa['answer'] for qa in fresh.questions_answers] == ['A0', 'A1']
+    assert fresh.version == state.version + 1
+
+
+def test_conflicting_write_is_rebased_onto_the_other_workers_turn(cache, db):
+    cache.append_answer(cache.get('s1'), 'Q2', 'A2')
+    write_elsewhere(db, 'Q1', 'A1')
+
+    cache.save('s1')
+
+    row = stored(db)
+    assert [qa['answer'] for qa in row.get_questions_answers()] == [
+        'A0', 'A1', 'A2']
+    assert row.current_question_index == 3
+    state = cache.get('s1')
+    assert not state.dirty
+    assert state.version == row.version
+
+
+def test_unsaved_turn_is_rebased_when_a_read_sees_a_new_version(cache, db):
+    cache.append_answer(cache.get('s1'), 'Q2', 'A2')
+    write_elsewhere(db, 'Q1', 'A1')
+
+    state = cache.get('s1')
+
+    assert [qa['answer'] for qa in state.questions_answers] == [
+        'A0', 'A1', 'A2']
+    assert not state.dirty
+    assert [qa['answer'] for qa in stored(db).get_questions_answers()] == [
+        'A0', 'A1', 'A2']
+
+
+def test_deleted_row_is_dropped_from_the_cache(cache, db):
+    cache.get('s1')
+    db.session.execute(db.delete(AssessmentSession))
+    db.session.commit()
+
+    assert cache.get('s1') is None
+    assert 's1' not in cache._entries
+
+
+def test_exit_flush_is_registered_once(app, monkeypatch):
+    registered = []
+    monkeypatch.setattr('atexit.register', registered.append)
+    session_cache.init_app(app)
+    session_cache.init_app(app)
+    assert registered == []
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import AssessmentSession
+from services.session_export import iter_sessions
+
+T0 = datetime(2026, 4, 1, 9, 0)
+
+
+@pytest.fixture
+def sessions(db):
+    # (created_at offset in minutes, status), inserted in id order; four
+    # sessions share a created_at across page boundaries
+    spec = [(0, 'completed'), (0, 'started'),
+            (1, 'completed'), (1, 'completed'), (1, 'started'),
+            (1, 'completed'),
+            (2, 'completed'), (3, 'completed')]
+    ids = []
+    for number, (minutes, status) in enumerate(spec):
+        row = AssessmentSession(session_id=f's{number}', cv_filename='cv.pdf',
+                                cv_content='cv', status=status,
+                                created_at=T0 + timedelta(minutes=minutes))
+        db.session.add(row)
+        db.session.commit()
+        ids.append(row.id)
+    return ids
+
+
+def exported(**filters) -> list:
+    return [row['id'] for row in iter_sessions(['id'], **filters)]
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 3, 500])
+def test_pages_split_within_the_same_created_at(sessions, page_size):
+    assert exported(page_size=page_size) == sessions
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 3])
+def test_filters_apply_across_pages(sessions, page_size):
+    rows = exported(status='completed', since=T0 + timedelta(minutes=1),
+                    until=T0 + timedelta(minutes=3), page_size=page_size)
+    assert rows == [sessions[2], sessions[3], sessions[5], sessions[6]]
+
+
+def test_export_needs_the_admin_token(app, sessions, monkeypatch):
+    client = app.test_client()
+    assert client.get('/api/export/sessions').status_code == 401
+
+    monkeypatch.setitem(app.config, 'EXPORT_API_TOKEN', 'secret')
+    response = client.get('/api/export/sessions',
+                          headers={'Authorization': 'Bearer wrong'})
+    assert response.status_code == 401
+
+    response = client.get('/api/export/sessions?status=started',
+                          headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert [json.loads(line)['id'] for line in response.text.splitlines()] \
+        == [sessions[1], sessions[4]]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import AssessmentSession, StoredFile, StoredFileRef
+from services.storage_service import AUDIO, storage
+
+LONG_AGO = datetime.utcnow() - timedelta(days=30)
+
+
+@pytest.fixture
+def janitor(app, db, monkeypatch):
+    monkeypatch.setitem(app.config, 'STORAGE_JANITOR_DELETES_PER_SECOND',
+                        1e6)
+    monkeypatch.setitem(app.config, 'STORAGE_QUOTA_BYTES', 0)
+    for session_id, status in (('live', 'in_progress'),
+                               ('done', 'completed')):
+        db.session.add(AssessmentSession(session_id=session_id,
+                                         cv_filename='cv.pdf',
+                                         cv_content='cv', status=status))
+    db.session.commit()
+    return storage
+
+
+def add_audio(db, name, session_id=None, created_at=LONG_AGO,
+              last_accessed_at=LONG_AGO):
+    db.session.add(StoredFile(storage_class=AUDIO, name=name, path=name,
+                              size_bytes=10, session_id=session_id,
+                              created_at=created_at,
+                              last_accessed_at=last_accessed_at))
+    db.session.commit()
+
+
+def remaining(db) -> set:
+    return {name for name, in db.session.query(StoredFile.name)}
+
+
+def test_shared_audio_referenced_by_a_live_session_is_kept(janitor, db):
+    add_audio(db, 'question_a.mp3')
+    add_audio(db, 'question_b.mp3')
+    janitor.add_references(AUDIO, ['question_a.mp3'], 'live')
+    janitor.add_references(AUDIO, ['question_b.mp3'], 'done')
+    # A later session reusing the file does not take it from the first
+    janitor.add_references(AUDIO, ['question_a.mp3'], 'done')
+
+    janitor.run_janitor_cycle()
+
+    assert remaining(db) == {'question_a.mp3'}
+    assert {ref.session_id for ref in StoredFileRef.query} == {'live'}
+
+
+def test_shared_audio_ages_from_its_last_access(janitor, db, app,
+                                                monkeypatch):
+    monkeypatch.setitem(app.config, 'STORAGE_QUOTA_BYTES', 10**9)
+    add_audio(db, 'question_recent.mp3',
+              last_accessed_at=datetime.utcnow())
+    add_audio(db, 'question_stale.mp3')
+    add_audio(db, 'recording_1.wav', session_id='done',
+              last_accessed_at=datetime.utcnow())
+
+    janitor.run_janitor_cycle()
+
+    assert remaining(db) == {'question_recent.mp3'}
+
+
+def test_recordings_of_a_live_session_are_kept(janitor, db):
+    add_audio(db, 'recording_live.wav', session_id='live')
+    add_audio(db, 'recording_done.wav', session_id='done')
+
+    janitor.run_janitor_cycle()
+
+    assert remaining(db) == {'recording_live.wav'}
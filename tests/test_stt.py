@@ -0,0 +1,116 @@
+import pytest
+
+from models import AudioFile, StoredFile
+from services.blob_store import get_blob_store
+from services.storage_service import storage
+from services.stt_service import (SAMPLE_WIDTH, StreamError, StubEngine,
+                                  segment_key, stt)
+
+TRANSCRIPT = 'one two three four five six seven eight'
+SEGMENT = 4
+
+
+@pytest.fixture
+def streams(app, db, monkeypatch):
+    monkeypatch.setattr(stt, 'engine', StubEngine(TRANSCRIPT))
+    monkeypatch.setattr(stt, '_streams', {})
+    monkeypatch.setitem(app.config, 'STT_SEGMENT_CHUNKS', SEGMENT)
+    return stt
+
+
+def chunk(app) -> bytes:
+    # Half a second of silence: one word of the stub transcript
+    return bytes(int(app.config['STT_SAMPLE_RATE'] * SAMPLE_WIDTH * 0.5))
+
+
+def test_chunks_return_partial_transcripts(streams, app):
+    record = streams.open('s1')
+    partial, persisted = streams.feed(record.id, 's1', 0, chunk(app))
+    assert (partial, persisted) == ('one', 0)
+    for seq in range(1, SEGMENT):
+        partial, persisted = streams.feed(record.id, 's1', seq, chunk(app))
+    assert partial == 'one two three four'
+    # A full segment is stored once, not chunk by chunk
+    assert persisted == SEGMENT
+    assert get_blob_store().exists(segment_key(record.id, 0))
+    assert not get_blob_store().exists(segment_key(record.id, 1))
+
+
+def test_repeated_chunk_is_ignored(streams, app):
+    record = streams.open('s1')
+    streams.feed(record.id, 's1', 0, chunk(app))
+    assert streams.feed(record.id, 's1', 0, chunk(app)) == ('one', 0)
+
+
+def test_finish_stores_the_recording(streams, app, db):
+    record = streams.open('s1')
+    for seq in range(6):
+        streams.feed(record.id, 's1', seq, chunk(app))
+
+    finished = streams.finish(record.id, 's1', 6)
+
+    assert finished.transcription == TRANSCRIPT
+    assert get_blob_store().exists(finished.file_path)
+    assert StoredFile.query.filter_by(name=finished.filename).count() == 1
+    # Segments are removed once the WAV exists
+    assert not get_blob_store().exists(segment_key(record.id, 0))
+    # A retried finish returns the same record
+    assert streams.finish(record.id, 's1', 6).id == record.id
+
+
+def test_another_worker_catches_up_from_segments(streams, app):
+    record = streams.open('s1')
+    for seq in range(6):
+        streams.feed(record.id, 's1', seq, chunk(app))
+    # The next chunk lands on a worker that has never seen the stream
+    streams._streams.clear()
+
+    with pytest.raises(StreamError) as error:
+        streams.feed(record.id, 's1', 6, chunk(app))
+    # Chunks 4 and 5 were never persisted: the client sends them again
+    assert error.value.status_code == 409
+    assert error.value.resend_from == SEGMENT
+
+    streams.feed(record.id, 's1', 4, chunk(app))
+    streams.feed(record.id, 's1', 5, chunk(app))
+    partial, _ = streams.feed(record.id, 's1', 6, chunk(app))
+    assert partial == 'one two three four five six seven'
+
+
+def test_stale_stream_is_dropped_after_finishing_elsewhere(streams, app,
+                                                           db):
+    record = streams.open('s1')
+    streams.feed(record.id, 's1', 0, chunk(app))
+    # Another worker finished the stream
+    db.session.get(AudioFile, record.id).transcription = 'done'
+    db.session.commit()
+
+    with pytest.raises(StreamError) as error:
+        streams.feed(record.id, 's1', 1, chunk(app))
+    assert error.value.status_code == 404
+    assert record.id not in streams._streams
+
+
+def test_finish_can_be_retried_after_a_failed_write(streams, app,
+                                                    monkeypatch):
+    record = streams.open('s1')
+    for seq in range(6):
+        streams.feed(record.id, 's1', seq, chunk(app))
+
+    def fail(*args):
+        raise OSError('blob store unavailable')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(storage, 'register', fail)
+        with pytest.raises(OSError):
+            streams.finish(record.id, 's1', 6)
+    assert record.id not in streams._streams
+
+    # The retry replays the stored segment and asks for the rest
+    with pytest.raises(StreamError) as error:
+        streams.finish(record.id, 's1', 6)
+    assert error.value.resend_from == SEGMENT
+    streams.feed(record.id, 's1', 4, chunk(app))
+    streams.feed(record.id, 's1', 5, chunk(app))
+
+    assert streams.finish(record.id, 's1', 6).transcription == TRANSCRIPT
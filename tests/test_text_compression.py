@@ -0,0 +1,115 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from models import AssessmentSession
+from services.text_compression import (MARKER, PLAIN, ZLIB,
+                                       compress_existing_rows,
+                                       text_compression)
+
+CV = 'Boulangère depuis douze ans, deux boutiques à Lyon. ' * 60
+UPDATED_AT = datetime(2026, 1, 5, 12, 0)
+
+
+@pytest.fixture
+def codec(monkeypatch):
+    def use(name):
+        monkeypatch.setattr(text_compression, 'codec', name)
+    return use
+
+
+def add_session(db, session_id, cv_content=CV):
+    row = AssessmentSession(session_id=session_id, cv_filename='cv.pdf',
+                            cv_content=cv_content, updated_at=UPDATED_AT)
+    db.session.add(row)
+    db.session.commit()
+    return row.id
+
+
+def stored(db, row_id) -> str:
+    # The column as written, without CompressedText decoding it
+    return db.session.execute(
+        db.text('SELECT cv_content FROM assessment_session WHERE id = :id'),
+        {'id': row_id}).scalar()
+
+
+def load(db, row_id) -> AssessmentSession:
+    db.session.expire_all()
+    return db.session.get(AssessmentSession, row_id)
+
+
+def test_plain_rows_are_compressed_in_place(db, codec):
+    codec(None)
+    row_id = add_session(db, 's1')
+    assert stored(db, row_id) == CV
+    version = load(db, row_id).version
+
+    codec(ZLIB)
+    stats = compress_existing_rows()
+
+    assert stats['assessment_session.cv_content'] == 1
+    assert stored(db, row_id).startswith(MARKER + ZLIB)
+    assert len(stored(db, row_id)) < len(CV) / 4
+    row = load(db, row_id)
+    assert row.cv_content == CV
+    # Same logical value: neither bumped
+    assert (row.updated_at, row.version) == (UPDATED_AT, version)
+    # Nothing left to do
+    assert compress_existing_rows()['assessment_session.cv_content'] == 0
+
+
+def test_values_starting_with_the_marker_are_escaped(db, codec):
+    value = MARKER + 'z not compressed'
+    assert text_compression.encode(value) == MARKER + PLAIN + value
+    assert text_compression.decode(text_compression.encode(value)) == value
+
+    codec(None)
+    row_id = add_session(db, 's1', value)
+    assert load(db, row_id).cv_content == value
+
+
+def test_rows_written_with_compression_off_are_read_back(db, codec):
+    codec(ZLIB)
+    compressed_id = add_session(db, 's1')
+    codec(None)
+    plain_id = add_session(db, 's2')
+
+    assert stored(db, plain_id) == CV
+    # Off still reads compressed values, and zlib reads plain ones
+    assert load(db, compressed_id).cv_content == CV
+    codec(ZLIB)
+    assert load(db, plain_id).cv_content == CV
+
+
+def test_values_that_do_not_shrink_are_left_alone(db, codec):
+    rng = random.Random(0)
+    noise = ''.join(chr(0x4e00 + rng.randrange(20000)) for _ in range(2000))
+    codec(None)
+    row_id = add_session(db, 's1', noise)
+
+    codec(ZLIB)
+    assert compress_existing_rows()['assessment_session.cv_content'] == 0
+    assert stored(db, row_id) == noise
+
+
+def test_a_row_changed_meanwhile_is_not_overwritten(db, codec, monkeypatch):
+    codec(None)
+    row_id = add_session(db, 's1')
+    edited = CV + 'Ouverture d’une troisième boutique.'
+    encode = text_compression.encode
+
+    def encode_during_an_edit(value):
+        # Another request saves the row between the read and the update
+        if value == CV:
+            db.session.execute(
+                db.text('UPDATE assessment_session SET cv_content = :value '
+                        'WHERE id = :id'), {'value': edited, 'id': row_id})
+        return encode(value)
+
+    codec(ZLIB)
+    monkeypatch.setattr(text_compression, 'encode', encode_during_an_edit)
+    stats = compress_existing_rows()
+
+    assert stats['assessment_session.cv_content'] == 0
+    assert stored(db, row_id) == edited
@@ -0,0 +1,84 @@
+import asyncio
+import gzip
+import os
+
+import pytest
+from flask import g
+
+from services.traffic_capture import (REPLAY_HEADER, TrafficCapture, _Writer,
+                                      current_request, mask, mask_body,
+                                      mask_text, read_capture)
+
+
+def upstream(request_id, text, operation='next_question'):
+    return {'kind': 'upstream', 'request': request_id, 'service': 'gemini',
+            'op': operation, 't': 0, 'ms': 0, 'text': text}
+
+
+@pytest.fixture
+def capture_dir(tmp_path):
+    writer = _Writer(str(tmp_path), 1 << 20)
+    for record in (upstream('a', 'A1'), upstream('b', 'B1'),
+                   upstream('b', 'B2'), upstream('c', 'C1', 'analyze_cv')):
+        writer.write(record)
+    writer.close()
+    return str(tmp_path)
+
+
+@pytest.fixture
+def replay(capture_dir):
+    capture = TrafficCapture()
+    capture._load_fixtures(capture_dir)
+    return capture
+
+
+def test_masking_keeps_length_words_and_area_keys():
+    assert mask_text('Prix bas,\nmarge 30 %') == 'xxxx xxxx\nxxxxx xx x'
+    assert mask({'area': 'pricing', 'facts': ['Loyer élevé', 12]}) == \
+        {'area': 'pricing', 'facts': ['xxxxx xxxxx', 12]}
+    assert mask_body('{"answer": "Oui"}') == {'json': {'answer': 'xxx'}}
+    assert mask_body('Oui, deux') == {'text': 'xxxx xxxx'}
+
+
+def test_capture_files_are_read_back(capture_dir, caplog):
+    records = list(read_capture(capture_dir))
+    assert [record['text'] for record in records] == ['A1', 'B1', 'B2', 'C1']
+
+    # A worker killed mid-write leaves a truncated file behind
+    data = gzip.compress(b'{"kind": "request"}\n' * 100)
+    with open(os.path.join(capture_dir, 'capture-z.ndjson.gz'), 'wb') as f:
+        f.write(data[:len(data) // 2])
+    assert len(list(read_capture(capture_dir))) >= 4
+    assert 'truncated' in caplog.text
+
+
+def test_upstream_calls_are_answered_from_their_request(replay, app):
+    def answer(request_id, operation='next_question'):
+        headers = {REPLAY_HEADER: request_id} if request_id else {}
+        with app.test_request_context('/api/submit_answer', method='POST',
+                                      headers=headers):
+            replay._start()
+            try:
+                response = asyncio.run(
+                    replay.upstream('gemini', operation, None))
+            finally:
+                current_request.reset(g.pop('traffic_token'))
+        return response.text
+
+    assert [answer('b'), answer('b'), answer('a')] == ['B1', 'B2', 'A1']
+    # Unknown, exhausted or missing IDs cycle through the operation's calls
+    assert [answer('z'), answer('b'), answer(None), answer('z')] == \
+        ['A1', 'B1', 'B2', 'A1']
+    assert answer('z', 'analyze_cv') == 'C1'
+
+
+def test_request_ids_differ_between_processes(app):
+    ids = []
+    for capture in (TrafficCapture(), TrafficCapture()):
+        with app.test_request_context('/api/submit_answer', method='POST'):
+            capture._start()
+            ids.append(g.traffic['id'])
+            current_request.reset(g.pop('traffic_token'))
+    # Both are the first request of their process
+    assert ids[0].endswith('-1') and ids[1].endswith('-1')
+    assert ids[0] != ids[1]